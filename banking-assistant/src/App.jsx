@@ -13,6 +13,11 @@ async function loadConfig() {
   return runtimeConfig;
 }
 
+// One id per voice turn, sent as X-Trace-ID to every service so the turn can be
+// followed across voiceauth / stt / llm-backend / tts logs and metrics
+const newTraceId = () =>
+  (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`).replace(/-/g, "");
+
 export default function App() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState("");
@@ -69,11 +74,45 @@ export default function App() {
     audio.play().catch((err) => console.warn("Audio autoplay blocked:", err));
   };
 
-  const speak = async (text) => {
+  // Plays /tts/stream as it arrives, so the first sentence is heard while the rest
+  // is still being synthesized
+  const playStream = async (res) => {
+    const mediaSource = new MediaSource();
+    const url = URL.createObjectURL(mediaSource);
+    const audio = new Audio(url);
+    audio.onended = () => URL.revokeObjectURL(url);
+    await new Promise((resolve) => mediaSource.addEventListener("sourceopen", resolve, { once: true }));
+    const buffer = mediaSource.addSourceBuffer("audio/mpeg");
+    const reader = res.body.getReader();
+    for (let started = false; ; ) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer.appendBuffer(value);
+      await new Promise((resolve) => buffer.addEventListener("updateend", resolve, { once: true }));
+      if (!started) {
+        started = true;
+        audio.play().catch((err) => console.warn("Audio autoplay blocked:", err));
+      }
+    }
+    mediaSource.endOfStream();
+  };
+
+  const speak = async (text, traceId = newTraceId()) => {
     try {
+      // MediaSource can't take MP3 everywhere (e.g. iOS Safari): fall back to the whole file
+      if (window.MediaSource?.isTypeSupported("audio/mpeg") && window.ReadableStream) {
+        const res = await fetch(`${cfg.TTS_URL}/tts/stream`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json", "X-Trace-ID": traceId },
+          body: JSON.stringify({ text, audio_format: "mp3" }),
+        });
+        if (!res.ok) throw new Error(await res.text());
+        await playStream(res);
+        return;
+      }
       const res = await fetch(`${cfg.TTS_URL}/tts`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", "X-Trace-ID": traceId },
         body: JSON.stringify({ text, audio_format: "mp3" }),
       });
       if (!res.ok) throw new Error(await res.text());
@@ -182,7 +221,11 @@ export default function App() {
       form.append("file", blob, "login.webm");
 
       try {
-        const res = await fetch(`${cfg.VOICE_AUTH_URL}/voice-login`, { method: "POST", body: form });
+        const res = await fetch(`${cfg.VOICE_AUTH_URL}/voice-login`, {
+          method: "POST",
+          body: form,
+          headers: { "X-Trace-ID": newTraceId() },
+        });
         if (!res.ok) {
           throw new Error(await res.text());
         }
@@ -197,7 +240,7 @@ export default function App() {
   };
 
   // ----------- Chat -----------
-  const sendMessage = async (text) => {
+  const sendMessage = async (text, traceId = newTraceId()) => {
     if (!text.trim()) return;
     if (!jwt) {
       alert("You must login with voice first!");
@@ -214,6 +257,7 @@ export default function App() {
           "Content-Type": "application/json",
           Authorization: `Bearer ${jwt}`,
           "X-Session-ID": cfg.SESSION_ID,
+          "X-Trace-ID": traceId,
         },
         body: JSON.stringify({ message: text }),
       });
@@ -224,7 +268,7 @@ export default function App() {
       const assistantMsg = { role: "assistant", content: data.reply };
       setMessages((prev) => [...prev, assistantMsg]);
 
-      if (data?.reply) speak(data.reply);
+      if (data?.reply) speak(data.reply, traceId);
     } catch (err) {
       setMessages((prev) => [
         ...prev,
@@ -263,10 +307,15 @@ export default function App() {
 
       try {
         console.log("Sending STT request to:", cfg.STT_URL);
-        const sttRes = await fetch(`${cfg.STT_URL}/transcribe`, { method: "POST", body: form });
+        const traceId = newTraceId();
+        const sttRes = await fetch(`${cfg.STT_URL}/transcribe`, {
+          method: "POST",
+          body: form,
+          headers: { "X-Trace-ID": traceId },
+        });
         if (!sttRes.ok) throw new Error(await sttRes.text());
         const sttData = await sttRes.json();
-        if (sttData.text) sendMessage(sttData.text);
+        if (sttData.text) sendMessage(sttData.text, traceId);
       } catch (e) {
         setMessages((p) => [...p, { role: "assistant", content: "STT Error: " + e.message }]);
       }
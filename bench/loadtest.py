@@ -0,0 +1,291 @@
+"""End-to-end load test for the voice stack: /voice-login -> /transcribe -> /chat -> /tts.
+
+Each virtual user logs in once with a recorded utterance, then runs --turns
+voice turns (transcribe an audio fixture, send a scripted chat message, synthesize
+the reply). Per-stage throughput and p50/p95/p99 go to a JSON file tagged with
+the git commit, so runs can be compared across commits.
+
+    python pg_fixture.py up && python run_stack.py &               # or: --launch
+    python loadtest.py --users 10 --turns 5
+    python loadtest.py --launch --stages chat --users 50            # chat only, stack started here
+    python loadtest.py --stream --stages chat                       # /chat/stream, adds chat_ttft
+    python loadtest.py --compare results/old.json results/new.json
+
+Stages can be skipped with --stages; without voice_login a token is minted with JWT_SECRET.
+"""
+import os
+import json
+import time
+import hmac
+import base64
+import asyncio
+import hashlib
+import argparse
+import subprocess
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+import run_stack
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+STAGES = ["voice_login", "transcribe", "chat", "tts"]
+DEFAULT_AUDIO = [os.path.join(ROOT, "chat-stack", "alice.wav")]
+DEFAULT_SCRIPT = os.path.join(HERE, "fixtures", "turns.json")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def mint_jwt(sub: str, secret: str) -> str:
+    # HS256 token in the shape voiceauth issues; used when voice_login is skipped
+    def b64(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+    head = b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    body = b64(json.dumps({"sub": sub, "jti": f"bench-{time.time_ns()}"}).encode())
+    sig = hmac.new(secret.encode(), f"{head}.{body}".encode(), hashlib.sha256).digest()
+    return f"{head}.{body}.{b64(sig)}"
+
+
+def git_commit() -> Dict[str, object]:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": sha or None, "dirty": dirty}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: Dict[str, List[str]] = defaultdict(list)
+
+    async def timed(self, stage: str, coro):
+        t0 = time.perf_counter()
+        try:
+            result = await coro
+        except Exception as e:
+            self.errors[stage] += 1
+            if len(self.error_samples[stage]) < 5:
+                self.error_samples[stage].append(f"{type(e).__name__}: {e}"[:300])
+            return None
+        self.samples[stage].append((time.perf_counter() - t0) * 1000)
+        return result
+
+    def summary(self, wall: float) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for stage in sorted(set(self.samples) | set(self.errors)):
+            ms = self.samples.get(stage, [])
+            out[stage] = {
+                "count": len(ms),
+                "errors": self.errors.get(stage, 0),
+                "throughput_rps": round(len(ms) / wall, 3) if wall else 0.0,
+                "mean_ms": round(sum(ms) / len(ms), 2) if ms else 0.0,
+                "p50_ms": round(percentile(ms, 50), 2),
+                "p95_ms": round(percentile(ms, 95), 2),
+                "p99_ms": round(percentile(ms, 99), 2),
+                "max_ms": round(max(ms), 2) if ms else 0.0,
+            }
+            if self.error_samples.get(stage):
+                out[stage]["error_samples"] = self.error_samples[stage]
+        return out
+
+
+# ---------------- Stage calls ----------------
+def _check(resp: httpx.Response) -> httpx.Response:
+    if resp.status_code >= 400:
+        raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+    return resp
+
+
+async def voice_login(client, url: str, audio: bytes, name: str, trace: str) -> str:
+    resp = _check(await client.post(f"{url}/voice-login", files={"file": (name, audio)},
+                                    headers={"X-Trace-ID": trace}))
+    return resp.json()["token"]
+
+
+async def transcribe(client, url: str, audio: bytes, name: str, trace: str) -> str:
+    resp = _check(await client.post(f"{url}/transcribe", files={"file": (name, audio)},
+                                    headers={"X-Trace-ID": trace}))
+    return resp.json().get("text", "")
+
+
+async def chat(client, url: str, token: str, session: str, message: str, trace: str) -> str:
+    resp = _check(await client.post(f"{url}/chat", json={"message": message}, headers={
+        "Authorization": f"Bearer {token}", "X-Session-ID": session, "X-Trace-ID": trace}))
+    return resp.json().get("reply", "")
+
+
+async def chat_stream(client, url: str, token: str, session: str, message: str, trace: str, rec: Recorder) -> str:
+    t0 = time.perf_counter()
+    reply, event = "", None
+    headers = {"Authorization": f"Bearer {token}", "X-Session-ID": session, "X-Trace-ID": trace}
+    async with client.stream("POST", f"{url}/chat/stream", json={"message": message}, headers=headers) as resp:
+        if resp.status_code >= 400:
+            raise RuntimeError(f"HTTP {resp.status_code}: {(await resp.aread())[:200]!r}")
+        first = True
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = json.loads(line[6:])
+                if event == "token" and first:
+                    rec.samples["chat_ttft"].append((time.perf_counter() - t0) * 1000)
+                    first = False
+                elif event == "done":
+                    reply = data.get("reply", "")
+                elif event == "error":
+                    raise RuntimeError(data.get("detail"))
+    return reply
+
+
+async def tts(client, url: str, text: str, trace: str) -> int:
+    resp = _check(await client.post(f"{url}/tts", json={"text": text, "audio_format": "mp3"},
+                                    headers={"X-Trace-ID": trace}))
+    return len(resp.content)
+
+
+# ---------------- Driver ----------------
+async def virtual_user(uid: int, args, client, audios, script, rec: Recorder):
+    stages = set(args.stages)
+    token: Optional[str] = None
+    name, audio = audios[uid % len(audios)]
+    if "voice_login" in stages:
+        token = await rec.timed("voice_login", voice_login(client, args.voiceauth_url, audio, name, f"bench{uid}login"))
+    if token is None:
+        token = mint_jwt(args.user, args.jwt_secret)
+
+    for turn in range(args.turns):
+        trace = f"bench{uid}t{turn}{time.time_ns() % 10**9}"
+        t0 = time.perf_counter()
+        name, audio = audios[(uid + turn) % len(audios)]
+        message = script[(uid + turn) % len(script)]
+        ok = True
+        if "transcribe" in stages:
+            text = await rec.timed("transcribe", transcribe(client, args.stt_url, audio, name, trace))
+            ok = ok and text is not None
+            if args.chat_from_transcript and text:
+                message = text
+        reply = message
+        if "chat" in stages:
+            if args.stream:
+                reply = await rec.timed("chat", chat_stream(client, args.llm_url, token, f"bench-{uid}", message, trace, rec))
+            else:
+                reply = await rec.timed("chat", chat(client, args.llm_url, token, f"bench-{uid}", message, trace))
+            ok = ok and reply is not None
+        if "tts" in stages:
+            ok = ok and await rec.timed("tts", tts(client, args.tts_url, reply or message, trace)) is not None
+        if ok:
+            rec.samples["turn"].append((time.perf_counter() - t0) * 1000)
+
+
+async def run(args) -> Dict[str, object]:
+    audios = []
+    for path in args.audio:
+        with open(path, "rb") as f:
+            audios.append((os.path.basename(path), f.read()))
+    with open(args.script, encoding="utf-8") as f:
+        script = json.load(f)
+
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        if "voice_login" in args.stages:
+            # Enroll the fixture speaker so /voice-login has someone to match
+            _check(await client.post(f"{args.voiceauth_url}/enroll/{args.user}",
+                                     files={"file": (audios[0][0], audios[0][1])}))
+        t0 = time.perf_counter()
+        await asyncio.gather(*[virtual_user(u, args, client, audios, script, rec) for u in range(args.users)])
+        wall = time.perf_counter() - t0
+
+    return {
+        "meta": {
+            **git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+        },
+        "wall_s": round(wall, 3),
+        "turns_per_s": round(len(rec.samples["turn"]) / wall, 3) if wall else 0.0,
+        "stages": rec.summary(wall),
+    }
+
+
+def compare(old_path: str, new_path: str):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"old {(old['meta'].get('commit') or '?')[:10]}  new {(new['meta'].get('commit') or '?')[:10]}")
+    print(f"{'stage':12s} {'metric':14s} {'old':>10s} {'new':>10s} {'delta':>8s}")
+    for stage in sorted(set(old["stages"]) | set(new["stages"])):
+        a, b = old["stages"].get(stage, {}), new["stages"].get(stage, {})
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "errors"):
+            x, y = a.get(metric, 0), b.get(metric, 0)
+            delta = f"{(y - x) / x * 100:+.1f}%" if x else "n/a"
+            print(f"{stage:12s} {metric:14s} {x:10.2f} {y:10.2f} {delta:>8s}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    stack = run_stack.urls()
+    ap.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    ap.add_argument("--turns", type=int, default=5, help="voice turns per user")
+    ap.add_argument("--stages", nargs="*", choices=STAGES, default=STAGES)
+    ap.add_argument("--audio", nargs="*", default=DEFAULT_AUDIO, help="audio fixtures (wav/mp3/webm)")
+    ap.add_argument("--script", default=DEFAULT_SCRIPT, help="JSON list of chat messages")
+    ap.add_argument("--chat-from-transcript", action="store_true", help="send the transcript instead of the script")
+    ap.add_argument("--stream", action="store_true", help="use /chat/stream and record chat_ttft")
+    ap.add_argument("--user", default="Alice", help="enrolled speaker / JWT subject (must exist in the DB)")
+    ap.add_argument("--jwt-secret", default=os.getenv("JWT_SECRET", "supersecret"))
+    ap.add_argument("--llm-url", default=stack["llm-backend"])
+    ap.add_argument("--stt-url", default=stack["stt"])
+    ap.add_argument("--tts-url", default=stack["tts"])
+    ap.add_argument("--voiceauth-url", default=stack["voiceauth"])
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--launch", action="store_true", help="start stubs + services via run_stack for this run")
+    ap.add_argument("--latency-ms", type=float, default=100.0, help="stub Ollama latency (with --launch)")
+    ap.add_argument("--tokens-per-sec", type=float, default=50.0, help="stub Ollama token rate (with --launch)")
+    ap.add_argument("--out", help="result JSON (default results/<timestamp>-<commit>.json)")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files and exit")
+    args = ap.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    procs = []
+    if args.launch:
+        needed = {"voice_login": "voiceauth", "transcribe": "stt", "chat": "llm-backend", "tts": "tts"}
+        procs = run_stack.start([needed[s] for s in args.stages], args.latency_ms, args.tokens_per_sec)
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        run_stack.stop(procs)
+
+    out = args.out
+    if not out:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(HERE, "results", f"{stamp}-{(result['meta']['commit'] or 'nogit')[:8]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"wall={result['wall_s']}s turns/s={result['turns_per_s']}")
+    for stage, s in result["stages"].items():
+        print(f"{stage:12s} n={s['count']:5d} err={s['errors']:3d} rps={s['throughput_rps']:8.2f} "
+              f"p50={s['p50_ms']:8.1f}ms p95={s['p95_ms']:8.1f}ms p99={s['p99_ms']:8.1f}ms")
+    print("wrote", out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Disposable Postgres for benchmarks: schema + seed + migrations, in a local container.
+
+    python pg_fixture.py up          # start postgres:16 on 127.0.0.1:55432 and load chat-stack/*.sql
+    python pg_fixture.py reset       # reload the schema/seed into the running container
+    python pg_fixture.py down        # remove the container
+    python pg_fixture.py env         # print the PG* variables for the chat backend
+
+--external loads the SQL into an existing server reachable with the PG* env vars
+(via psql) instead of starting a container.
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHAT_STACK = os.path.join(ROOT, "chat-stack")
+CONTAINER = os.getenv("BENCH_PG_CONTAINER", "bank-bench-pg")
+IMAGE = os.getenv("BENCH_PG_IMAGE", "postgres:16")
+PORT = int(os.getenv("BENCH_PG_PORT", "55432"))
+USER, PASSWORD, DB = "bankuser", "bankpass", "bankdb"
+
+
+def env() -> dict:
+    return {"PGHOST": "127.0.0.1", "PGPORT": str(PORT), "PGUSER": USER, "PGPASSWORD": PASSWORD, "PGDATABASE": DB}
+
+
+def sql_files():
+    files = [os.path.join(CHAT_STACK, "schema.sql"), os.path.join(CHAT_STACK, "seed.sql")]
+    return files + sorted(glob.glob(os.path.join(CHAT_STACK, "migrations", "*.sql")))
+
+
+def _psql(args, sql: str):
+    subprocess.run(args + ["-v", "ON_ERROR_STOP=1", "-q"], input=sql.encode(), check=True)
+
+
+def load(external: bool):
+    drop = "DROP SCHEMA public CASCADE; CREATE SCHEMA public;"
+    if external:
+        base = ["psql"]
+    else:
+        base = ["docker", "exec", "-i", CONTAINER, "psql", "-U", USER, "-d", DB]
+    _psql(base, drop)
+    for path in sql_files():
+        print("loading", os.path.relpath(path, ROOT))
+        with open(path, encoding="utf-8") as f:
+            _psql(base, f.read())
+
+
+def up():
+    running = subprocess.run(["docker", "ps", "-q", "-f", f"name=^{CONTAINER}$"], capture_output=True, text=True)
+    if not running.stdout.strip():
+        subprocess.run([
+            "docker", "run", "-d", "--rm", "--name", CONTAINER,
+            "-e", f"POSTGRES_USER={USER}", "-e", f"POSTGRES_PASSWORD={PASSWORD}", "-e", f"POSTGRES_DB={DB}",
+            "-p", f"127.0.0.1:{PORT}:5432", IMAGE,
+        ], check=True)
+    deadline = time.time() + 60
+    # Check over TCP: the init-time server only listens on the unix socket
+    while subprocess.run(["docker", "exec", CONTAINER, "pg_isready", "-h", "127.0.0.1", "-U", USER, "-d", DB],
+                         capture_output=True).returncode != 0:
+        if time.time() > deadline:
+            sys.exit("postgres did not become ready")
+        time.sleep(0.5)
+    load(external=False)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("action", choices=["up", "reset", "down", "env"])
+    ap.add_argument("--external", action="store_true", help="use the server in the PG* env vars")
+    args = ap.parse_args()
+
+    if args.action == "up":
+        load(external=True) if args.external else up()
+    elif args.action == "reset":
+        load(args.external)
+    elif args.action == "down":
+        subprocess.run(["docker", "rm", "-f", CONTAINER], check=False)
+    if args.action in ("up", "env") and not args.external:
+        for k, v in env().items():
+            print(f"export {k}={v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Run the whole voice stack locally against stubs, for benchmarks.
+
+Starts the stub Ollama (canned intents/replies from fixtures/replies.json), the
+stub exchange-rate providers and the four services under uvicorn, with
+PYTHONPATH pointing at common/. Postgres comes from pg_fixture.py (or the PG*
+env vars already set). Ctrl-C stops everything.
+
+    python pg_fixture.py up
+    python run_stack.py                                   # all four services
+    python run_stack.py --services llm-backend stt        # just these
+    python run_stack.py --latency-ms 300 --tokens-per-sec 15
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import urllib.request
+
+import pg_fixture
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "chat-stack", "backend")
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# name -> (working dir, uvicorn app, port, readiness path)
+SERVICES = {
+    "llm-backend": (BACKEND, "server:app", 5000, "/docs"),
+    "stt": (os.path.join(ROOT, "stt-backend"), "app:app", 8000, "/healthz"),
+    "tts": (os.path.join(ROOT, "tts-backend"), "server:app", 8001, "/healthz"),
+    "voiceauth": (os.path.join(ROOT, "voiceAuth"), "voice_auth:app", 8002, "/healthz"),
+}
+STUB_OLLAMA_PORT = 11435
+STUB_RATES_PORTS = {"exchangerate.host": 8701, "duckduckgo": 8702}
+
+
+def urls(host: str = "127.0.0.1") -> dict:
+    return {name: f"http://{host}:{port}" for name, (_, _, port, _) in SERVICES.items()}
+
+
+def _wait(url: str, proc: subprocess.Popen, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as r:
+                if r.status < 500:
+                    return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def start(services=None, latency_ms: float = 100.0, tokens_per_sec: float = 50.0,
+          replies: str = os.path.join(FIXTURES, "replies.json"), ready_timeout: float = 600.0):
+    """Start stubs + services; returns the list of child processes (pass to stop())."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.join(ROOT, "common"), env.get("PYTHONPATH")]))
+    if "PGHOST" not in os.environ:
+        env.update(pg_fixture.env())
+    env.update({
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{STUB_OLLAMA_PORT}",
+        "EXCHANGERATE_HOST_URL": f"http://127.0.0.1:{STUB_RATES_PORTS['exchangerate.host']}",
+        "DDG_URL": f"http://127.0.0.1:{STUB_RATES_PORTS['duckduckgo']}",
+        "RATE_PREFETCH": "false",
+    })
+
+    procs = [subprocess.Popen(
+        [sys.executable, "stub_ollama.py", "--port", str(STUB_OLLAMA_PORT), "--latency-ms", str(latency_ms),
+         "--tokens-per-sec", str(tokens_per_sec), "--replies", replies],
+        cwd=BACKEND, env=env,
+    )]
+    for kind, port in STUB_RATES_PORTS.items():
+        procs.append(subprocess.Popen([sys.executable, "stub_rates.py", "--kind", kind, "--port", str(port)],
+                                      cwd=BACKEND, env=env))
+    try:
+        for name in services or list(SERVICES):
+            cwd, app, port, ready = SERVICES[name]
+            print(f"starting {name} on :{port}")
+            proc = subprocess.Popen([sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port)],
+                                    cwd=cwd, env={**env, "SERVICE_NAME": name})
+            procs.append(proc)
+            _wait(f"http://127.0.0.1:{port}{ready}", proc, ready_timeout)
+            print(f"{name} ready")
+    except Exception:
+        stop(procs)
+        raise
+    return procs
+
+
+def stop(procs):
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--services", nargs="*", choices=sorted(SERVICES), default=list(SERVICES))
+    ap.add_argument("--latency-ms", type=float, default=100.0, help="stub Ollama time to first token")
+    ap.add_argument("--tokens-per-sec", type=float, default=50.0)
+    ap.add_argument("--replies", default=os.path.join(FIXTURES, "replies.json"))
+    args = ap.parse_args()
+
+    procs = start(args.services, args.latency_ms, args.tokens_per_sec, args.replies)
+    for name in args.services:
+        print(f"{name:12s} {urls()[name]}")
+    try:
+        while all(p.poll() is None for p in procs):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop(procs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import copy
+import base64
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Any, List, Tuple, Optional
+
+from db import get_conn, execute_prepared, as_pyformat
+from db_async import apool, query
+from cache import account_cache, MISS
+from instrumentation import timed_fn
+
+# ---------------- Banking operations ----------------
+# Structured results ({"kind": ..., ...}); the tools in server.py wrap them as strings
+# for the LLM path and render.py turns them into replies for the template path.
+# Balance and recent-transaction reads go through account_cache (tagged by user);
+# every write invalidates the users it touched once it has committed.
+# Each public operation is timed as a "db" stage for /metrics.
+def _invalidate(*users: str):
+    for u in set(users):
+        account_cache.invalidate(u)
+
+# Callers get their own copy of a cached result, so one that edits it (e.g. while
+# formatting a reply) cannot change what the next reader is served
+def _cache_get(key):
+    cached = account_cache.get(key)
+    return cached if cached is MISS else copy.deepcopy(cached)
+
+def _cache_set(key, result: Dict[str, Any], user_name: str, gen: int):
+    account_cache.set(key, copy.deepcopy(result), tag=user_name, gen=gen)
+
+@timed_fn("db")
+def fetch_balance(user_name: str) -> Dict[str, Any]:
+    key = ("balance", user_name)
+    cached = _cache_get(key)
+    if cached is not MISS:
+        return cached
+    gen = account_cache.generation(user_name)
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_prepared(cur, "balance_by_user", (user_name,))
+        row = cur.fetchone()
+    result = {"kind": "balance", "user": user_name, "balance": row["balance"] if row else None}
+    _cache_set(key, result, user_name, gen)
+    return result
+
+def _transfer_result(from_user: str, to_user: str, amount: Decimal, row) -> Dict[str, Any]:
+    return {
+        "kind": "transfer", "from_user": from_user, "to_user": to_user, "amount": amount,
+        "status": row["status"], "balance_from": row["balance_from"], "balance_to": row["balance_to"],
+    }
+
+@timed_fn("db")
+def perform_transfer(from_user: str, to_user: str, amount: float) -> Dict[str, Any]:
+    # One server-side call (transfer_funds): funds check, debit, credit and both ledger rows,
+    # with row locks taken in account-id order
+    amount = Decimal(str(amount))
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_prepared(cur, "transfer", (from_user, to_user, amount))
+        row = cur.fetchone()
+    if row["status"] == "ok":
+        _invalidate(from_user, to_user)
+    return _transfer_result(from_user, to_user, amount, row)
+
+@timed_fn("db")
+def perform_bulk_transfer(items: List[Tuple[str, str, float]]) -> List[Dict[str, Any]]:
+    """Scheduled payments: items are applied independently, in order, in one call."""
+    if not items:
+        return []
+    froms, tos, amounts = zip(*[(f, t, Decimal(str(a))) for f, t, a in items])
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_prepared(cur, "transfer_batch", (list(froms), list(tos), list(amounts)))
+        rows = cur.fetchall()
+    _invalidate(*froms, *tos)
+    return [_transfer_result(froms[r["idx"] - 1], tos[r["idx"] - 1], amounts[r["idx"] - 1], r) for r in rows]
+
+@timed_fn("db")
+def fetch_transactions(user_name: str, limit: int = 5) -> Dict[str, Any]:
+    key = ("transactions", user_name, limit)
+    cached = _cache_get(key)
+    if cached is not MISS:
+        return cached
+    gen = account_cache.generation(user_name)
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_prepared(cur, "recent_transactions", (user_name, limit))
+        rows = cur.fetchall()
+    result = {"kind": "transactions", "user": user_name, "items": [dict(r) for r in rows]}
+    _cache_set(key, result, user_name, gen)
+    return result
+
+@timed_fn("db")
+def create_beneficiary(user_name: str) -> Dict[str, Any]:
+    with get_conn() as conn, conn.cursor() as cur:
+        # Check if already exists
+        execute_prepared(cur, "user_by_name", (user_name,))
+        if cur.fetchone():
+            return {"kind": "beneficiary", "user": user_name, "status": "exists"}
+
+        cur.execute("INSERT INTO users (name) VALUES (%s) RETURNING id", (user_name,))
+        new_user_id = cur.fetchone()["id"]
+        cur.execute("INSERT INTO accounts (user_id, balance) VALUES (%s, %s)", (new_user_id, 0))
+    _invalidate(user_name)
+    return {"kind": "beneficiary", "user": user_name, "status": "added"}
+
+
+# ---------------- Transaction history ----------------
+# Keyset pagination on (created_at, id), newest first; served by
+# idx_transactions_account_created (migrations/002_transaction_history.sql).
+USER_ACCOUNTS_SQL = "SELECT a.id FROM accounts a JOIN users u ON u.id = a.user_id WHERE u.name = $1"
+
+def encode_cursor(created_at: datetime, txn_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{txn_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        ts, txn_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(ts), int(txn_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+def _as_datetime(value):
+    if isinstance(value, datetime) or value is None:
+        return value
+    return datetime(value.year, value.month, value.day)
+
+def history_query(user_name: str, limit: int, cursor: Optional[str] = None, category: Optional[str] = None,
+                  start: Optional[date] = None, end: Optional[date] = None) -> Tuple[str, List[Any]]:
+    """SQL ($n placeholders) and params for one history page; fetches limit + 1 rows to detect a next page."""
+    params: List[Any] = [user_name]
+    where = [f"t.account_id IN ({USER_ACCOUNTS_SQL})"]
+
+    def add(clause: str, *values):
+        params.extend(values)
+        where.append(clause.format(*range(len(params) - len(values) + 1, len(params) + 1)))
+
+    if category:
+        add("t.category = ${}", category)
+    if start:
+        add("t.created_at >= ${}", _as_datetime(start))
+    if end:
+        # An end date includes that whole day; an end datetime is an exclusive bound
+        add("t.created_at < ${}", end if isinstance(end, datetime) else _as_datetime(end + timedelta(days=1)))
+    if cursor:
+        add("(t.created_at, t.id) < (${}, ${})", *decode_cursor(cursor))
+    params.append(limit + 1)
+    sql = f"""
+        SELECT t.id, t.amount, t.category, t.description, t.created_at
+        FROM transactions t
+        WHERE {" AND ".join(where)}
+        ORDER BY t.created_at DESC, t.id DESC
+        LIMIT ${len(params)}
+    """
+    return sql, params
+
+def _history_page(user_name: str, limit: int, rows) -> Dict[str, Any]:
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit and items:
+        next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"])
+    return {"kind": "history", "user": user_name, "items": items, "next_cursor": next_cursor}
+
+def summary_query(user_name: str, months: int, category: Optional[str] = None) -> Tuple[str, List[Any]]:
+    """Spend per category per month from transaction_monthly_rollup, newest month first."""
+    today = date.today()
+    first = today.replace(day=1)
+    for _ in range(max(months, 1) - 1):
+        first = (first.replace(day=1) - date.resolution).replace(day=1)
+    params: List[Any] = [user_name, first]
+    cat_clause = ""
+    if category:
+        params.append(category)
+        cat_clause = "AND r.category = $3"
+    sql = f"""
+        SELECT r.month, r.category,
+               sum(r.txn_count) AS txn_count, sum(r.total_in) AS total_in, sum(r.total_out) AS total_out
+        FROM transaction_monthly_rollup r
+        WHERE r.account_id IN ({USER_ACCOUNTS_SQL}) AND r.month >= $2 {cat_clause}
+        GROUP BY r.month, r.category
+        ORDER BY r.month DESC, total_out DESC
+    """
+    return sql, params
+
+@timed_fn("db")
+def fetch_history(user_name: str, limit: int = 20, cursor: Optional[str] = None, category: Optional[str] = None,
+                  start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+    sql, params = history_query(user_name, limit, cursor, category, start, end)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(as_pyformat(sql, len(params)), params)
+        rows = cur.fetchall()
+    return _history_page(user_name, limit, rows)
+
+@timed_fn("db")
+def fetch_spending_summary(user_name: str, months: int = 6, category: Optional[str] = None) -> Dict[str, Any]:
+    sql, params = summary_query(user_name, months, category)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(as_pyformat(sql, len(params)), params)
+        rows = cur.fetchall()
+    return {"kind": "spending_summary", "user": user_name, "items": [dict(r) for r in rows]}
+
+
+# ---------------- Async variants (asyncpg) ----------------
+@timed_fn("db")
+async def afetch_balance(user_name: str) -> Dict[str, Any]:
+    key = ("balance", user_name)
+    cached = _cache_get(key)
+    if cached is not MISS:
+        return cached
+    gen = account_cache.generation(user_name)
+    async with apool.connection() as conn:
+        row = await conn.fetchrow(query("balance_by_user"), user_name)
+    result = {"kind": "balance", "user": user_name, "balance": row["balance"] if row else None}
+    _cache_set(key, result, user_name, gen)
+    return result
+
+@timed_fn("db")
+async def aperform_transfer(from_user: str, to_user: str, amount: float) -> Dict[str, Any]:
+    amount = Decimal(str(amount))
+    async with apool.connection() as conn:
+        row = await conn.fetchrow(query("transfer"), from_user, to_user, amount)
+    if row["status"] == "ok":
+        _invalidate(from_user, to_user)
+    return _transfer_result(from_user, to_user, amount, row)
+
+@timed_fn("db")
+async def aperform_bulk_transfer(items: List[Tuple[str, str, float]]) -> List[Dict[str, Any]]:
+    if not items:
+        return []
+    froms, tos, amounts = zip(*[(f, t, Decimal(str(a))) for f, t, a in items])
+    async with apool.connection() as conn:
+        rows = await conn.fetch(query("transfer_batch"), list(froms), list(tos), list(amounts))
+    _invalidate(*froms, *tos)
+    return [_transfer_result(froms[r["idx"] - 1], tos[r["idx"] - 1], amounts[r["idx"] - 1], r) for r in rows]
+
+@timed_fn("db")
+async def afetch_transactions(user_name: str, limit: int = 5) -> Dict[str, Any]:
+    key = ("transactions", user_name, limit)
+    cached = _cache_get(key)
+    if cached is not MISS:
+        return cached
+    gen = account_cache.generation(user_name)
+    async with apool.connection() as conn:
+        rows = await conn.fetch(query("recent_transactions"), user_name, limit)
+    result = {"kind": "transactions", "user": user_name, "items": [dict(r) for r in rows]}
+    _cache_set(key, result, user_name, gen)
+    return result
+
+@timed_fn("db")
+async def acreate_beneficiary(user_name: str) -> Dict[str, Any]:
+    async with apool.connection() as conn, conn.transaction():
+        if await conn.fetchrow(query("user_by_name"), user_name):
+            return {"kind": "beneficiary", "user": user_name, "status": "exists"}
+
+        new_user_id = await conn.fetchval("INSERT INTO users (name) VALUES ($1) RETURNING id", user_name)
+        await conn.execute("INSERT INTO accounts (user_id, balance) VALUES ($1, $2)", new_user_id, 0)
+    _invalidate(user_name)
+    return {"kind": "beneficiary", "user": user_name, "status": "added"}
+
+@timed_fn("db")
+async def afetch_history(user_name: str, limit: int = 20, cursor: Optional[str] = None, category: Optional[str] = None,
+                         start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+    sql, params = history_query(user_name, limit, cursor, category, start, end)
+    async with apool.connection() as conn:
+        rows = await conn.fetch(sql, *params)
+    return _history_page(user_name, limit, rows)
+
+@timed_fn("db")
+async def afetch_spending_summary(user_name: str, months: int = 6, category: Optional[str] = None) -> Dict[str, Any]:
+    sql, params = summary_query(user_name, months, category)
+    async with apool.connection() as conn:
+        rows = await conn.fetch(sql, *params)
+    return {"kind": "spending_summary", "user": user_name, "items": [dict(r) for r in rows]}
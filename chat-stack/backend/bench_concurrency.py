@@ -0,0 +1,91 @@
+"""Concurrency benchmark for the chat graph against a stub Ollama.
+
+Runs N concurrent sessions, each doing --turns chat turns, and reports
+requests/sec and p50/p99 turn latency. "async" awaits graph.ainvoke (the
+current /chat path); "blocking" calls graph.invoke on the event loop, which
+is what /chat used to do.
+
+    python bench_concurrency.py                          # 1, 10, 100 sessions, both modes
+    python bench_concurrency.py --sessions 10 --mode async --latency-ms 300
+    python bench_concurrency.py --with-db                # balance turns, needs Postgres
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+import stub_ollama
+from gateway import GatewayError
+from latency import percentile
+
+CONVERSATION_MESSAGES = ["hello there", "who are you", "tell me something nice"]
+DB_MESSAGES = ["what's my balance", "show my transactions"]
+
+
+async def run_session(graph, mode: str, session: str, turns: int, messages, latencies, shed):
+    for i in range(turns):
+        state = {"messages": [{"role": "user", "content": messages[i % len(messages)]}]}
+        config = {"configurable": {"thread_id": session}}
+        t0 = time.perf_counter()
+        try:
+            if mode == "async":
+                await graph.ainvoke(state, config=config)
+            else:
+                graph.invoke(state, config=config)  # blocks the loop, like the old /chat
+                await asyncio.sleep(0)
+        except GatewayError:
+            shed.append(1)  # the LLM gateway turned the turn away (would be a 503 over HTTP)
+            continue
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+
+async def run_level(graph, mode: str, sessions: int, turns: int, messages):
+    latencies, shed = [], []
+    t0 = time.perf_counter()
+    await asyncio.gather(*[
+        run_session(graph, mode, f"bench-{mode}-{sessions}-{s}", turns, messages, latencies, shed)
+        for s in range(sessions)
+    ])
+    wall = time.perf_counter() - t0
+    print(f"{mode:8s} sessions={sessions:4d} turns={len(latencies):5d} "
+          f"rps={len(latencies) / wall:8.2f} p50={percentile(latencies, 50):8.1f}ms "
+          f"p99={percentile(latencies, 99):8.1f}ms mean={statistics.fmean(latencies) if latencies else 0:8.1f}ms "
+          f"shed={len(shed)}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, nargs="*", default=[1, 10, 100])
+    ap.add_argument("--turns", type=int, default=3, help="turns per session")
+    ap.add_argument("--mode", choices=["async", "blocking", "both"], default="both")
+    ap.add_argument("--latency-ms", type=float, default=100.0, help="stub time to first token")
+    ap.add_argument("--tokens-per-sec", type=float, default=100.0)
+    ap.add_argument("--with-db", action="store_true", help="use balance/transaction turns (needs Postgres)")
+    args = ap.parse_args()
+
+    _, url = stub_ollama.serve(cfg=stub_ollama.StubConfig(args.latency_ms, args.tokens_per_sec))
+    os.environ["OLLAMA_BASE_URL"] = url
+    # Every NLU call goes to the (stub) LLM so each turn pays at least two model round trips
+    os.environ.setdefault("INTENT_CONFIDENCE_THRESHOLD", "1.01")
+
+    import server  # reads OLLAMA_BASE_URL at import
+
+    messages = DB_MESSAGES if args.with_db else CONVERSATION_MESSAGES
+    modes = ["async", "blocking"] if args.mode == "both" else [args.mode]
+    print(f"stub ollama at {url} latency={args.latency_ms}ms rate={args.tokens_per_sec} tok/s")
+
+    async def run():
+        if args.with_db:
+            await server.apool.open()
+        for mode in modes:
+            for n in args.sessions:
+                await run_level(server.graph, mode, n, args.turns, messages)
+        if args.with_db:
+            await server.apool.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
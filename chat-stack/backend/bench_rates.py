@@ -0,0 +1,116 @@
+"""Offline checks and timings for the exchange-rate service against stub providers.
+
+Runs each scenario on a fresh RateService wired to two local stubs and
+reports upstream request counts and lookup latency:
+
+  coalesce   --callers concurrent cold lookups of one pair -> one upstream call
+  hedge      slow primary, fast secondary -> answered after ~hedge delay, not the slow call
+  failover   primary answers with an error -> secondary used without waiting for the hedge
+  stale      both providers failing after a good answer -> last good answer served
+  cached     warm lookups -> served from memory
+
+    python bench_rates.py
+    python bench_rates.py --callers 500 --slow-ms 2000 --hedge-ms 100
+"""
+import time
+import asyncio
+import argparse
+
+import stub_rates
+from latency import percentile
+from rates import RateService, ExchangeRateHost, DuckDuckGo
+
+
+def make_service(args, primary_cfg, secondary_cfg, ttl=300.0):
+    _, p_url = stub_rates.serve(cfg=primary_cfg)
+    _, s_url = stub_rates.serve(cfg=secondary_cfg)
+    return RateService([ExchangeRateHost(p_url), DuckDuckGo(s_url)], ttl=ttl,
+                       timeout=args.timeout_ms / 1000, hedge_delay=args.hedge_ms / 1000)
+
+
+async def timed(coro):
+    t0 = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - t0) * 1000
+
+
+async def coalesce(args):
+    primary = stub_rates.StubRatesConfig("exchangerate.host", args.fast_ms)
+    secondary = stub_rates.StubRatesConfig("duckduckgo", args.fast_ms)
+    svc = make_service(args, primary, secondary)
+    results = await asyncio.gather(*[svc.get("USD", "EUR") for _ in range(args.callers)])
+    upstream = primary.requests + secondary.requests
+    await svc.stop()
+    ok = len(set(results)) == 1 and primary.requests == 1
+    return ok, f"callers={args.callers} upstream_requests={upstream} coalesced={svc.counters['coalesced']}"
+
+
+async def hedge(args):
+    primary = stub_rates.StubRatesConfig("exchangerate.host", args.slow_ms)
+    secondary = stub_rates.StubRatesConfig("duckduckgo", args.fast_ms)
+    svc = make_service(args, primary, secondary)
+    result, ms = await timed(svc.get("USD", "EUR"))
+    await svc.stop()
+    ok = ms < args.slow_ms and svc.wins["duckduckgo"] == 1
+    return ok, f"latency={ms:.0f}ms (primary {args.slow_ms:.0f}ms) winner={dict(svc.wins)} answer={result!r}"
+
+
+async def failover(args):
+    primary = stub_rates.StubRatesConfig("exchangerate.host", args.fast_ms, fail=True)
+    secondary = stub_rates.StubRatesConfig("duckduckgo", args.fast_ms)
+    svc = make_service(args, primary, secondary)
+    result, ms = await timed(svc.get("USD", "EUR"))
+    await svc.stop()
+    ok = svc.wins["duckduckgo"] == 1 and ms < args.hedge_ms + 3 * args.fast_ms
+    return ok, f"latency={ms:.0f}ms errors={dict(svc.provider_errors)} answer={result!r}"
+
+
+async def stale(args):
+    primary = stub_rates.StubRatesConfig("exchangerate.host", args.fast_ms)
+    secondary = stub_rates.StubRatesConfig("duckduckgo", args.fast_ms)
+    svc = make_service(args, primary, secondary, ttl=0.05)
+    first = await svc.get("USD", "EUR")
+    await asyncio.sleep(0.1)
+    primary.fail = secondary.fail = True
+    second = await svc.get("USD", "EUR")
+    await svc.stop()
+    ok = first == second and svc.counters["stale_served"] == 1
+    return ok, f"first={first!r} after_outage={second!r}"
+
+
+async def cached(args):
+    primary = stub_rates.StubRatesConfig("exchangerate.host", args.fast_ms)
+    secondary = stub_rates.StubRatesConfig("duckduckgo", args.fast_ms)
+    svc = make_service(args, primary, secondary)
+    _, cold = await timed(svc.get("USD", "EUR"))
+    warm = [(await timed(svc.get("USD", "EUR")))[1] for _ in range(1000)]
+    await svc.stop()
+    ok = primary.requests == 1
+    return ok, f"cold={cold:.1f}ms warm p50={percentile(warm, 50) * 1000:.1f}us p99={percentile(warm, 99) * 1000:.1f}us"
+
+
+SCENARIOS = {"coalesce": coalesce, "hedge": hedge, "failover": failover, "stale": stale, "cached": cached}
+
+
+async def run(args):
+    failed = 0
+    for name in args.scenarios:
+        ok, detail = await SCENARIOS[name](args)
+        failed += not ok
+        print(f"{name:9s} {'PASS' if ok else 'FAIL'}  {detail}")
+    return 1 if failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scenarios", nargs="*", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    ap.add_argument("--callers", type=int, default=200)
+    ap.add_argument("--fast-ms", type=float, default=20.0)
+    ap.add_argument("--slow-ms", type=float, default=1500.0)
+    ap.add_argument("--hedge-ms", type=float, default=100.0)
+    ap.add_argument("--timeout-ms", type=float, default=5000.0)
+    raise SystemExit(asyncio.run(run(ap.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Concurrent transfer stress benchmark against a local Postgres.
+
+Creates --accounts bench users, runs --transfers random transfers between them
+with --concurrency in flight, then checks that the total balance is conserved,
+that no balance went negative and that the ledger nets to zero.
+
+    python bench_transfers.py                                  # transfer_funds() engine
+    python bench_transfers.py --engine legacy                  # old read-modify-write path
+    python bench_transfers.py --transfers 20000 --concurrency 64 --accounts 50
+
+Connection settings come from the usual PG* env vars.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from decimal import Decimal
+
+import asyncpg
+
+from db import DB_CONFIG
+from latency import percentile
+
+MIGRATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "migrations", "001_transfer_funds.sql")
+PREFIX = "bench_user_"
+
+
+async def setup(pool, n_accounts: int, start_balance: Decimal):
+    async with pool.acquire() as conn:
+        with open(MIGRATION, encoding="utf-8") as f:
+            await conn.execute(f.read())
+        await cleanup(conn)
+        async with conn.transaction():
+            for i in range(n_accounts):
+                uid = await conn.fetchval(
+                    "INSERT INTO users (name, email) VALUES ($1, $2) RETURNING id",
+                    f"{PREFIX}{i}", f"{PREFIX}{i}@bench.local",
+                )
+                await conn.execute(
+                    "INSERT INTO accounts (user_id, account_number, account_type, balance) "
+                    "VALUES ($1, $2, 'checking', $3)",
+                    uid, f"B{i:08d}", start_balance,
+                )
+
+
+async def cleanup(conn):
+    await conn.execute(f"""
+        DELETE FROM transactions WHERE account_id IN (
+            SELECT a.id FROM accounts a JOIN users u ON u.id = a.user_id WHERE u.name LIKE '{PREFIX}%');
+        DELETE FROM accounts WHERE user_id IN (SELECT id FROM users WHERE name LIKE '{PREFIX}%');
+        DELETE FROM users WHERE name LIKE '{PREFIX}%';
+    """)
+
+
+async def totals(conn):
+    return await conn.fetchrow(f"""
+        SELECT
+            (SELECT coalesce(sum(a.balance), 0) FROM accounts a JOIN users u ON u.id = a.user_id
+             WHERE u.name LIKE '{PREFIX}%') AS balance,
+            (SELECT coalesce(min(a.balance), 0) FROM accounts a JOIN users u ON u.id = a.user_id
+             WHERE u.name LIKE '{PREFIX}%') AS min_balance,
+            (SELECT coalesce(sum(t.amount), 0) FROM transactions t
+             JOIN accounts a ON a.id = t.account_id JOIN users u ON u.id = a.user_id
+             WHERE u.name LIKE '{PREFIX}%') AS ledger
+    """)
+
+
+# ---------------- Engines ----------------
+async def transfer_function(conn, src, dst, amount):
+    row = await conn.fetchrow("SELECT status FROM transfer_funds($1, $2, $3)", src, dst, amount)
+    return row["status"]
+
+
+async def transfer_legacy(conn, src, dst, amount):
+    # The original six-round-trip read-modify-write transfer, kept for comparison
+    async with conn.transaction():
+        q = "SELECT a.id, a.balance FROM accounts a JOIN users u ON u.id=a.user_id WHERE u.name=$1"
+        acc_from = await conn.fetchrow(q, src)
+        acc_to = await conn.fetchrow(q, dst)
+        if acc_from["balance"] < amount:
+            return "insufficient_funds"
+        await conn.execute("UPDATE accounts SET balance=$1 WHERE id=$2", acc_from["balance"] - amount, acc_from["id"])
+        await conn.execute("UPDATE accounts SET balance=$1 WHERE id=$2", acc_to["balance"] + amount, acc_to["id"])
+        await conn.execute("INSERT INTO transactions (account_id, amount, description) VALUES ($1, $2, $3)",
+                           acc_from["id"], -amount, f"Transfer to {dst}")
+        await conn.execute("INSERT INTO transactions (account_id, amount, description) VALUES ($1, $2, $3)",
+                           acc_to["id"], amount, f"Transfer from {src}")
+    return "ok"
+
+
+ENGINES = {"function": transfer_function, "legacy": transfer_legacy}
+
+
+async def run(args):
+    pool = await asyncpg.create_pool(
+        database=DB_CONFIG["dbname"], user=DB_CONFIG["user"], password=DB_CONFIG["password"],
+        host=DB_CONFIG["host"], port=int(DB_CONFIG["port"]),
+        min_size=args.concurrency, max_size=args.concurrency,
+    )
+    await setup(pool, args.accounts, Decimal(args.start_balance))
+    async with pool.acquire() as conn:
+        before = await totals(conn)
+
+    engine = ENGINES[args.engine]
+    rng = random.Random(args.seed)
+    jobs = []
+    for _ in range(args.transfers):
+        a, b = rng.sample(range(args.accounts), 2)
+        jobs.append((f"{PREFIX}{a}", f"{PREFIX}{b}", Decimal(rng.randint(1, args.max_amount))))
+
+    queue = asyncio.Queue()
+    for j in jobs:
+        queue.put_nowait(j)
+    statuses = Counter()
+    latencies = []
+
+    async def worker():
+        async with pool.acquire() as conn:
+            while True:
+                try:
+                    src, dst, amount = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    statuses[await engine(conn, src, dst, amount)] += 1
+                except asyncpg.exceptions.DeadlockDetectedError:
+                    statuses["deadlock"] += 1
+                except Exception as e:
+                    statuses[f"error:{type(e).__name__}"] += 1
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    wall = time.perf_counter() - t0
+
+    async with pool.acquire() as conn:
+        after = await totals(conn)
+        if not args.keep:
+            await cleanup(conn)
+    await pool.close()
+
+    print(f"engine={args.engine} transfers={args.transfers} concurrency={args.concurrency} accounts={args.accounts}")
+    print(f"throughput={args.transfers / wall:.1f} transfers/s wall={wall:.2f}s "
+          f"p50={percentile(latencies, 50):.2f}ms p99={percentile(latencies, 99):.2f}ms")
+    print("statuses:", dict(statuses))
+    conserved = before["balance"] == after["balance"]
+    print(f"total balance before={before['balance']} after={after['balance']} "
+          f"{'CONSERVED' if conserved else 'NOT CONSERVED (lost updates)'}")
+    print(f"min balance={after['min_balance']} ledger net={after['ledger']}")
+    ok = conserved and after["min_balance"] >= 0 and after["ledger"] == 0
+    return 0 if ok else 1
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--engine", choices=sorted(ENGINES), default="function")
+    ap.add_argument("--transfers", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--accounts", type=int, default=20)
+    ap.add_argument("--start-balance", default="1000.00")
+    ap.add_argument("--max-amount", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--keep", action="store_true", help="leave bench rows in the database")
+    raise SystemExit(asyncio.run(run(ap.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Optional
+
+MISS = object()
+
+
+class TTLCache:
+    """Size-bounded LRU with a per-entry TTL and tag-based invalidation.
+
+    Entries can carry a tag (e.g. a user name). invalidate(tag) drops every
+    entry with that tag and bumps the tag's generation; a reader that captured
+    generation(tag) before going to the source passes it to set(), and the
+    write is skipped if an invalidation happened in between, so a slow read
+    can never re-insert data older than the write that invalidated it.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, enabled: bool = True):
+        self.max_entries = max(max_entries, 1)
+        self.ttl = ttl
+        self.enabled = enabled
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()   # key -> (expires_at, value, tag)
+        self._tags: Dict[Hashable, set] = defaultdict(set)
+        self._gen: Dict[Hashable, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0, "stale_sets": 0}
+
+    def get(self, key: Hashable):
+        if not self.enabled:
+            return MISS
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return MISS
+            expires_at, value, tag = entry
+            if expires_at <= now:
+                self._remove(key, tag)
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return MISS
+            self._data.move_to_end(key)
+            self.counters["hits"] += 1
+            return value
+
+    def generation(self, tag: Hashable) -> int:
+        with self._lock:
+            return self._gen[tag]
+
+    def set(self, key: Hashable, value: Any, tag: Hashable = None, gen: Optional[int] = None,
+            ttl: Optional[float] = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            if gen is not None and self._gen[tag] != gen:
+                self.counters["stale_sets"] += 1
+                return
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._untag(key, old[2])
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, tag)
+            self._tags[tag].add(key)
+            while len(self._data) > self.max_entries:
+                old_key, (_exp, _val, old_tag) = self._data.popitem(last=False)
+                self._untag(old_key, old_tag)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, tag: Hashable):
+        with self._lock:
+            self._gen[tag] += 1
+            for key in self._tags.pop(tag, ()):
+                self._data.pop(key, None)
+            self.counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def _remove(self, key: Hashable, tag: Hashable):
+        self._data.pop(key, None)
+        self._untag(key, tag)
+
+    def _untag(self, key: Hashable, tag: Hashable):
+        keys = self._tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            c = dict(self.counters)
+            c["size"] = len(self._data)
+        lookups = c["hits"] + c["misses"]
+        c.update({
+            "enabled": self.enabled,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "hit_rate": round(c["hits"] / lookups, 4) if lookups else 0.0,
+        })
+        return c
+
+
+# ---------------- Account snapshots ----------------
+# Per-user balance / recent-transaction results, tagged by user name. Writes in
+# this process invalidate immediately; writes from other replicas are bounded by the TTL.
+ACCOUNT_CACHE_ENABLED = os.getenv("ACCOUNT_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+ACCOUNT_CACHE_TTL = float(os.getenv("ACCOUNT_CACHE_TTL", "30"))
+ACCOUNT_CACHE_MAX = int(os.getenv("ACCOUNT_CACHE_MAX", "10000"))
+
+account_cache = TTLCache(ACCOUNT_CACHE_MAX, ACCOUNT_CACHE_TTL, enabled=ACCOUNT_CACHE_ENABLED)
@@ -0,0 +1,341 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor
+
+# ---------------- Config ----------------
+DB_CONFIG = {
+    "dbname": os.getenv("PGDATABASE", "bankdb"),
+    "user": os.getenv("PGUSER", "bankuser"),
+    "password": os.getenv("PGPASSWORD", "bankpass"),
+    "host": os.getenv("PGHOST", "localhost"),
+    "port": os.getenv("PGPORT", "5432"),
+}
+
+POOL_MIN_SIZE = int(os.getenv("PGPOOL_MIN_SIZE", "2"))
+POOL_MAX_SIZE = int(os.getenv("PGPOOL_MAX_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("PGPOOL_TIMEOUT", "5"))                  # seconds to wait for a free conn
+POOL_MAX_LIFETIME = float(os.getenv("PGPOOL_MAX_LIFETIME", "1800"))     # recycle conns older than this
+POOL_MAX_IDLE = float(os.getenv("PGPOOL_MAX_IDLE", "300"))              # close idle conns above min size
+POOL_HEALTHCHECK_AFTER = float(os.getenv("PGPOOL_HEALTHCHECK_AFTER", "30"))  # ping conns idle longer than this
+USE_PREPARED = os.getenv("PGPOOL_PREPARED", "true").lower() in {"1", "true", "yes"}
+
+# Bucket upper bounds (ms) for the acquire-latency histogram
+ACQUIRE_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers its age and which statements it has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.prepared = set()
+
+
+# ---------------- Pool ----------------
+class ConnectionPool:
+    def __init__(self, min_size: int, max_size: int, timeout: float,
+                 max_lifetime: float, max_idle: float, healthcheck_after: float):
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.healthcheck_after = healthcheck_after
+
+        self._idle = deque()
+        self._size = 0          # open + being-opened connections
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._stats = {
+            "acquired": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "opened": 0,
+            "closed": 0,
+            "recycled": 0,
+            "healthcheck_failures": 0,
+            "acquire_ms_total": 0.0,
+            "acquire_ms_max": 0.0,
+        }
+        self._acquire_hist = [0] * (len(ACQUIRE_BUCKETS_MS) + 1)
+
+    # -------- connection lifecycle --------
+    def _connect(self) -> PooledConnection:
+        conn = psycopg2.connect(**DB_CONFIG, connection_factory=PooledConnection,
+                                cursor_factory=RealDictCursor)
+        with self._cond:
+            self._stats["opened"] += 1
+        return conn
+
+    def _discard(self, conn: PooledConnection, recycled: bool = False):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats["closed"] += 1
+            if recycled:
+                self._stats["recycled"] += 1
+            self._cond.notify()
+
+    def _expired(self, conn: PooledConnection, now: float) -> bool:
+        return self.max_lifetime > 0 and now - conn.created_at > self.max_lifetime
+
+    def _healthy(self, conn: PooledConnection, now: float) -> bool:
+        if conn.closed:
+            return False
+        if now - conn.last_used < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["healthcheck_failures"] += 1
+            return False
+
+    def open(self):
+        """Pre-open min_size connections. Failures are logged, not raised, so the app can still boot."""
+        for _ in range(self.min_size):
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                print("DB pool warmup failed:", e)
+                return
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
+
+    # -------- acquire / release --------
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        while True:
+            conn, create = None, False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("connection pool is closed")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"no database connection available within {timeout:.1f}s "
+                            f"(pool size {self.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            else:
+                now = time.monotonic()
+                if self._expired(conn, now):
+                    self._discard(conn, recycled=True)
+                    continue
+                if not self._healthy(conn, now):
+                    self._discard(conn)
+                    continue
+
+            self._record_acquire(start, waited)
+            return conn
+
+    def release(self, conn: PooledConnection):
+        now = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+
+        if conn.closed or self._closed:
+            self._discard(conn)
+            return
+        if self._expired(conn, now):
+            self._discard(conn, recycled=True)
+            return
+        try:
+            # Never hand out a connection with an open or aborted transaction
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            self._discard(conn)
+            return
+
+        conn.last_used = now
+        with self._cond:
+            self._idle.append(conn)
+            self._reap_idle(now)
+            self._cond.notify()
+
+    def _reap_idle(self, now: float):
+        # Called with the lock held: trim long-idle conns from the cold end down to min_size
+        if self.max_idle <= 0:
+            return
+        while self._size > self.min_size and self._idle and now - self._idle[0].last_used > self.max_idle:
+            conn = self._idle.popleft()
+            self._size -= 1
+            self._stats["closed"] += 1
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _record_acquire(self, start: float, waited: bool):
+        elapsed_ms = (time.monotonic() - start) * 1000
+        with self._cond:
+            self._in_use += 1
+            self._stats["acquired"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["acquire_ms_total"] += elapsed_ms
+            self._stats["acquire_ms_max"] = max(self._stats["acquire_ms_max"], elapsed_ms)
+            for i, bound in enumerate(ACQUIRE_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    self._acquire_hist[i] += 1
+                    break
+            else:
+                self._acquire_hist[-1] += 1
+
+    # -------- metrics --------
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            s = dict(self._stats)
+            acquired = s["acquired"]
+            s.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "acquire_ms_avg": round(s["acquire_ms_total"] / acquired, 3) if acquired else 0.0,
+                "acquire_ms_histogram": {
+                    **{f"le_{b}": n for b, n in zip(ACQUIRE_BUCKETS_MS, self._acquire_hist)},
+                    "le_inf": self._acquire_hist[-1],
+                },
+            })
+        s["acquire_ms_total"] = round(s["acquire_ms_total"], 3)
+        s["acquire_ms_max"] = round(s["acquire_ms_max"], 3)
+        return s
+
+
+pool = ConnectionPool(
+    min_size=POOL_MIN_SIZE,
+    max_size=POOL_MAX_SIZE,
+    timeout=POOL_TIMEOUT,
+    max_lifetime=POOL_MAX_LIFETIME,
+    max_idle=POOL_MAX_IDLE,
+    healthcheck_after=POOL_HEALTHCHECK_AFTER,
+)
+
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection; commits on success, rolls back on error, always returns it."""
+    conn = pool.acquire()
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.release(conn)
+
+
+# ---------------- Prepared statements ----------------
+# Fixed tool queries, prepared once per server session and run with EXECUTE afterwards.
+PREPARED_QUERIES: Dict[str, str] = {
+    "balance_by_user": """
+        SELECT a.balance
+        FROM accounts a
+        JOIN users u ON u.id = a.user_id
+        WHERE u.name = $1
+        ORDER BY a.id
+        LIMIT 1
+    """,
+    "recent_transactions": """
+        SELECT t.amount, t.description, t.created_at
+        FROM transactions t
+        JOIN accounts a ON a.id = t.account_id
+        JOIN users u ON u.id = a.user_id
+        WHERE u.name = $1
+        ORDER BY t.created_at DESC, t.id DESC
+        LIMIT $2
+    """,
+    "user_by_name": "SELECT id FROM users WHERE name = $1",
+    # migrations/001_transfer_funds.sql
+    "transfer": "SELECT status, balance_from, balance_to FROM transfer_funds($1, $2, $3)",
+    "transfer_batch": """
+        SELECT idx, status, balance_from, balance_to
+        FROM transfer_funds_batch($1, $2, $3)
+        ORDER BY idx
+    """,
+}
+
+
+def as_pyformat(sql: str, nparams: int) -> str:
+    # $1..$n → %s so the same text can be run without PREPARE
+    for i in range(nparams, 0, -1):
+        sql = sql.replace(f"${i}", "%s")
+    return sql
+
+
+def execute_prepared(cur, name: str, params: Tuple = ()):
+    """Run one of PREPARED_QUERIES on `cur`, preparing it on this connection the first time."""
+    sql = PREPARED_QUERIES[name]
+    prepared = getattr(cur.connection, "prepared", None)
+    if not USE_PREPARED or prepared is None:
+        cur.execute(as_pyformat(sql, len(params)), params)
+        return
+
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        prepared.add(name)
+
+    if params:
+        placeholders = ", ".join(["%s"] * len(params))
+        cur.execute(f"EXECUTE {name} ({placeholders})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+
+import asyncpg
+
+from db import (
+    DB_CONFIG, POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_TIMEOUT, POOL_MAX_IDLE,
+    ACQUIRE_BUCKETS_MS, PREPARED_QUERIES, PoolTimeout,
+)
+
+# asyncpg has no age-based recycling; retire a connection after this many queries instead
+POOL_MAX_QUERIES = int(os.getenv("PGPOOL_MAX_QUERIES", "50000"))
+# Per-connection prepared statement LRU (asyncpg prepares and caches every query it runs)
+STATEMENT_CACHE_SIZE = int(os.getenv("PGPOOL_STATEMENT_CACHE", "100"))
+
+
+class AsyncConnectionPool:
+    """asyncpg pool with the same env sizing and metrics shape as db.ConnectionPool."""
+
+    def __init__(self):
+        self._pool: Optional[asyncpg.Pool] = None
+        self._open_lock = asyncio.Lock()
+        self._waiting = 0
+        self._in_use = 0
+        self._stats = {
+            "acquired": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "acquire_ms_total": 0.0,
+            "acquire_ms_max": 0.0,
+        }
+        self._acquire_hist = [0] * (len(ACQUIRE_BUCKETS_MS) + 1)
+
+    async def open(self):
+        async with self._open_lock:
+            if self._pool is not None:
+                return
+            self._pool = await asyncpg.create_pool(
+                database=DB_CONFIG["dbname"],
+                user=DB_CONFIG["user"],
+                password=DB_CONFIG["password"],
+                host=DB_CONFIG["host"],
+                port=int(DB_CONFIG["port"]),
+                min_size=min(POOL_MIN_SIZE, POOL_MAX_SIZE),
+                max_size=POOL_MAX_SIZE,
+                max_queries=POOL_MAX_QUERIES,
+                max_inactive_connection_lifetime=POOL_MAX_IDLE,
+                statement_cache_size=STATEMENT_CACHE_SIZE,
+            )
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._pool is None:
+            await self.open()
+        start = time.monotonic()
+        # Anything beyond the idle connections has to wait (or open a new one)
+        waited = self._pool.get_idle_size() == 0
+        self._waiting += 1
+        try:
+            conn = await self._pool.acquire(timeout=POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise PoolTimeout(
+                f"no database connection available within {POOL_TIMEOUT:.1f}s (pool size {POOL_MAX_SIZE})"
+            )
+        finally:
+            self._waiting -= 1
+        self._record_acquire(start, waited)
+        try:
+            yield conn
+        finally:
+            self._in_use -= 1
+            await self._pool.release(conn)
+
+    def _record_acquire(self, start: float, waited: bool):
+        elapsed_ms = (time.monotonic() - start) * 1000
+        self._in_use += 1
+        self._stats["acquired"] += 1
+        if waited:
+            self._stats["waits"] += 1
+        self._stats["acquire_ms_total"] += elapsed_ms
+        self._stats["acquire_ms_max"] = max(self._stats["acquire_ms_max"], elapsed_ms)
+        for i, bound in enumerate(ACQUIRE_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self._acquire_hist[i] += 1
+                break
+        else:
+            self._acquire_hist[-1] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        s = dict(self._stats)
+        acquired = s["acquired"]
+        s.update({
+            "size": self._pool.get_size() if self._pool else 0,
+            "idle": self._pool.get_idle_size() if self._pool else 0,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "min_size": POOL_MIN_SIZE,
+            "max_size": POOL_MAX_SIZE,
+            "acquire_ms_avg": round(s["acquire_ms_total"] / acquired, 3) if acquired else 0.0,
+            "acquire_ms_total": round(s["acquire_ms_total"], 3),
+            "acquire_ms_max": round(s["acquire_ms_max"], 3),
+            "acquire_ms_histogram": {
+                **{f"le_{b}": n for b, n in zip(ACQUIRE_BUCKETS_MS, self._acquire_hist)},
+                "le_inf": self._acquire_hist[-1],
+            },
+        })
+        return s
+
+
+apool = AsyncConnectionPool()
+
+
+def query(name: str) -> str:
+    """SQL text of a fixed tool query; asyncpg prepares it on first use per connection."""
+    return PREPARED_QUERIES[name]
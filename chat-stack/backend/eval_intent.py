@@ -0,0 +1,86 @@
+"""Offline evaluation of the local intent classifier against the LLM classifier.
+
+    python eval_intent.py                       # local classifier only
+    python eval_intent.py --llm                 # also query Ollama (OLLAMA_BASE_URL / MODEL_NAME)
+    python eval_intent.py --threshold 0.9 --data intent_eval.jsonl
+"""
+import os
+import time
+import argparse
+import statistics
+from typing import List, Tuple
+
+import intent
+from latency import percentile
+
+
+def latency_summary(ms: List[float]) -> str:
+    return (f"p50={percentile(ms, 50):.3f}ms p99={percentile(ms, 99):.3f}ms "
+            f"mean={statistics.fmean(ms) if ms else 0:.3f}ms")
+
+
+def eval_local(clf: intent.IntentClassifier, data: List[Tuple[str, str]]):
+    correct = covered = covered_correct = 0
+    ms = []
+    misses = []
+    for text, label in data:
+        t0 = time.perf_counter()
+        pred = clf.predict(text)
+        ms.append((time.perf_counter() - t0) * 1000)
+        correct += pred.intent == label
+        if pred.confidence >= clf.threshold:
+            covered += 1
+            covered_correct += pred.intent == label
+            if pred.intent != label:
+                misses.append((text, label, pred))
+
+    n = len(data)
+    print(f"local   accuracy={correct / n:.3f} (all predictions, n={n})")
+    print(f"local   fast-path coverage={covered / n:.3f} accuracy_on_fast_path="
+          f"{covered_correct / covered if covered else 0:.3f} threshold={clf.threshold}")
+    print(f"local   latency {latency_summary(ms)}")
+    for text, label, pred in misses:
+        print(f"  confident miss: {text!r} expected={label} got={pred.intent} ({pred.source}, {pred.confidence:.2f})")
+
+
+def eval_llm(data: List[Tuple[str, str]]):
+    from langchain_community.chat_models import ChatOllama
+
+    llm = ChatOllama(
+        base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+        model=os.getenv("MODEL_NAME", "qwen2.5:3b-instruct"),
+        temperature=0,
+    )
+    correct = 0
+    ms = []
+    for text, label in data:
+        t0 = time.perf_counter()
+        resp = llm.invoke([
+            {"role": "system", "content": intent.LLM_SYSTEM_PROMPT},
+            {"role": "user", "content": text},
+        ])
+        ms.append((time.perf_counter() - t0) * 1000)
+        correct += intent.normalize_llm_intent(resp.content) == label
+
+    print(f"llm     accuracy={correct / len(data):.3f} (n={len(data)})")
+    print(f"llm     latency {latency_summary(ms)}")
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--data", default=os.path.join(here, "intent_eval.jsonl"))
+    ap.add_argument("--train", default=intent.INTENT_TRAINING_FILE)
+    ap.add_argument("--threshold", type=float, default=intent.INTENT_CONFIDENCE_THRESHOLD)
+    ap.add_argument("--llm", action="store_true", help="also evaluate the Ollama classifier")
+    args = ap.parse_args()
+
+    data = intent.load_examples(args.data)
+    clf = intent.IntentClassifier(intent.load_examples(args.train), threshold=args.threshold)
+    eval_local(clf, data)
+    if args.llm:
+        eval_llm(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+import threading
+import concurrent.futures as cf
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict
+
+from latency import LatencyWindows
+
+# ---------------- Config ----------------
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))      # match OLLAMA_NUM_PARALLEL
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))                  # waiting calls before we shed load
+LLM_DEFAULT_DEADLINE = float(os.getenv("LLM_DEFAULT_DEADLINE", "60"))
+
+
+def _parse_pairs(raw: str, cast) -> Dict[str, Any]:
+    out = {}
+    for part in raw.split(","):
+        if ":" in part:
+            k, v = part.split(":", 1)
+            out[k.strip()] = cast(v)
+    return out
+
+
+# Lower number = served first. Short NLU classifications jump ahead of long generations.
+LLM_PRIORITIES = _parse_pairs(os.getenv("LLM_PRIORITIES", "embed:0,nlu:0,reasoning:1,conversation:2,summary:3"), int)
+# Total budget per call kind (queue wait + generation), seconds
+LLM_DEADLINES = _parse_pairs(os.getenv("LLM_DEADLINES", "embed:5,nlu:10,reasoning:45,conversation:60,summary:90"), float)
+
+
+class GatewayError(Exception):
+    status_code = 503
+
+    def __init__(self, detail: str, retry_after: int = 1):
+        super().__init__(detail)
+        self.retry_after = retry_after
+
+
+class GatewayBusy(GatewayError):
+    """Queue full, or the deadline ran out while waiting for a slot."""
+    status_code = 503
+
+
+class DeadlineExceeded(GatewayError):
+    """The model call itself ran past its deadline."""
+    status_code = 504
+
+
+# ---------------- Gateway ----------------
+class LLMGateway:
+    """Admission control in front of the model server: at most max_concurrency
+    calls in flight, a bounded priority queue behind them, and a deadline per call.
+
+    A released slot is handed straight to the best waiter (lowest priority number,
+    then FIFO), so a burst of conversation generations cannot starve NLU calls.
+    Async calls and call_sync (graph.invoke threads) share the same slots and queue;
+    waiters are concurrent.futures.Future so a slot can be handed across threads.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 priorities: Dict[str, int] = LLM_PRIORITIES, deadlines: Dict[str, float] = LLM_DEADLINES):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_queue = max(max_queue, 0)
+        self.priorities = priorities
+        self.deadlines = deadlines
+        self._active = 0
+        self._waiters = []                       # heap of (priority, seq, future); cancelled futures skipped lazily
+        self._queued = defaultdict(int)          # live waiters per kind
+        self._seq = itertools.count()
+        self._lock = threading.Lock()            # guards the slot state and counters for both paths
+        # call_sync runs the model call here so its deadline can be enforced; a call that
+        # overruns keeps its thread until it returns, but gives its slot back
+        self._sync_pool = cf.ThreadPoolExecutor(self.max_concurrency + self.max_queue, thread_name_prefix="llm-sync")
+        self._service_ewma = 2.0                 # seconds per call, for Retry-After
+        self.wait_ms = LatencyWindows()
+        self.service_ms = LatencyWindows()
+        self.counters = defaultdict(int)
+        self.max_depth = 0
+
+    # -------- async path --------
+    async def call(self, kind: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        deadline = time.monotonic() + self.deadlines.get(kind, LLM_DEFAULT_DEADLINE)
+        t0 = time.perf_counter()
+        fut = self._enqueue(kind)
+        if fut is not None:
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(fut), timeout=max(deadline - time.monotonic(), 0.001))
+            except asyncio.TimeoutError:
+                self._give_up(kind, fut)
+            except asyncio.CancelledError:
+                self._give_up(kind, fut, cancelled=True)
+                raise
+            finally:
+                self._dequeued(kind)
+        started = time.perf_counter()
+        self.wait_ms.record(kind, (started - t0) * 1000)
+        ok = False
+        try:
+            result = await asyncio.wait_for(fn(), timeout=max(deadline - time.monotonic(), 0.001))
+            ok = True
+            return result
+        except asyncio.TimeoutError:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(f"{kind} model call exceeded its deadline", self.retry_after())
+        finally:
+            self._observe(kind, time.perf_counter() - started, ok)
+            self._release()
+
+    # -------- sync path (graph.invoke) --------
+    def call_sync(self, kind: str, fn: Callable[[], Any]) -> Any:
+        deadline = time.monotonic() + self.deadlines.get(kind, LLM_DEFAULT_DEADLINE)
+        t0 = time.perf_counter()
+        fut = self._enqueue(kind)
+        if fut is not None:
+            try:
+                fut.result(timeout=max(deadline - time.monotonic(), 0.001))
+            except cf.TimeoutError:
+                self._give_up(kind, fut)
+            finally:
+                self._dequeued(kind)
+        started = time.perf_counter()
+        self.wait_ms.record(kind, (started - t0) * 1000)
+        ok = False
+        try:
+            call = self._sync_pool.submit(contextvars.copy_context().run, fn)
+            result = call.result(timeout=max(deadline - time.monotonic(), 0.001))
+            ok = True
+            return result
+        except cf.TimeoutError:
+            call.cancel()
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded(f"{kind} model call exceeded its deadline", self.retry_after())
+        finally:
+            self._observe(kind, time.perf_counter() - started, ok)
+            self._release()
+
+    # -------- slots --------
+    def _enqueue(self, kind: str):
+        """Takes a free slot (returns None) or queues a waiter future for one."""
+        with self._lock:
+            if self._active < self.max_concurrency and not self.depth():
+                self._active += 1
+                return None
+            if self.depth() >= self.max_queue:
+                self.counters["rejected_full"] += 1
+                raise GatewayBusy("model queue is full", self.retry_after())
+            fut = cf.Future()
+            heapq.heappush(self._waiters, (self.priorities.get(kind, max(self.priorities.values(), default=0) + 1),
+                                           next(self._seq), fut))
+            self._queued[kind] += 1
+            self.max_depth = max(self.max_depth, self.depth())
+            return fut
+
+    def _give_up(self, kind: str, fut: cf.Future, cancelled: bool = False):
+        if not fut.cancel():
+            # The slot was handed over just as we gave up: pass it on
+            self._release()
+        if not cancelled:
+            self._count("rejected_deadline")
+            raise GatewayBusy(f"{kind} call timed out waiting for the model", self.retry_after())
+
+    def _dequeued(self, kind: str):
+        with self._lock:
+            self._queued[kind] -= 1
+            if len(self._waiters) > 4 * max(self.max_queue, 1):
+                self._waiters = [w for w in self._waiters if not w[2].done()]
+                heapq.heapify(self._waiters)
+
+    def _release(self):
+        with self._lock:
+            while self._waiters:
+                _prio, _seq, fut = heapq.heappop(self._waiters)
+                # False when the waiter already gave up (cancelled)
+                if fut.set_running_or_notify_cancel():
+                    fut.set_result(None)   # slot moves to the waiter; _active unchanged
+                    return
+            self._active -= 1
+
+    # -------- metrics --------
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _observe(self, kind: str, seconds: float, ok: bool = True):
+        with self._lock:
+            self.counters["completed" if ok else "failed"] += 1
+            self._service_ewma = 0.8 * self._service_ewma + 0.2 * seconds
+        self.service_ms.record(kind, seconds * 1000)
+
+    def depth(self) -> int:
+        return sum(self._queued.values())
+
+    def saturated(self) -> bool:
+        return self._active >= self.max_concurrency and self.depth() >= self.max_queue
+
+    def admit(self):
+        """Early rejection before any work is done for a request (e.g. a chat turn)."""
+        with self._lock:
+            if self.saturated():
+                self.counters["rejected_admission"] += 1
+                raise GatewayBusy("model queue is full", self.retry_after())
+
+    def retry_after(self) -> int:
+        # Rough time for the current backlog to drain
+        backlog = (self.depth() + 1) / self.max_concurrency
+        return int(min(max(math.ceil(backlog * self._service_ewma), 1), 120))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {
+                "active": self._active,
+                "queue_depth": self.depth(),
+                "queue_depth_by_kind": {k: v for k, v in self._queued.items() if v},
+                "max_queue_depth": self.max_depth,
+                "retry_after_s": self.retry_after(),
+                **self.counters,
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            **snapshot,
+            "wait_ms": self.wait_ms.summary(),
+            "service_ms": self.service_ms.summary(),
+        }
+
+
+llm_gateway = LLMGateway()
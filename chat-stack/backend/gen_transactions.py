@@ -0,0 +1,177 @@
+"""Seed a realistic-scale ledger and benchmark the history queries against it.
+
+    python gen_transactions.py --users 2000 --transactions 5000000      # load (COPY in batches)
+    python gen_transactions.py --bench-only --samples 200                # just time the queries
+    python gen_transactions.py --drop                                    # remove generated rows
+
+Generated users are named gen_user_<n>. Applies migrations/002_transaction_history.sql
+before loading so the indexes and rollup trigger are in place. Uses the PG* env vars.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import asyncpg
+
+from db import DB_CONFIG
+from latency import percentile
+from db_async import apool
+from banking import afetch_history, afetch_spending_summary
+
+MIGRATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "migrations", "002_transaction_history.sql")
+PREFIX = "gen_user_"
+
+# (category, share of rows, amount range, sign)
+CATEGORIES = [
+    ("groceries", 0.22, (5, 180), -1),
+    ("food", 0.20, (3, 60), -1),
+    ("shopping", 0.15, (10, 400), -1),
+    ("utilities", 0.08, (40, 250), -1),
+    ("travel", 0.05, (50, 1500), -1),
+    ("entertainment", 0.08, (5, 120), -1),
+    ("transfer", 0.10, (10, 500), -1),
+    ("health", 0.04, (10, 300), -1),
+    ("salary", 0.04, (1500, 6000), 1),
+    ("refund", 0.04, (5, 200), 1),
+]
+DESCRIPTIONS = {
+    "groceries": ["Walmart purchase", "Costco", "Whole Foods"],
+    "food": ["Starbucks coffee", "Pizza night", "Lunch"],
+    "shopping": ["Amazon order", "Target", "Best Buy"],
+    "utilities": ["Electricity bill", "Water bill", "Internet"],
+    "travel": ["Flight booking", "Hotel", "Uber"],
+    "entertainment": ["Netflix", "Cinema", "Concert tickets"],
+    "transfer": ["Transfer to Bob", "Transfer to Charlie"],
+    "health": ["Pharmacy", "Dentist"],
+    "salary": ["Monthly salary deposit"],
+    "refund": ["Refund"],
+}
+
+
+async def connect():
+    return await asyncpg.connect(
+        database=DB_CONFIG["dbname"], user=DB_CONFIG["user"], password=DB_CONFIG["password"],
+        host=DB_CONFIG["host"], port=int(DB_CONFIG["port"]),
+    )
+
+
+async def drop(conn):
+    await conn.execute(f"""
+        DELETE FROM transactions WHERE account_id IN (
+            SELECT a.id FROM accounts a JOIN users u ON u.id = a.user_id WHERE u.name LIKE '{PREFIX}%');
+        DELETE FROM accounts WHERE user_id IN (SELECT id FROM users WHERE name LIKE '{PREFIX}%');
+        DELETE FROM users WHERE name LIKE '{PREFIX}%';
+    """)
+
+
+async def load(conn, args):
+    with open(MIGRATION, encoding="utf-8") as f:
+        await conn.execute(f.read())
+
+    existing = await conn.fetchval(f"SELECT count(*) FROM users WHERE name LIKE '{PREFIX}%'")
+    if existing:
+        print(f"dropping {existing} previously generated users")
+        await drop(conn)
+
+    rng = random.Random(args.seed)
+    await conn.copy_records_to_table(
+        "users", columns=["name", "email"],
+        records=[(f"{PREFIX}{i}", f"{PREFIX}{i}@gen.local") for i in range(args.users)],
+    )
+    user_ids = await conn.fetch(f"SELECT id FROM users WHERE name LIKE '{PREFIX}%' ORDER BY id")
+    await conn.copy_records_to_table(
+        "accounts", columns=["user_id", "account_number", "account_type", "balance"],
+        records=[(r["id"], f"G{n:09d}", "checking", Decimal("5000.00")) for n, r in enumerate(user_ids)],
+    )
+    account_ids = [r["id"] for r in await conn.fetch(
+        f"SELECT a.id FROM accounts a JOIN users u ON u.id = a.user_id WHERE u.name LIKE '{PREFIX}%'")]
+
+    weights = [c[1] for c in CATEGORIES]
+    now = datetime.now()
+    span = timedelta(days=30 * args.months).total_seconds()
+    loaded = 0
+    t0 = time.perf_counter()
+    while loaded < args.transactions:
+        n = min(args.batch, args.transactions - loaded)
+        cats = rng.choices(CATEGORIES, weights=weights, k=n)
+        records = []
+        for cat, _share, (lo, hi), sign in cats:
+            records.append((
+                rng.choice(account_ids),
+                Decimal(sign * rng.uniform(lo, hi)).quantize(Decimal("0.01")),
+                cat,
+                rng.choice(DESCRIPTIONS[cat]),
+                now - timedelta(seconds=rng.uniform(0, span)),
+            ))
+        await conn.copy_records_to_table(
+            "transactions", columns=["account_id", "amount", "category", "description", "created_at"],
+            records=records,
+        )
+        loaded += n
+        rate = loaded / (time.perf_counter() - t0)
+        print(f"loaded {loaded}/{args.transactions} transactions ({rate:,.0f} rows/s)")
+    await conn.execute("ANALYZE transactions; ANALYZE accounts; ANALYZE transaction_monthly_rollup;")
+
+
+async def bench(args):
+    rng = random.Random(args.seed + 1)
+    users = [f"{PREFIX}{rng.randrange(args.users)}" for _ in range(args.samples)]
+    timings = {"first_page": [], f"page_{args.deep_pages}": [], "category": [], "date_range": [], "summary_12m": []}
+
+    async def timed(key, coro):
+        t0 = time.perf_counter()
+        result = await coro
+        timings[key].append((time.perf_counter() - t0) * 1000)
+        return result
+
+    start = (datetime.now() - timedelta(days=60)).date()
+    for user in users:
+        page = await timed("first_page", afetch_history(user, 20))
+        t0 = time.perf_counter()
+        for _ in range(args.deep_pages - 1):
+            if not page["next_cursor"]:
+                break
+            page = await afetch_history(user, 20, page["next_cursor"])
+        timings[f"page_{args.deep_pages}"].append((time.perf_counter() - t0) * 1000 / max(args.deep_pages - 1, 1))
+        await timed("category", afetch_history(user, 20, category="groceries"))
+        await timed("date_range", afetch_history(user, 20, start=start))
+        await timed("summary_12m", afetch_spending_summary(user, 12))
+
+    for key, ms in timings.items():
+        print(f"{key:14s} n={len(ms):4d} p50={percentile(ms, 50):7.2f}ms p99={percentile(ms, 99):7.2f}ms")
+    await apool.close()
+
+
+async def run(args):
+    conn = await connect()
+    try:
+        if args.drop:
+            await drop(conn)
+            return
+        if not args.bench_only:
+            await load(conn, args)
+    finally:
+        await conn.close()
+    await bench(args)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--transactions", type=int, default=1_000_000)
+    ap.add_argument("--months", type=int, default=24, help="spread rows over this many months")
+    ap.add_argument("--batch", type=int, default=100_000)
+    ap.add_argument("--samples", type=int, default=100, help="users sampled for the query benchmark")
+    ap.add_argument("--deep-pages", type=int, default=10, help="follow the cursor this many pages")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--bench-only", action="store_true")
+    ap.add_argument("--drop", action="store_true")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
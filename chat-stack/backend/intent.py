@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# ---------------- Config ----------------
+# Predictions at or above this confidence skip the LLM. Set > 1 to always use the LLM.
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.85"))
+INTENT_TRAINING_FILE = os.getenv(
+    "INTENT_TRAINING_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.jsonl"),
+)
+
+INTENTS = ("balance", "transfer", "transactions", "exchange_rate", "add_beneficiary", "conversation")
+
+LLM_SYSTEM_PROMPT = (
+    "Classify the intent of the user query as one of: "
+    "balance, transfer, transactions, exchange_rate, add_beneficiary, or conversation. "
+    "Reply with only the intent keyword. "
+    "If the user confirms adding a new person (e.g. 'yes, add Charlie'), classify as add_beneficiary."
+)
+
+
+class Prediction(NamedTuple):
+    intent: str
+    confidence: float
+    source: str  # "rules" | "model"
+
+
+# ---------------- Rules ----------------
+# (intent, pattern, confidence). A message matching rules for exactly one intent is
+# answered from the rule; several competing intents defer to the n-gram model.
+RULES: List[Tuple[str, re.Pattern, float]] = [
+    ("add_beneficiary", re.compile(r"\b(yes|yeah|yep|sure|ok(ay)?|please)\b.*\badd\b", re.I), 0.97),
+    ("add_beneficiary", re.compile(r"\badd\b.*\b(beneficiary|payee|recipient)\b", re.I), 0.97),
+    ("add_beneficiary", re.compile(r"\b(new|register( a)?) (beneficiary|payee)\b", re.I), 0.95),
+    ("exchange_rate", re.compile(r"\b(exchange|conversion) rates?\b", re.I), 0.97),
+    ("exchange_rate", re.compile(r"\b(usd|eur|gbp|inr|aud|jpy|dollars?|euros?|pounds?|rupees?|yen)\b.*\b(to|in|into)\b"
+                                 r".*\b(usd|eur|gbp|inr|aud|jpy|dollars?|euros?|pounds?|rupees?|yen)\b", re.I), 0.93),
+    ("transfer", re.compile(r"\b(transfer|send|wire|remit)\b.*(\$|\d|\bto\b)", re.I), 0.93),
+    ("transfer", re.compile(r"\bpay\b.*\$?\d", re.I), 0.9),
+    ("transactions", re.compile(r"\b(transactions?|statement|(payment|purchase|spending) history)\b", re.I), 0.95),
+    ("transactions", re.compile(r"\b(recent|last|latest) (\d+ )?(payments|purchases|charges|debits|transactions)\b", re.I), 0.95),
+    ("balance", re.compile(r"\bbalances?\b", re.I), 0.95),
+    ("balance", re.compile(r"\bhow much (money )?(do i have|is (there )?in|is left|have i got)\b", re.I), 0.93),
+]
+
+
+def rule_match(text: str) -> Optional[Prediction]:
+    hits: Dict[str, float] = {}
+    for intent, pattern, conf in RULES:
+        if pattern.search(text):
+            hits[intent] = max(conf, hits.get(intent, 0.0))
+    if len(hits) != 1:
+        return None
+    intent, conf = next(iter(hits.items()))
+    return Prediction(intent, conf, "rules")
+
+
+# ---------------- N-gram model ----------------
+_TOKEN_RE = re.compile(r"[a-z]+|\d+|\$")
+
+
+def tokenize(text: str) -> List[str]:
+    words = ["<num>" if w.isdigit() else w for w in _TOKEN_RE.findall(text.lower())]
+    bigrams = [f"{a}_{b}" for a, b in zip(words, words[1:])]
+    return words + bigrams
+
+
+class NGramClassifier:
+    """Multinomial naive Bayes over word unigrams + bigrams."""
+
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.priors: Dict[str, float] = {}
+        self.loglik: Dict[str, Dict[str, float]] = {}
+        self.unseen: Dict[str, float] = {}
+        self.vocab = set()
+
+    def fit(self, examples: List[Tuple[str, str]]) -> "NGramClassifier":
+        counts: Dict[str, Counter] = defaultdict(Counter)
+        docs = Counter()
+        for text, intent in examples:
+            counts[intent].update(tokenize(text))
+            docs[intent] += 1
+        self.vocab = {tok for c in counts.values() for tok in c}
+        total_docs = sum(docs.values())
+        v = len(self.vocab)
+        for intent, c in counts.items():
+            denom = sum(c.values()) + self.alpha * v
+            self.priors[intent] = math.log(docs[intent] / total_docs)
+            self.loglik[intent] = {tok: math.log((n + self.alpha) / denom) for tok, n in c.items()}
+            self.unseen[intent] = math.log(self.alpha / denom)
+        return self
+
+    def predict(self, text: str) -> Prediction:
+        toks = [t for t in tokenize(text) if t in self.vocab]
+        if not toks or not self.priors:
+            return Prediction("conversation", 0.0, "model")
+        scores = {
+            intent: prior + sum(self.loglik[intent].get(t, self.unseen[intent]) for t in toks)
+            for intent, prior in self.priors.items()
+        }
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        z = sum(math.exp(s - top) for s in scores.values())
+        return Prediction(best, 1.0 / z, "model")
+
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                row = json.loads(line)
+                examples.append((row["text"], row["intent"]))
+    return examples
+
+
+# ---------------- Classifier ----------------
+class IntentClassifier:
+    def __init__(self, examples: List[Tuple[str, str]], threshold: float = INTENT_CONFIDENCE_THRESHOLD):
+        self.threshold = threshold
+        self.model = NGramClassifier().fit(examples)
+        self._lock = threading.Lock()
+        self.counters = {"rules": 0, "model": 0, "llm": 0}
+
+    def predict(self, text: str) -> Prediction:
+        return rule_match(text) or self.model.predict(text)
+
+    def classify(self, text: str) -> Optional[Prediction]:
+        """Return a confident local prediction, or None when the caller should ask the LLM."""
+        pred = self.predict(text)
+        if pred.confidence >= self.threshold:
+            self.count(pred.source)
+            return pred
+        return None
+
+    def count(self, path: str):
+        with self._lock:
+            self.counters[path] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            c = dict(self.counters)
+        total = sum(c.values())
+        c["total"] = total
+        c["fast_path_ratio"] = round((c["rules"] + c["model"]) / total, 4) if total else 0.0
+        c["threshold"] = self.threshold
+        return c
+
+
+def normalize_llm_intent(reply: str) -> str:
+    """Map a free-text LLM reply onto one of INTENTS, the same way route_intent reads it."""
+    r = reply.lower().strip()
+    if "beneficiary" in r:
+        return "add_beneficiary"
+    if "exchange" in r or "rate" in r:
+        return "exchange_rate"
+    if "transaction" in r:
+        return "transactions"
+    if "transfer" in r:
+        return "transfer"
+    if "balance" in r:
+        return "balance"
+    return "conversation"
+
+
+def load_classifier() -> IntentClassifier:
+    return IntentClassifier(load_examples(INTENT_TRAINING_FILE))
@@ -0,0 +1,42 @@
+import threading
+from collections import deque, defaultdict
+from typing import Dict, List
+
+# ---------------- Rolling latency windows ----------------
+LATENCY_WINDOW = 1000  # samples kept per key
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[k]
+
+
+class LatencyWindows:
+    """Last-N latency samples per key (e.g. "balance/template"), summarized as p50/p99."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=size))
+        self._counts = defaultdict(int)
+
+    def record(self, key: str, ms: float):
+        with self._lock:
+            self._samples[key].append(ms)
+            self._counts[key] += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            snap = {k: list(v) for k, v in self._samples.items()}
+            counts = dict(self._counts)
+        return {
+            k: {
+                "count": counts[k],
+                "p50_ms": round(percentile(v, 50), 2),
+                "p99_ms": round(percentile(v, 99), 2),
+                "max_ms": round(max(v), 2) if v else 0.0,
+            }
+            for k, v in snap.items()
+        }
@@ -0,0 +1,240 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.messages import AIMessage
+
+from cache import TTLCache, MISS
+
+# ---------------- Config ----------------
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "600"))
+LLM_CACHE_MAX = int(os.getenv("LLM_CACHE_MAX", "5000"))
+LLM_CACHE_NODES = os.getenv("LLM_CACHE_NODES", "nlu,reasoning")        # nodes served from cache
+LLM_CACHE_FORCE = os.getenv("LLM_CACHE_FORCE", "false").lower() in {"1", "true", "yes"}  # cache even if temperature > 0
+
+# Optional similarity tier: the last user message is embedded and matched against
+# earlier calls with an otherwise identical prompt (same system text, history, model).
+LLM_CACHE_SEMANTIC = os.getenv("LLM_CACHE_SEMANTIC", "false").lower() in {"1", "true", "yes"}
+LLM_CACHE_SEMANTIC_NODES = os.getenv("LLM_CACHE_SEMANTIC_NODES", "nlu")
+LLM_CACHE_SIMILARITY = float(os.getenv("LLM_CACHE_SIMILARITY", "0.92"))
+LLM_CACHE_SEMANTIC_MAX = int(os.getenv("LLM_CACHE_SEMANTIC_MAX", "2000"))
+LLM_CACHE_EMBED_MODEL = os.getenv("LLM_CACHE_EMBED_MODEL", "nomic-embed-text")
+
+
+def _nodes(raw: str) -> set:
+    return {n.strip() for n in raw.split(",") if n.strip()}
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", str(text)).strip().lower().rstrip("?!. ")
+
+
+def _digest(parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+
+class Probe:
+    """Cache coordinates for one model call."""
+
+    def __init__(self, node: str, model: str, temperature: float, messages: List[Dict[str, str]]):
+        self.node = node
+        norm = [[m.get("role", ""), normalize(m.get("content", ""))] for m in messages]
+        self.key = _digest([model, temperature, norm])
+        # Everything but the trailing user message: semantic matches only within the same context
+        last_user = bool(norm) and norm[-1][0] == "user"
+        self.context_key = _digest([model, temperature, norm[:-1] if last_user else norm])
+        self.query = norm[-1][1] if last_user else ""
+        self.vector: Optional[np.ndarray] = None
+
+
+# ---------------- Similarity tier ----------------
+class SemanticIndex:
+    """Normalized embeddings grouped by prompt context, cosine match above a threshold, LRU + TTL."""
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float):
+        self.max_entries = max(max_entries, 1)
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()   # id -> (context_key, vector, value, expires_at)
+        self._matrices: Dict[str, Tuple[List[int], np.ndarray]] = {}
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def search(self, context_key: str, vector: np.ndarray) -> Tuple[Any, float]:
+        with self._lock:
+            ids, matrix = self._matrix(context_key)
+            if not ids:
+                return MISS, 0.0
+            sims = matrix @ vector
+            best = int(np.argmax(sims))
+            score = float(sims[best])
+            entry_id = ids[best]
+            if score < self.threshold:
+                return MISS, score
+            _ctx, _vec, value, expires_at = self._entries[entry_id]
+            if expires_at <= time.monotonic():
+                self._drop(entry_id)
+                return MISS, score
+            self._entries.move_to_end(entry_id)
+            return value, score
+
+    def add(self, context_key: str, vector: np.ndarray, value: Any):
+        with self._lock:
+            self._ids += 1
+            self._entries[self._ids] = (context_key, vector, value, time.monotonic() + self.ttl)
+            self._matrices.pop(context_key, None)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, entry_id: int):
+        ctx = self._entries.pop(entry_id)[0]
+        self._matrices.pop(ctx, None)
+
+    def _matrix(self, context_key: str) -> Tuple[List[int], np.ndarray]:
+        # Stacked vectors per context, rebuilt only after that context changes
+        cached = self._matrices.get(context_key)
+        if cached is None:
+            ids = [i for i, e in self._entries.items() if e[0] == context_key]
+            matrix = np.stack([self._entries[i][1] for i in ids]) if ids else np.zeros((0, 1), dtype=np.float32)
+            cached = self._matrices[context_key] = (ids, matrix)
+        return cached
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# ---------------- Response cache ----------------
+class ResponseCache:
+    """Caches model replies by normalized prompt + model + temperature.
+
+    Only nodes in `nodes` are served from the cache. Every other node is tracked
+    in a key-only shadow cache, so stats() shows the hit rate it *would* get.
+    Calls with temperature > 0 are not cached unless `force` is set.
+    """
+
+    def __init__(self, enabled: bool = LLM_CACHE_ENABLED, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX,
+                 nodes: str = LLM_CACHE_NODES, force: bool = LLM_CACHE_FORCE,
+                 semantic: bool = LLM_CACHE_SEMANTIC, semantic_nodes: str = LLM_CACHE_SEMANTIC_NODES,
+                 embed: Optional[Callable[[str], List[float]]] = None,
+                 aembed: Optional[Callable[[str], Awaitable[List[float]]]] = None):
+        self.enabled = enabled
+        self.nodes = _nodes(nodes)
+        self.force = force
+        self.exact = TTLCache(max_entries, ttl, enabled)
+        self.shadow = TTLCache(max_entries, ttl, enabled)
+        self.semantic_nodes = _nodes(semantic_nodes) if semantic and (embed or aembed) else set()
+        self.semantic = SemanticIndex(LLM_CACHE_SEMANTIC_MAX, ttl, LLM_CACHE_SIMILARITY)
+        self.embed = embed
+        self.aembed = aembed
+        self.node_counters = defaultdict(lambda: defaultdict(int))
+
+    def probe(self, node: str, model, messages: List[Dict[str, str]]) -> Optional[Probe]:
+        if not self.enabled:
+            return None
+        temperature = float(getattr(model, "temperature", 0) or 0)
+        if temperature > 0 and not self.force:
+            self.node_counters[node]["skipped_temperature"] += 1
+            return None
+        return Probe(node, getattr(model, "model", ""), temperature, messages)
+
+    def _exact(self, probe: Probe):
+        c = self.node_counters[probe.node]
+        if probe.node not in self.nodes:
+            c["shadow_hits" if self.shadow.get(probe.key) is not MISS else "shadow_misses"] += 1
+            return MISS
+        value = self.exact.get(probe.key)
+        if value is not MISS:
+            c["hits_exact"] += 1
+        return value
+
+    def _similar(self, probe: Probe):
+        if probe.vector is None:
+            return MISS
+        value, score = self.semantic.search(probe.context_key, probe.vector)
+        if value is not MISS:
+            self.node_counters[probe.node]["hits_semantic"] += 1
+            print(f"LLM cache semantic hit ({probe.node}, {score:.3f}): ", probe.query)
+        return value
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        return v / n if n else v
+
+    def _wants_vector(self, probe: Probe) -> bool:
+        return probe.node in self.nodes and probe.node in self.semantic_nodes and bool(probe.query)
+
+    def store(self, probe: Probe, content: str):
+        if probe.node not in self.nodes:
+            self.shadow.set(probe.key, True)
+            return
+        self.node_counters[probe.node]["misses"] += 1
+        self.exact.set(probe.key, content)
+        if probe.vector is not None:
+            self.semantic.add(probe.context_key, probe.vector, content)
+
+    # -------- call wrappers --------
+    def cached(self, node: str, model, messages: List[Dict[str, str]], call: Callable[[], Any]):
+        probe = self.probe(node, model, messages)
+        if probe is None:
+            return call()
+        value = self._exact(probe)
+        if value is MISS and self._wants_vector(probe) and self.embed:
+            try:
+                probe.vector = self._unit(self.embed(probe.query))
+            except Exception as e:
+                print("LLM cache embedding failed: ", e)
+            value = self._similar(probe)
+        if value is not MISS:
+            return AIMessage(content=value)
+        resp = call()
+        self.store(probe, resp.content)
+        return resp
+
+    async def acached(self, node: str, model, messages: List[Dict[str, str]], call: Callable[[], Awaitable[Any]]):
+        probe = self.probe(node, model, messages)
+        if probe is None:
+            return await call()
+        value = self._exact(probe)
+        if value is MISS and self._wants_vector(probe) and self.aembed:
+            try:
+                probe.vector = self._unit(await self.aembed(probe.query))
+            except Exception as e:
+                print("LLM cache embedding failed: ", e)
+            value = self._similar(probe)
+        if value is not MISS:
+            return AIMessage(content=value)
+        resp = await call()
+        self.store(probe, resp.content)
+        return resp
+
+    def stats(self) -> Dict[str, Any]:
+        per_node = {}
+        for node, c in self.node_counters.items():
+            c = dict(c)
+            hits = c.get("hits_exact", 0) + c.get("hits_semantic", 0)
+            served = hits + c.get("misses", 0)
+            shadow = c.get("shadow_hits", 0) + c.get("shadow_misses", 0)
+            c["cached"] = node in self.nodes
+            c["hit_rate"] = round(hits / served, 4) if served else 0.0
+            if shadow:
+                c["shadow_hit_rate"] = round(c.get("shadow_hits", 0) / shadow, 4)
+            per_node[node] = c
+        return {
+            "enabled": self.enabled,
+            "force": self.force,
+            "nodes": sorted(self.nodes),
+            "semantic_nodes": sorted(self.semantic_nodes),
+            "semantic_entries": len(self.semantic),
+            "similarity_threshold": self.semantic.threshold,
+            "exact": self.exact.stats(),
+            "per_node": per_node,
+        }
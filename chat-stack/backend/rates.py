@@ -0,0 +1,252 @@
+import os
+import asyncio
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+import requests
+
+from cache import TTLCache, MISS
+
+# ---------------- Config ----------------
+EXCHANGERATE_HOST_URL = os.getenv("EXCHANGERATE_HOST_URL", "https://api.exchangerate.host")
+DDG_URL = os.getenv("DDG_URL", "https://api.duckduckgo.com")
+RATE_TTL = float(os.getenv("RATE_TTL", "300"))                        # seconds a rate is served from cache
+RATE_CACHE_MAX = int(os.getenv("RATE_CACHE_MAX", "1000"))
+RATE_TIMEOUT = float(os.getenv("RATE_TIMEOUT", "5"))                   # overall budget per lookup
+RATE_HEDGE_DELAY = float(os.getenv("RATE_HEDGE_DELAY", "0.25"))        # start the next provider after this; 0 = all at once
+RATE_PREFETCH = os.getenv("RATE_PREFETCH", "false").lower() in {"1", "true", "yes"}   # background polling of the providers; off by default
+RATE_PREFETCH_PAIRS = os.getenv("RATE_PREFETCH_PAIRS", "USD:EUR,USD:GBP,EUR:USD")
+RATE_PREFETCH_TOP = int(os.getenv("RATE_PREFETCH_TOP", "5"))          # plus the N most requested pairs
+
+
+class RateError(Exception):
+    pass
+
+
+# ---------------- Providers ----------------
+class ExchangeRateHost:
+    name = "exchangerate.host"
+
+    def __init__(self, base_url: str = EXCHANGERATE_HOST_URL):
+        self.base_url = base_url.rstrip("/")
+
+    def _url(self, base: str, target: str) -> str:
+        return f"{self.base_url}/latest?base={base}&symbols={target}"
+
+    def parse(self, resp: Dict[str, Any], base: str, target: str) -> str:
+        rates = resp.get("rates")
+        if not rates:
+            raise RateError(f"API error: {resp}")
+        rate = rates.get(target)
+        if not rate:
+            raise RateError(f"Could not fetch rate for {base}->{target}, response={resp}")
+        return f"1 {base} = {rate:.2f} {target}"
+
+    async def fetch(self, client: httpx.AsyncClient, base: str, target: str) -> str:
+        resp = await client.get(self._url(base, target))
+        return self.parse(resp.json(), base, target)
+
+    def fetch_sync(self, base: str, target: str) -> str:
+        return self.parse(requests.get(self._url(base, target), timeout=RATE_TIMEOUT).json(), base, target)
+
+
+class DuckDuckGo:
+    name = "duckduckgo"
+
+    def __init__(self, base_url: str = DDG_URL):
+        self.base_url = base_url.rstrip("/")
+
+    def _url(self, base: str, target: str) -> str:
+        query = f"{base} to {target} exchange rate"
+        return f"{self.base_url}/?q={query}&format=json&no_redirect=1&no_html=1"
+
+    def parse(self, resp: Dict[str, Any], base: str, target: str) -> str:
+        answer = resp.get("AbstractText") or resp.get("Answer")
+        if not answer:
+            raise RateError(f"No exchange rate info found for {base}->{target}")
+        return answer
+
+    async def fetch(self, client: httpx.AsyncClient, base: str, target: str) -> str:
+        resp = await client.get(self._url(base, target))
+        return self.parse(resp.json(), base, target)
+
+    def fetch_sync(self, base: str, target: str) -> str:
+        return self.parse(requests.get(self._url(base, target), timeout=RATE_TIMEOUT).json(), base, target)
+
+
+# ---------------- Service ----------------
+class RateService:
+    """Exchange rates with a per-pair TTL cache, single-flight coalescing of
+    concurrent misses and hedged requests across providers (first good answer wins)."""
+
+    def __init__(self, providers: List, ttl: float = RATE_TTL, timeout: float = RATE_TIMEOUT,
+                 hedge_delay: float = RATE_HEDGE_DELAY):
+        self.providers = providers
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.cache = TTLCache(RATE_CACHE_MAX, ttl)
+        self._last_good: Dict[Tuple[str, str], str] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self.requested = Counter()
+        self.counters = {"upstream_lookups": 0, "coalesced": 0, "hedges": 0, "failures": 0, "stale_served": 0}
+        self.wins = Counter()
+        self.provider_errors = Counter()
+
+    @staticmethod
+    def _key(base: str, target: str) -> Tuple[str, str]:
+        return base.upper(), target.upper()
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    # -------- lookups --------
+    async def get(self, base: str = "USD", target: str = "EUR") -> str:
+        key = self._key(base, target)
+        self.requested[key] += 1
+        cached = self.cache.get(key)
+        if cached is not MISS:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._refresh(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        # shield: one caller being cancelled must not cancel the shared lookup
+        return await asyncio.shield(task)
+
+    def get_sync(self, base: str = "USD", target: str = "EUR") -> str:
+        """Blocking variant for the sync graph path: cache, then providers in order."""
+        key = self._key(base, target)
+        self.requested[key] += 1
+        cached = self.cache.get(key)
+        if cached is not MISS:
+            return cached
+        self.counters["upstream_lookups"] += 1
+        for p in self.providers:
+            try:
+                result = p.fetch_sync(*key)
+            except Exception as e:
+                self.provider_errors[p.name] += 1
+                print(f"Rate provider {p.name} failed: ", e)
+                continue
+            self.wins[p.name] += 1
+            self._store(key, result)
+            return result
+        return self._fallback(key)
+
+    async def _refresh(self, key: Tuple[str, str]) -> str:
+        self.counters["upstream_lookups"] += 1
+        try:
+            result = await self._hedged(*key)
+        except RateError:
+            return self._fallback(key)
+        self._store(key, result)
+        return result
+
+    def _store(self, key: Tuple[str, str], result: str):
+        self.cache.set(key, result)
+        self._last_good[key] = result
+
+    def _fallback(self, key: Tuple[str, str]) -> str:
+        # Every provider failed: serve the last good (stale) answer if we have one
+        self.counters["failures"] += 1
+        stale = self._last_good.get(key)
+        if stale:
+            self.counters["stale_served"] += 1
+            return stale
+        return f"No exchange rate info found for {key[0]}->{key[1]}"
+
+    async def call(self, provider, base: str, target: str) -> str:
+        try:
+            return await provider.fetch(self._http(), base, target)
+        except Exception:
+            self.provider_errors[provider.name] += 1
+            raise
+
+    async def _hedged(self, base: str, target: str) -> str:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        queue = list(self.providers)
+        pending = {}
+
+        def launch():
+            p = queue.pop(0)
+            if pending:
+                self.counters["hedges"] += 1
+            pending[asyncio.ensure_future(self.call(p, base, target))] = p.name
+
+        launch()
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                wait = min(self.hedge_delay, remaining) if queue else remaining
+                done, _ = await asyncio.wait(set(pending), timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    name = pending.pop(t)
+                    if not t.cancelled() and t.exception() is None:
+                        self.wins[name] += 1
+                        return t.result()
+                # Hedge timer fired, or a provider failed: bring in the next one
+                if queue:
+                    launch()
+            raise RateError(f"no provider answered for {base}->{target}")
+        finally:
+            for t in pending:
+                t.cancel()
+
+    # -------- prefetch --------
+    def popular_pairs(self) -> List[Tuple[str, str]]:
+        pairs = [self._key(*p.split(":", 1)) for p in RATE_PREFETCH_PAIRS.split(",") if ":" in p]
+        for key, _n in self.requested.most_common(RATE_PREFETCH_TOP):
+            if key not in pairs:
+                pairs.append(key)
+        return pairs
+
+    async def _prefetcher(self):
+        # Refresh popular pairs shortly before they expire so user turns hit the cache
+        interval = max(self.cache.ttl * 0.8, 1.0)
+        while True:
+            for key in self.popular_pairs():
+                try:
+                    result = await self._hedged(*key)
+                    self._store(key, result)
+                except Exception as e:
+                    print(f"Rate prefetch {key} failed: ", e)
+            await asyncio.sleep(interval)
+
+    async def start(self, prefetch: bool = RATE_PREFETCH):
+        if prefetch and self._prefetch_task is None:
+            self._prefetch_task = asyncio.create_task(self._prefetcher())
+
+    async def stop(self):
+        if self._prefetch_task:
+            self._prefetch_task.cancel()
+            self._prefetch_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "cache": self.cache.stats(),
+            "wins": dict(self.wins),
+            "provider_errors": dict(self.provider_errors),
+            "inflight": len(self._inflight),
+            "popular_pairs": [f"{b}:{t}" for b, t in self.popular_pairs()],
+        }
+
+
+exchangerate_host = ExchangeRateHost()
+duckduckgo = DuckDuckGo()
+rate_service = RateService([exchangerate_host, duckduckgo])
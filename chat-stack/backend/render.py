@@ -0,0 +1,145 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Any, Optional
+
+# ---------------- Config ----------------
+# Intents whose structured tool results are turned into replies without the
+# reasoning/conversation LLM hops. Empty string = always use the LLM path.
+TEMPLATE_INTENTS = {
+    i.strip() for i in os.getenv("TEMPLATE_INTENTS", "balance,transfer,transactions,add_beneficiary").split(",")
+    if i.strip()
+}
+TEMPLATE_MAX_TRANSACTIONS = int(os.getenv("TEMPLATE_MAX_TRANSACTIONS", "3"))
+
+# Structured results carry a "kind"; map it back to the intent switch name
+KIND_TO_INTENT = {
+    "balance": "balance",
+    "transfer": "transfer",
+    "transactions": "transactions",
+    "beneficiary": "add_beneficiary",
+}
+
+
+def _money(value) -> str:
+    return f"${Decimal(str(value)):,.2f}"
+
+
+def _when(ts: Optional[datetime], now: Optional[datetime] = None) -> str:
+    if not isinstance(ts, datetime):
+        return ""
+    now = now or datetime.now(ts.tzinfo)
+    days = (now.date() - ts.date()).days
+    if days <= 0:
+        return "today"
+    if days == 1:
+        return "yesterday"
+    if days < 7:
+        return f"{days} days ago"
+    return f"on {ts:%B} {ts.day}"
+
+
+# ---------------- Tool strings ----------------
+def describe(data: Dict[str, Any]) -> str:
+    """Plain tool output, as fed to reasoning_agent on the LLM path."""
+    kind = data.get("kind")
+    if kind == "balance":
+        if data.get("balance") is None:
+            return f"No account for {data['user']}"
+        return f"{data['user']}'s balance is ${data['balance']}"
+
+    if kind == "transfer":
+        status = data.get("status")
+        if status == "sender_not_found":
+            return f"Sender {data['from_user']} not found."
+        if status == "unknown_recipient":
+            return (
+                f"Beneficiary '{data['to_user']}' does not exist. "
+                f"Please confirm if you want to add {data['to_user']} as a new beneficiary."
+            )
+        if status == "insufficient_funds":
+            return f"Insufficient funds. {data['from_user']} has ${data['balance_from']}."
+        if status == "invalid_amount":
+            return f"Invalid transfer amount: {data['amount']}."
+        if status == "same_account":
+            return f"Cannot transfer from {data['from_user']} to the same account."
+        return (
+            f"Transferred ${data['amount']} from {data['from_user']} to {data['to_user']}. "
+            f"New balances: {data['from_user']}={data['balance_from']}, {data['to_user']}={data['balance_to']}"
+        )
+
+    if kind == "transactions":
+        rows = data.get("items") or []
+        return str(rows) if rows else f"No transactions for {data['user']}"
+
+    if kind == "beneficiary":
+        status = data.get("status")
+        if status == "missing_name":
+            return "Couldn't identify the beneficiary's name. Please specify like 'add Charlie'."
+        if status == "exists":
+            return f"Beneficiary {data['user']} already exists."
+        return f"Beneficiary {data['user']} has been added successfully."
+
+    return str(data)
+
+
+# ---------------- Spoken replies ----------------
+def render_reply(data: Dict[str, Any]) -> Optional[str]:
+    """Short spoken-style reply for a structured tool result, or None if the LLM should handle it."""
+    kind = data.get("kind")
+    if KIND_TO_INTENT.get(kind) not in TEMPLATE_INTENTS:
+        return None
+
+    if kind == "balance":
+        if data.get("balance") is None:
+            return f"I couldn't find an account for {data['user']}."
+        return f"Your balance is {_money(data['balance'])}."
+
+    if kind == "transfer":
+        status = data.get("status")
+        if status == "ok":
+            return (
+                f"Done. I've sent {_money(data['amount'])} to {data['to_user']}. "
+                f"Your new balance is {_money(data['balance_from'])}."
+            )
+        if status == "insufficient_funds":
+            return (
+                f"Sorry, you don't have enough funds for that transfer. "
+                f"Your balance is {_money(data['balance_from'])}."
+            )
+        if status == "unknown_recipient":
+            return (
+                f"{data['to_user']} isn't one of your beneficiaries yet. "
+                f"Would you like me to add {data['to_user']}?"
+            )
+        return None  # sender missing or anything unexpected: let the LLM explain
+
+    if kind == "transactions":
+        rows = data.get("items") or []
+        if not rows:
+            return "You don't have any recent transactions."
+        shown = rows[:TEMPLATE_MAX_TRANSACTIONS]
+        parts = []
+        for r in shown:
+            amount = Decimal(str(r["amount"]))
+            verb = "received" if amount > 0 else "spent"
+            prep = "from" if amount > 0 else "on"
+            what = r.get("description") or "a transaction"
+            when = _when(r.get("created_at"))
+            parts.append(f"{verb} {_money(abs(amount))} {prep} {what}" + (f" {when}" if when else ""))
+        if len(parts) > 1:
+            parts[-1] = "and " + parts[-1]
+        head = "Your most recent transaction: you " if len(shown) == 1 else f"Your last {len(shown)} transactions: you "
+        return head + ", ".join(parts) + "."
+
+    if kind == "beneficiary":
+        status = data.get("status")
+        if status == "added":
+            return f"{data['user']} has been added as a beneficiary."
+        if status == "exists":
+            return f"{data['user']} is already one of your beneficiaries."
+        if status == "missing_name":
+            return "Who would you like to add? You can say something like 'add Charlie'."
+        return None
+
+    return None
@@ -1,22 +1,43 @@
 import os
+import json
+import time
+from datetime import date
 from typing import Dict, Any, Optional, List, TypedDict
-from fastapi import FastAPI, Request, Header
+from fastapi import FastAPI, Request, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import requests
-
 from langchain_community.chat_models import ChatOllama
-from langchain.tools import tool
+from langchain_community.embeddings import OllamaEmbeddings
+from langchain_core.tools import StructuredTool
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer
 from jose import jwt, JWTError
 
+from db import pool
+from db_async import apool
+from banking import (
+    fetch_balance, perform_transfer, fetch_transactions, create_beneficiary,
+    afetch_balance, aperform_transfer, afetch_transactions, acreate_beneficiary,
+    aperform_bulk_transfer, afetch_history, afetch_spending_summary,
+)
+from intent import load_classifier, LLM_SYSTEM_PROMPT as NLU_SYSTEM_PROMPT
+from render import describe, render_reply
+from latency import LatencyWindows
+from cache import account_cache
+from instrumentation import instrument, timed, log
+from gateway import llm_gateway, GatewayError
+from llm_cache import ResponseCache, LLM_CACHE_SEMANTIC, LLM_CACHE_EMBED_MODEL
+from rates import rate_service, exchangerate_host, duckduckgo
+from sessions import (
+    SessionStore, NUM_CTX, SUMMARY_MODEL_NAME,
+    append_turn, split_overflow, summary_prompt, fallback_summary, clip_summary, context_messages,
+)
+
 SECRET_KEY = "supersecret"  # use env var in prod
 ALGORITHM = "HS256"
 security = HTTPBearer()
@@ -34,14 +55,6 @@ OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 MODEL_NAME = os.getenv("MODEL_NAME", "qwen2.5:3b-instruct")
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0"))
 
-DB_CONFIG = {
-    "dbname": os.getenv("PGDATABASE", "bankdb"),
-    "user": os.getenv("PGUSER", "bankuser"),
-    "password": os.getenv("PGPASSWORD", "bankpass"),
-    "host": os.getenv("PGHOST", "localhost"),
-    "port": os.getenv("PGPORT", "5432"),
-}
-
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173")
 origins = [o.strip() for o in CORS_ORIGINS.split(",") if o.strip()]
 
@@ -53,136 +66,103 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument(app, "llm-backend")
 
-# ---------------- DB Helper ----------------
-def get_conn():
-    return psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+# ---------------- DB Pool lifecycle ----------------
+# The HTTP path is fully async (asyncpg); the psycopg2 pool only serves sync
+# graph.invoke callers such as scripts, so it opens connections on demand.
+@app.on_event("startup")
+async def open_db_pool():
+    try:
+        await apool.open()
+    except Exception as e:
+        print("Async DB pool warmup failed:", e)
+    await session_store.start()
+    await rate_service.start()
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    await rate_service.stop()
+    await session_store.stop()
+    await apool.close()
+    pool.close()
+
+# Overloaded model: fail fast with Retry-After instead of queueing without bound
+@app.exception_handler(GatewayError)
+async def llm_gateway_error(request: Request, exc: GatewayError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+def _admit():
+    llm_gateway.admit()
 
 # ---------------- Tools ----------------
-@tool
-def get_balance(user_name: str) -> str:
+# Each tool has a sync body and an async coroutine (tool.invoke / tool.ainvoke).
+def _get_balance(user_name: str) -> str:
     """Get balance for a user."""
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-            SELECT a.balance
-            FROM accounts a
-            JOIN users u ON u.id = a.user_id
-            WHERE u.name=%s
-        """, (user_name,))
-        row = cur.fetchone()
-        return f"{user_name}'s balance is ${row['balance']}" if row else f"No account for {user_name}"
-
-@tool
-def transfer_money(from_user: str, to_user: str, amount: float) -> str:
+    return describe(fetch_balance(user_name))
+
+async def _aget_balance(user_name: str) -> str:
+    return describe(await afetch_balance(user_name))
+
+def _transfer_money(from_user: str, to_user: str, amount: float) -> str:
     """Transfer money between two users atomically. 
     If the recipient does not exist, require confirmation to add them as beneficiary.
     """
-    with get_conn() as conn, conn.cursor() as cur:
-        # get sender
-        cur.execute("""
-            SELECT a.id, a.balance 
-            FROM accounts a 
-            JOIN users u ON u.id=a.user_id 
-            WHERE u.name=%s
-        """, (from_user,))
-        acc_from = cur.fetchone()
-
-        # get recipient
-        cur.execute("""
-            SELECT a.id, a.balance 
-            FROM accounts a 
-            JOIN users u ON u.id=a.user_id 
-            WHERE u.name=%s
-        """, (to_user,))
-        acc_to = cur.fetchone()
-
-        if not acc_from:
-            return f"Sender {from_user} not found."
-
-        if not acc_to:
-            # Instead of auto-creating → ask user to confirm
-            return (
-                f"Beneficiary '{to_user}' does not exist. "
-                f"Please confirm if you want to add {to_user} as a new beneficiary."
-            )
-
-        if acc_from["balance"] < amount:
-            return f"Insufficient funds. {from_user} has ${acc_from['balance']}."
-
-        # perform transfer
-        new_from, new_to = acc_from["balance"] - amount, acc_to["balance"] + amount
-        cur.execute("UPDATE accounts SET balance=%s WHERE id=%s", (new_from, acc_from["id"]))
-        cur.execute("UPDATE accounts SET balance=%s WHERE id=%s", (new_to, acc_to["id"]))
-        cur.execute(
-            "INSERT INTO transactions (account_id, amount, description) VALUES (%s, %s, %s)",
-            (acc_from["id"], -amount, f"Transfer to {to_user}")
-        )
-        cur.execute(
-            "INSERT INTO transactions (account_id, amount, description) VALUES (%s, %s, %s)",
-            (acc_to["id"], amount, f"Transfer from {from_user}")
-        )
-
-    return f"Transferred ${amount} from {from_user} to {to_user}. New balances: {from_user}={new_from}, {to_user}={new_to}"
-
-
-@tool
-def list_transactions(user_name: str, limit: int = 5) -> str:
+    return describe(perform_transfer(from_user, to_user, amount))
+
+async def _atransfer_money(from_user: str, to_user: str, amount: float) -> str:
+    return describe(await aperform_transfer(from_user, to_user, amount))
+
+def _list_transactions(user_name: str, limit: int = 5) -> str:
     """List recent transactions for a user."""
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("""
-            SELECT t.amount, t.description, t.created_at
-            FROM transactions t
-            JOIN accounts a ON a.id=t.account_id
-            JOIN users u ON u.id=a.user_id
-            WHERE u.name=%s
-            ORDER BY t.created_at DESC
-            LIMIT %s
-        """, (user_name, limit))
-        rows = cur.fetchall()
-        return str(rows) if rows else f"No transactions for {user_name}"
-
-@tool
-def get_exchange_rate(base: str = "USD", target: str = "EUR") -> str:
-    """Get current exchange rate between two currencies."""
-    url = f"https://api.exchangerate.host/latest?base={base}&symbols={target}"
+    return describe(fetch_transactions(user_name, limit))
+
+async def _alist_transactions(user_name: str, limit: int = 5) -> str:
+    return describe(await afetch_transactions(user_name, limit))
+
+def _provider_answer(provider, base: str, target: str) -> str:
+    try:
+        return provider.fetch_sync(base, target)
+    except Exception as e:
+        return f"Error fetching rate: {e}"
+
+async def _aprovider_answer(provider, base: str, target: str) -> str:
     try:
-        resp = requests.get(url, timeout=5).json()
+        return await rate_service.call(provider, base, target)
     except Exception as e:
         return f"Error fetching rate: {e}"
 
-    print("Get Exchange Rate: ", resp)
-    rates = resp.get("rates")
-    if not rates:
-        return f"API error: {resp}"
+def _get_exchange_rate(base: str = "USD", target: str = "EUR") -> str:
+    """Get current exchange rate between two currencies."""
+    return _provider_answer(exchangerate_host, base, target)
 
-    rate = rates.get(target)
-    if rate:
-        return f"1 {base} = {rate:.2f} {target}"
-    else:
-        return f"Could not fetch rate for {base}->{target}, response={resp}"
+async def _aget_exchange_rate(base: str = "USD", target: str = "EUR") -> str:
+    return await _aprovider_answer(exchangerate_host, base, target)
 
-@tool
-def get_exchange_rate_ddg(base: str = "USD", target: str = "EUR") -> str:
+def _get_exchange_rate_ddg(base: str = "USD", target: str = "EUR") -> str:
     """Fetches exchange rate using DuckDuckGo Instant Answer API as a fallback."""
-    query = f"{base} to {target} exchange rate"
-    url = f"https://api.duckduckgo.com/?q={query}&format=json&no_redirect=1&no_html=1"
-    resp = requests.get(url, timeout=5).json()
-    answer = resp.get("AbstractText") or resp.get("Answer")
-    return answer or f"No exchange rate info found for {base}->{target}"
-
-@tool
-def add_beneficiary(user_name: str) -> str:
+    return _provider_answer(duckduckgo, base, target)
+
+async def _aget_exchange_rate_ddg(base: str = "USD", target: str = "EUR") -> str:
+    return await _aprovider_answer(duckduckgo, base, target)
+
+def _add_beneficiary(user_name: str) -> str:
     """Add a new user + account (beneficiary) with 0 balance."""
-    with get_conn() as conn, conn.cursor() as cur:
-        # Check if already exists
-        cur.execute("SELECT id FROM users WHERE name=%s", (user_name,))
-        if cur.fetchone():
-            return f"Beneficiary {user_name} already exists."
+    return describe(create_beneficiary(user_name))
 
-        cur.execute("INSERT INTO users (name) VALUES (%s) RETURNING id", (user_name,))
-        new_user_id = cur.fetchone()["id"]
-        cur.execute("INSERT INTO accounts (user_id, balance) VALUES (%s, %s)", (new_user_id, 0))
-    return f"Beneficiary {user_name} has been added successfully."
+async def _aadd_beneficiary(user_name: str) -> str:
+    return describe(await acreate_beneficiary(user_name))
+
+def _tool(func, coroutine) -> StructuredTool:
+    return StructuredTool.from_function(func=func, coroutine=coroutine, name=func.__name__.lstrip("_"))
+
+get_balance = _tool(_get_balance, _aget_balance)
+transfer_money = _tool(_transfer_money, _atransfer_money)
+list_transactions = _tool(_list_transactions, _alist_transactions)
+get_exchange_rate = _tool(_get_exchange_rate, _aget_exchange_rate)
+get_exchange_rate_ddg = _tool(_get_exchange_rate_ddg, _aget_exchange_rate_ddg)
+add_beneficiary = _tool(_add_beneficiary, _aadd_beneficiary)
 
 
 # Collect tools into a dict
@@ -193,38 +173,107 @@ llm = ChatOllama(
     base_url=OLLAMA_BASE_URL,
     model=MODEL_NAME,
     temperature=TEMPERATURE,
+    num_ctx=NUM_CTX,
 )
 
+# Folds old turns into the rolling conversation summary
+summary_llm = ChatOllama(
+    base_url=OLLAMA_BASE_URL,
+    model=SUMMARY_MODEL_NAME,
+    temperature=0,
+    num_ctx=NUM_CTX,
+)
+
+# Optional similarity tier of the response cache embeds the user message
+embeddings = OllamaEmbeddings(base_url=OLLAMA_BASE_URL, model=LLM_CACHE_EMBED_MODEL) if LLM_CACHE_SEMANTIC else None
+
+response_cache = ResponseCache(
+    embed=(lambda text: llm_gateway.call_sync("embed", lambda: embeddings.embed_query(text))) if embeddings else None,
+    aembed=(lambda text: llm_gateway.call("embed", lambda: embeddings.aembed_query(text))) if embeddings else None,
+)
+
+# Every model call checks the response cache, then goes through the gateway:
+# bounded concurrency, priority queue, deadlines
+def _llm(kind: str, prompt, model=llm):
+    def infer():
+        with timed("inference", kind):
+            return model.invoke(prompt)
+    return response_cache.cached(kind, model, prompt, lambda: llm_gateway.call_sync(kind, infer))
+
+async def _allm(kind: str, prompt, model=llm):
+    async def infer():
+        with timed("inference", kind):
+            return await model.ainvoke(prompt)
+    return await response_cache.acached(kind, model, prompt, lambda: llm_gateway.call(kind, infer))
+
+# Local fast-path intent classifier; low-confidence messages still go to the LLM
+intent_classifier = load_classifier()
+
 # ---------------- Graph State ----------------
 class AgentState(TypedDict, total=False):
     messages: List[Dict[str, str]]
     intent: str
     db_result: str
+    rendered: Optional[str]
     reasoned: str
+    history: List[Dict[str, str]]   # last RECENT_TURNS turns, verbatim
+    summary: str                    # rolling summary of everything older
 
 # ---------------- Nodes ----------------
+# Every node has a sync and an async variant; graph.invoke runs the former,
+# graph.ainvoke / graph.astream the latter.
+REASONING_SYSTEM = "Interpret DB or tool results for conversation."
+CONVERSATION_SYSTEM = (
+    "You are a friendly banking assistant. "
+    "Keep replies concise, clear, and natural, within 50–60 words. "
+    "Answer only banking-related queries (balance, transfers, transactions, exchange rates). "
+    "If asked unrelated questions, politely decline and remind the user that your purpose is banking assistance."
+)
+
+def _nlu_prompt(user_msg: str):
+    return [
+        {"role": "system", "content": NLU_SYSTEM_PROMPT},
+        {"role": "user", "content": user_msg}
+    ]
+
+def _nlu_fast_path(messages):
+    # Returns the node output when the local classifier is confident, else None
+    if not messages:
+        return {"intent": "unknown", "messages": []}
+    pred = intent_classifier.classify(messages[-1]["content"])
+    if pred:
+        print(f"Message Reply at NLU ({pred.source}, {pred.confidence:.2f}): ", pred.intent)
+        return {"intent": pred.intent, "rendered": None, "messages": messages}
+    return None
+
+def _nlu_llm_result(resp, messages):
+    intent_classifier.count("llm")
+    print("Message Reply at NLU (llm): ", resp.content.lower().strip())
+    return {"intent": resp.content.lower().strip(), "rendered": None, "messages": messages}
+
 def nlu_agent(state: AgentState):
     messages = state.get("messages", [])
+    print("Message received at NLU: ", messages)
+    out = _nlu_fast_path(messages)
+    if out:
+        return out
+    resp = _llm("nlu", _nlu_prompt(messages[-1]["content"]))
+    return _nlu_llm_result(resp, messages)
 
+async def anlu_agent(state: AgentState):
+    messages = state.get("messages", [])
     print("Message received at NLU: ", messages)
-    if not messages:
-        return {"intent": "unknown", "messages": []}
-        
-    user_msg = messages[-1]["content"]
-    system = (
-        "Classify the intent of the user query as one of: "
-        "balance, transfer, transactions, exchange_rate, add_beneficiary, or conversation. "
-        "Reply with only the intent keyword. "
-        "If the user confirms adding a new person (e.g. 'yes, add Charlie'), classify as add_beneficiary."
-    )
-    resp = llm.invoke([
-        {"role": "system", "content": system},
-        {"role": "user", "content": user_msg}
-    ])
+    out = _nlu_fast_path(messages)
+    if out:
+        return out
+    resp = await _allm("nlu", _nlu_prompt(messages[-1]["content"]))
+    return _nlu_llm_result(resp, messages)
 
-    print("Message Reply at NLU: ", resp.content.lower().strip())
-    return {"intent": resp.content.lower().strip(), "messages": messages}
 
+def _db_result(data, messages):
+    if data is None:
+        return {"db_result": "I don't know how to handle that.", "rendered": None, "messages": messages}
+    return {"db_result": describe(data), "rendered": render_reply(data), "messages": messages}
 
 def db_agent(state: AgentState):
     messages = state.get("messages", [])
@@ -233,74 +282,151 @@ def db_agent(state: AgentState):
 
     intent = state.get("intent", "").lower()   # ✅ defined first
 
+    data = None
     if "balance" in intent:
-        result = tools["get_balance"].invoke({"user_name": "Alice"})
+        data = fetch_balance("Alice")
     elif "transfer" in intent:
-        result = tools["transfer_money"].invoke({"from_user": "Alice", "to_user": "Bob", "amount": 50})
+        data = perform_transfer("Alice", "Bob", 50)
     elif "transaction" in intent:
-        result = tools["list_transactions"].invoke({"user_name": "Alice"})
-    else:
-        result = "I don't know how to handle that."
-    
-    return {"db_result": result, "messages": messages}
+        data = fetch_transactions("Alice")
+    return _db_result(data, messages)
 
-def reasoning_agent(state: AgentState):
+async def adb_agent(state: AgentState):
     messages = state.get("messages", [])
+    if not messages:
+        return {"intent": "unknown", "messages": []}
+
+    intent = state.get("intent", "").lower()
+
+    data = None
+    if "balance" in intent:
+        data = await afetch_balance("Alice")
+    elif "transfer" in intent:
+        data = await aperform_transfer("Alice", "Bob", 50)
+    elif "transaction" in intent:
+        data = await afetch_transactions("Alice")
+    return _db_result(data, messages)
+
+
+def _reasoning_prompt(state: AgentState):
     db_result = state.get("db_result", "No DB result available.")
-    system = "Interpret DB or tool results for conversation."
-    resp = llm.invoke([
-        {"role": "system", "content": system},
+    return [
+        {"role": "system", "content": REASONING_SYSTEM},
         {"role": "user", "content": str(db_result)}
-    ])
-    return {"reasoned": resp.content, "messages": messages}
+    ]
 
-def conversation_agent(state: AgentState):
+def reasoning_agent(state: AgentState):
+    resp = _llm("reasoning", _reasoning_prompt(state))
+    return {"reasoned": resp.content, "messages": state.get("messages", [])}
+
+async def areasoning_agent(state: AgentState):
+    resp = await _allm("reasoning", _reasoning_prompt(state))
+    return {"reasoned": resp.content, "messages": state.get("messages", [])}
+
+
+def _conversation_prompt(state: AgentState):
     messages = state.get("messages", [])
     reasoned = state.get("reasoned", "No reasoning available.")
-    system = (
-    "You are a friendly banking assistant. "
-    "Keep replies concise, clear, and natural, within 50–60 words. "
-    "Answer only banking-related queries (balance, transfers, transactions, exchange rates). "
-    "If asked unrelated questions, politely decline and remind the user that your purpose is banking assistance."
-    )
-    resp = llm.invoke([
-        {"role": "system", "content": system},
+    return [
+        {"role": "system", "content": CONVERSATION_SYSTEM},
+        *context_messages(state.get("summary", ""), state.get("history", [])),
         {"role": "assistant", "content": reasoned},
         messages[-1] if messages else {"role": "user", "content": ""}
-    ])
-    return {"messages": messages + [{"role": "assistant", "content": resp.content}]}
+    ]
 
+def conversation_agent(state: AgentState):
+    messages = state.get("messages", [])
+    resp = _llm("conversation", _conversation_prompt(state))
+    return {"messages": messages + [{"role": "assistant", "content": resp.content}]}
 
+async def aconversation_agent(state: AgentState):
+    messages = state.get("messages", [])
+    resp = await _allm("conversation", _conversation_prompt(state))
     return {"messages": messages + [{"role": "assistant", "content": resp.content}]}
 
+
 def info_agent(state: AgentState):
     messages = state.get("messages", [])
     if not messages:
         return {"db_result": "No user message.", "messages": []}
 
-    # for now hardcoded, later parse currencies from the user query
-    result = tools["get_exchange_rate_ddg"].invoke({"base": "USD", "target": "EUR"})
-    
+    # for now hardcoded, later parse currencies from the user query.
+    # Cached per pair; a miss races both providers and keeps the first good answer.
+    result = rate_service.get_sync("USD", "EUR")
+
     return {"db_result": result, "messages": messages}
 
-def beneficiary_agent(state: AgentState):
+async def ainfo_agent(state: AgentState):
     messages = state.get("messages", [])
-    user_msg = messages[-1]["content"]
+    if not messages:
+        return {"db_result": "No user message.", "messages": []}
 
+    result = await rate_service.get("USD", "EUR")
+    return {"db_result": result, "messages": messages}
+
+
+def _beneficiary_name(user_msg: str) -> Optional[str]:
     # crude parsing: look for "add X" or "yes, add X"
     tokens = user_msg.strip().split()
-    new_name = None
     if "add" in tokens:
         idx = tokens.index("add")
         if idx + 1 < len(tokens):
-            new_name = tokens[idx + 1].capitalize()
+            return tokens[idx + 1].capitalize()
+    return None
 
+def beneficiary_agent(state: AgentState):
+    messages = state.get("messages", [])
+    new_name = _beneficiary_name(messages[-1]["content"])
     if not new_name:
-        return {"db_result": "Couldn't identify the beneficiary's name. Please specify like 'add Charlie'.", "messages": messages}
+        data = {"kind": "beneficiary", "user": None, "status": "missing_name"}
+    else:
+        data = create_beneficiary(new_name)
+    return _db_result(data, messages)
+
+async def abeneficiary_agent(state: AgentState):
+    messages = state.get("messages", [])
+    new_name = _beneficiary_name(messages[-1]["content"])
+    if not new_name:
+        data = {"kind": "beneficiary", "user": None, "status": "missing_name"}
+    else:
+        data = await acreate_beneficiary(new_name)
+    return _db_result(data, messages)
+
+def template_agent(state: AgentState):
+    # Deterministic reply for structured tool results: no reasoning/conversation LLM hops
+    messages = state.get("messages", [])
+    return {"messages": messages + [{"role": "assistant", "content": state["rendered"]}]}
 
-    result = tools["add_beneficiary"].invoke({"user_name": new_name})
-    return {"db_result": result, "messages": messages}
 
+def _remember_turn(state: AgentState):
+    # Append this turn to the history; returns (history, overflow) where overflow must be summarized
+    messages = state.get("messages", [])
+    history = state.get("history", [])
+    if len(messages) >= 2 and messages[-1].get("role") == "assistant":
+        history = append_turn(history, messages[-2]["content"], messages[-1]["content"])
+    return split_overflow(history)
+
+def memory_agent(state: AgentState):
+    history, overflow = _remember_turn(state)
+    summary = state.get("summary", "")
+    if overflow:
+        try:
+            summary = clip_summary(_llm("summary", summary_prompt(summary, overflow), summary_llm).content)
+        except Exception as e:
+            print("Summary failed: ", e)
+            summary = fallback_summary(summary, overflow)
+    return {"history": history, "summary": summary}
+
+async def amemory_agent(state: AgentState):
+    history, overflow = _remember_turn(state)
+    summary = state.get("summary", "")
+    if overflow:
+        try:
+            summary = clip_summary((await _allm("summary", summary_prompt(summary, overflow), summary_llm)).content)
+        except Exception as e:
+            print("Summary failed: ", e)
+            summary = fallback_summary(summary, overflow)
+    return {"history": history, "summary": summary}
 
 
 def route_intent(state: AgentState) -> str:
@@ -313,16 +439,33 @@ def route_intent(state: AgentState) -> str:
         return "info"
     else:
         return "conversation"
+
+def route_result(state: AgentState) -> str:
+    return "template" if state.get("rendered") else "reasoning"
     
 # ---------------- Build LangGraph ----------------
+def _node(name: str, func, afunc=None):
+    # Node wrapped with a "node" stage timer for /metrics
+    def timed_func(state: AgentState):
+        with timed("node", name):
+            return func(state)
+
+    async def timed_afunc(state: AgentState):
+        with timed("node", name):
+            return await afunc(state) if afunc else func(state)
+
+    return RunnableLambda(timed_func, afunc=timed_afunc)
+
 workflow = StateGraph(AgentState)
-workflow.add_node("nlu", nlu_agent)
+workflow.add_node("nlu", _node("nlu", nlu_agent, anlu_agent))
 #workflow.add_node("router", router)
-workflow.add_node("info", info_agent)
-workflow.add_node("db", db_agent)
-workflow.add_node("beneficiary", beneficiary_agent)
-workflow.add_node("reasoning", reasoning_agent)
-workflow.add_node("conversation", conversation_agent)
+workflow.add_node("info", _node("info", info_agent, ainfo_agent))
+workflow.add_node("db", _node("db", db_agent, adb_agent))
+workflow.add_node("beneficiary", _node("beneficiary", beneficiary_agent, abeneficiary_agent))
+workflow.add_node("reasoning", _node("reasoning", reasoning_agent, areasoning_agent))
+workflow.add_node("conversation", _node("conversation", conversation_agent, aconversation_agent))
+workflow.add_node("template", _node("template", template_agent))
+workflow.add_node("memory", _node("memory", memory_agent, amemory_agent))
 
 workflow.set_entry_point("nlu")
 #workflow.add_edge("nlu", "router")
@@ -338,14 +481,20 @@ workflow.add_conditional_edges(
     }
 )
 
-workflow.add_edge("beneficiary", "reasoning")
-workflow.add_edge("db", "reasoning")
+workflow.add_conditional_edges("beneficiary", route_result, {"template": "template", "reasoning": "reasoning"})
+workflow.add_conditional_edges("db", route_result, {"template": "template", "reasoning": "reasoning"})
 workflow.add_edge("info", "reasoning")
 workflow.add_edge("reasoning", "conversation")
-workflow.add_edge("conversation", END)
+workflow.add_edge("conversation", "memory")
+workflow.add_edge("template", "memory")
+workflow.add_edge("memory", END)
+
+# Bounded per-session state: idle TTL + LRU cap in memory, or Postgres (CHECKPOINT_BACKEND)
+session_store = SessionStore()
+graph = workflow.compile(checkpointer=session_store.checkpointer)
 
-memory = MemorySaver()
-graph = workflow.compile(checkpointer=memory)
+# End-to-end /chat latency keyed by "<intent>/<template|llm>"
+chat_latency = LatencyWindows()
 
 # ---------------- API Schemas ----------------
 class ChatIn(BaseModel):
@@ -355,6 +504,14 @@ class ChatOut(BaseModel):
     reply: str
     session_id: str
 
+class TransferItem(BaseModel):
+    from_user: str
+    to_user: str
+    amount: float
+
+class BulkTransferIn(BaseModel):
+    transfers: List[TransferItem]
+
 def verify_jwt(token: str = Depends(security)):
     try:
         payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
@@ -366,17 +523,172 @@ def verify_jwt(token: str = Depends(security)):
 @app.post("/chat", response_model=ChatOut)
 #async def chat(body: ChatIn, request: Request, x_session_id: Optional[str] = Header(default=None)):
 async def chat(body: ChatIn, request: Request, x_session_id: Optional[str] = Header(default=None), user=Depends(verify_jwt)):
+    _admit()
     session_id = x_session_id or request.client.host or "default"
-    print("Input chat Message: ", body.message, "request", request)
+    log("Input chat Message: ", body.message, "request", request)
     state = {"messages": [{"role": "user", "content": body.message}]}
 
     #messages = state.get("messages", [])
 
     #print("Input chat Message before invoke state: ", body.message)
 
-    result = graph.invoke(state, config={"configurable": {"thread_id": session_id}}) or {}
+    t0 = time.perf_counter()
+    result = await graph.ainvoke(state, config={"configurable": {"thread_id": session_id}}) or {}
     messages = result.get("messages", [])
     reply = messages[-1]["content"] if messages else "Sorry, I wasn't able to process that."
+    path = "template" if result.get("rendered") else "llm"
+    chat_latency.record(f"{result.get('intent', 'unknown')}/{path}", (time.perf_counter() - t0) * 1000)
 
 
     return ChatOut(reply=reply, session_id=session_id)
+
+
+# ---------------- Streaming endpoint (SSE) ----------------
+# Node outputs reported as progress events; the rest is internal state.
+PROGRESS_NODES = {"nlu": "nlu", "db": "db", "info": "info", "beneficiary": "db", "reasoning": "reasoning"}
+# Nodes whose assistant output is the user-facing reply
+REPLY_NODES = {"conversation", "template"}
+
+def sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_turn(state: AgentState, session_id: str):
+    config = {"configurable": {"thread_id": session_id}}
+    t0 = time.perf_counter()
+    ttft_ms = None
+    tokens: List[str] = []
+    reply = None
+    intent = "unknown"
+    path = "llm"
+
+    try:
+        # "updates" → one event per finished node; "messages" → LLM tokens as Ollama emits them.
+        # The checkpointer commits the final state when the run completes, same as graph.invoke.
+        async for mode, payload in graph.astream(state, config=config, stream_mode=["updates", "messages"]):
+            if mode == "messages":
+                chunk, meta = payload
+                if meta.get("langgraph_node") != "conversation" or not getattr(chunk, "content", ""):
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - t0) * 1000
+                tokens.append(chunk.content)
+                yield sse("token", {"text": chunk.content})
+                continue
+
+            for node, update in (payload or {}).items():
+                update = update or {}
+                if node == "nlu":
+                    intent = update.get("intent", intent)
+                if node in PROGRESS_NODES:
+                    yield sse("progress", {"node": PROGRESS_NODES[node], "done": True,
+                                           **({"intent": intent} if node == "nlu" else {})})
+                if node in REPLY_NODES:
+                    msgs = update.get("messages") or []
+                    reply = msgs[-1]["content"] if msgs else None
+                if node == "template" and reply:
+                    # No LLM generation on this path: the rendered reply is the single "token"
+                    path = "template"
+                    ttft_ms = (time.perf_counter() - t0) * 1000
+                    yield sse("token", {"text": reply})
+                elif node == "conversation" and reply and not tokens:
+                    # Served from the response cache, so nothing was streamed
+                    ttft_ms = (time.perf_counter() - t0) * 1000
+                    yield sse("token", {"text": reply})
+    except Exception as e:
+        print("Stream error: ", e)
+        yield sse("error", {"detail": str(e), "session_id": session_id,
+                            **({"retry_after": e.retry_after} if isinstance(e, GatewayError) else {})})
+        return
+
+    if reply is None:
+        reply = "".join(tokens) or "Sorry, I wasn't able to process that."
+    total_ms = (time.perf_counter() - t0) * 1000
+    chat_latency.record(f"{intent}/{path}", total_ms)
+    if ttft_ms is not None:
+        chat_latency.record(f"ttft/{path}", ttft_ms)
+    yield sse("done", {"reply": reply, "session_id": session_id,
+                       "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                       "total_ms": round(total_ms, 1)})
+
+
+@app.post("/chat/stream")
+async def chat_stream(body: ChatIn, request: Request, x_session_id: Optional[str] = Header(default=None), user=Depends(verify_jwt)):
+    _admit()
+    session_id = x_session_id or request.client.host or "default"
+    log("Input stream Message: ", body.message)
+    state = {"messages": [{"role": "user", "content": body.message}]}
+    return StreamingResponse(
+        stream_turn(state, session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "x-session-id": session_id},
+    )
+
+
+@app.post("/transfers/bulk")
+async def bulk_transfer(body: BulkTransferIn, user=Depends(verify_jwt)):
+    # Scheduled payments: one server-side call, each item reports its own status.
+    # Every item must debit the caller's own account.
+    if any(t.from_user != user.get("sub") for t in body.transfers):
+        raise HTTPException(status_code=403, detail="Bulk transfers can only debit your own account")
+    results = await aperform_bulk_transfer([(t.from_user, t.to_user, t.amount) for t in body.transfers])
+    return {"results": results}
+
+
+@app.get("/transactions")
+async def transaction_history(
+    limit: int = Query(default=20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user=Depends(verify_jwt),
+):
+    # Keyset-paginated: pass next_cursor back as ?cursor= for the following page
+    try:
+        return await afetch_history(user.get("sub"), limit, cursor, category, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/transactions/summary")
+async def transaction_summary(
+    months: int = Query(default=6, ge=1, le=36),
+    category: Optional[str] = None,
+    user=Depends(verify_jwt),
+):
+    return await afetch_spending_summary(user.get("sub"), months, category)
+
+
+@app.get("/db/pool")
+def db_pool_stats():
+    return {"async": apool.stats(), "sync": pool.stats()}
+
+
+@app.get("/llm/stats")
+def llm_stats():
+    return llm_gateway.stats()
+
+
+@app.get("/nlu/stats")
+def nlu_stats():
+    return intent_classifier.stats()
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"accounts": account_cache.stats(), "llm": response_cache.stats()}
+
+
+@app.get("/rates/stats")
+def rates_stats():
+    return rate_service.stats()
+
+
+@app.get("/sessions/stats")
+def sessions_stats():
+    return session_store.stats()
+
+
+@app.get("/chat/latency")
+def chat_latency_stats():
+    return chat_latency.summary()
@@ -0,0 +1,339 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+from langgraph.checkpoint.memory import MemorySaver
+
+# ---------------- Config ----------------
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "memory")        # "memory" | "postgres"
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))                  # idle seconds before a session is dropped
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))                  # LRU cap on sessions held in memory
+MEMORY_MAX_MB = float(os.getenv("MEMORY_MAX_MB", "256"))               # LRU cap on serialized checkpoint bytes
+CHECKPOINTS_PER_SESSION = int(os.getenv("CHECKPOINTS_PER_SESSION", "2"))
+SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+RECENT_TURNS = int(os.getenv("RECENT_TURNS", "8"))                     # user+assistant pairs kept verbatim
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "2000"))
+SUMMARY_BATCH_TURNS = int(os.getenv("SUMMARY_BATCH_TURNS", "4"))       # fold overflow into the summary in batches
+SUMMARY_MODEL_NAME = os.getenv("SUMMARY_MODEL_NAME", os.getenv("MODEL_NAME", "qwen2.5:3b-instruct"))
+NUM_CTX = int(os.getenv("NUM_CTX", "4096"))
+
+
+# ---------------- In-memory checkpointer ----------------
+class BoundedMemorySaver(MemorySaver):
+    """MemorySaver with a per-session idle TTL, LRU eviction by session count and
+    serialized size, and only the last few checkpoints kept per session.
+
+    Eviction edits MemorySaver's storage/writes/blobs dicts directly, so
+    langgraph-checkpoint is pinned in requirements.txt; re-check this class when
+    bumping it."""
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS,
+                 max_bytes: float = MEMORY_MAX_MB * 1024 * 1024, keep: int = CHECKPOINTS_PER_SESSION):
+        super().__init__()
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.keep = max(keep, 1)
+        self._lock = threading.RLock()
+        self._access: "OrderedDict[str, float]" = OrderedDict()   # LRU order, oldest first
+        self._bytes: Dict[str, int] = {}
+        self._blob_keys: Dict[str, set] = defaultdict(set)
+        self.evictions = {"ttl": 0, "lru": 0}
+
+    # -------- checkpointer API --------
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if self._expired(thread_id, time.monotonic()):
+                self._drop(thread_id)
+                self.evictions["ttl"] += 1
+            elif thread_id in self._access:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._blob_keys[thread_id].update((thread_id, ns, k, v) for k, v in new_versions.items())
+            self._prune(thread_id, ns)
+            self._touch(thread_id)
+            self._evict()
+            return result
+
+    def put_writes(self, config, writes, task_id, *args, **kwargs):
+        with self._lock:
+            return super().put_writes(config, writes, task_id, *args, **kwargs)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._drop(thread_id)
+
+    # -------- bookkeeping --------
+    def _touch(self, thread_id: str):
+        self._access[thread_id] = time.monotonic()
+        self._access.move_to_end(thread_id)
+
+    def _expired(self, thread_id: str, now: float) -> bool:
+        ts = self._access.get(thread_id)
+        return ts is not None and self.ttl > 0 and now - ts > self.ttl
+
+    def _prune(self, thread_id: str, ns: str):
+        # Keep the newest `keep` checkpoints (ids are time-ordered) and the blobs they reference
+        ckpts = self.storage[thread_id][ns]
+        if len(ckpts) > self.keep:
+            for cid in sorted(ckpts)[:-self.keep]:
+                ckpts.pop(cid, None)
+                self.writes.pop((thread_id, ns, cid), None)
+
+            live = set()
+            for saved, _meta, _parent in ckpts.values():
+                live.update(self.serde.loads_typed(saved).get("channel_versions", {}).items())
+            keys = self._blob_keys[thread_id]
+            for key in [k for k in keys if k[1] == ns and (k[2], k[3]) not in live]:
+                self.blobs.pop(key, None)
+                keys.discard(key)
+
+        size = 0
+        for per_ns in self.storage[thread_id].values():
+            for saved, meta, _parent in per_ns.values():
+                size += len(saved[1]) + len(meta[1])
+        for key in self._blob_keys[thread_id]:
+            blob = self.blobs.get(key)
+            if blob:
+                size += len(blob[1])
+        self._bytes[thread_id] = size
+
+    def _drop(self, thread_id: str):
+        for ns, ckpts in self.storage.pop(thread_id, {}).items():
+            for cid in ckpts:
+                self.writes.pop((thread_id, ns, cid), None)
+        for key in self._blob_keys.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        self._access.pop(thread_id, None)
+        self._bytes.pop(thread_id, None)
+
+    def _evict(self):
+        now = time.monotonic()
+        # Oldest-first order means expired sessions sit at the front
+        while self._access:
+            thread_id = next(iter(self._access))
+            if not self._expired(thread_id, now):
+                break
+            self._drop(thread_id)
+            self.evictions["ttl"] += 1
+        while len(self._access) > 1 and (
+            len(self._access) > self.max_sessions or sum(self._bytes.values()) > self.max_bytes
+        ):
+            thread_id = next(iter(self._access))
+            self._drop(thread_id)
+            self.evictions["lru"] += 1
+
+    def sweep(self):
+        with self._lock:
+            self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._access),
+                "bytes": sum(self._bytes.values()),
+                "max_sessions": self.max_sessions,
+                "max_bytes": int(self.max_bytes),
+                "ttl_s": self.ttl,
+                "evictions": dict(self.evictions),
+            }
+
+
+# ---------------- Postgres checkpointer ----------------
+# Sessions idle longer than SESSION_TTL, by the timestamp of their latest checkpoint
+PG_TTL_SWEEP_SQL = """
+    WITH stale AS (
+        SELECT thread_id
+        FROM checkpoints
+        GROUP BY thread_id
+        HAVING max((checkpoint->>'ts')::timestamptz) < now() - make_interval(secs => %s)
+    ),
+    w AS (DELETE FROM checkpoint_writes WHERE thread_id IN (SELECT thread_id FROM stale)),
+    b AS (DELETE FROM checkpoint_blobs WHERE thread_id IN (SELECT thread_id FROM stale))
+    DELETE FROM checkpoints WHERE thread_id IN (SELECT thread_id FROM stale)
+"""
+
+# All but the newest CHECKPOINTS_PER_SESSION checkpoints of each session (ids are
+# time-ordered, as in BoundedMemorySaver._prune), with their pending writes
+PG_PRUNE_SQL = """
+    WITH old AS (
+        SELECT thread_id, checkpoint_ns, checkpoint_id
+        FROM (
+            SELECT thread_id, checkpoint_ns, checkpoint_id,
+                   row_number() OVER (PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rn
+            FROM checkpoints
+        ) ranked
+        WHERE rn > %s
+    ),
+    w AS (
+        DELETE FROM checkpoint_writes cw USING old
+        WHERE cw.thread_id = old.thread_id AND cw.checkpoint_ns = old.checkpoint_ns
+          AND cw.checkpoint_id = old.checkpoint_id
+    )
+    DELETE FROM checkpoints c USING old
+    WHERE c.thread_id = old.thread_id AND c.checkpoint_ns = old.checkpoint_ns
+      AND c.checkpoint_id = old.checkpoint_id
+    RETURNING c.thread_id
+"""
+
+# Channel values no remaining checkpoint of those sessions references
+PG_PRUNE_BLOBS_SQL = """
+    DELETE FROM checkpoint_blobs b
+    WHERE b.thread_id = ANY(%s)
+      AND NOT EXISTS (
+          SELECT 1 FROM checkpoints c
+          WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+            AND c.checkpoint->'channel_versions'->>b.channel = b.version
+      )
+"""
+
+
+SYNC_UNSUPPORTED = ("CHECKPOINT_BACKEND=postgres only supports the async graph API "
+                    "(ainvoke/astream); use CHECKPOINT_BACKEND=memory for graph.invoke callers")
+
+
+def async_only_saver(saver_cls):
+    """saver_cls with the sync checkpointer methods failing fast instead of
+    blocking on (or deadlocking) the event loop that owns the async pool."""
+
+    def unsupported(self, *args, **kwargs):
+        raise RuntimeError(SYNC_UNSUPPORTED)
+
+    return type("AsyncOnly" + saver_cls.__name__, (saver_cls,), {
+        name: unsupported for name in ("get_tuple", "list", "put", "put_writes", "delete_thread")
+    })
+
+
+class PostgresCheckpointer:
+    """Wraps langgraph's AsyncPostgresSaver (langgraph-checkpoint-postgres) on a psycopg pool.
+    Async only: sync graph.invoke/stream raise SYNC_UNSUPPORTED."""
+
+    def __init__(self):
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool as PsycopgPool
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        from db import DB_CONFIG, POOL_MAX_SIZE
+
+        conninfo = " ".join(f"{k}={v}" for k, v in DB_CONFIG.items())
+        self.pool = PsycopgPool(
+            conninfo, max_size=POOL_MAX_SIZE, open=False,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        )
+        self.saver = async_only_saver(AsyncPostgresSaver)(self.pool)
+        self.keep = max(CHECKPOINTS_PER_SESSION, 1)
+        self.evictions = {"ttl": 0, "pruned": 0}
+
+    async def open(self):
+        await self.pool.open()
+        await self.saver.setup()
+
+    async def close(self):
+        await self.pool.close()
+
+    async def sweep(self):
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(PG_TTL_SWEEP_SQL, (SESSION_TTL,))
+            self.evictions["ttl"] += max(cur.rowcount, 0)
+            # Only the last few checkpoints per session, like the memory backend
+            async with conn.transaction():
+                cur = await conn.execute(PG_PRUNE_SQL, (self.keep,))
+                pruned = await cur.fetchall()
+                if pruned:
+                    await conn.execute(PG_PRUNE_BLOBS_SQL, (list({row["thread_id"] for row in pruned}),))
+            self.evictions["pruned"] += len(pruned)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "postgres", "ttl_s": SESSION_TTL, "evicted_checkpoints": dict(self.evictions)}
+
+
+class SessionStore:
+    """Owns the checkpointer and its periodic TTL sweep."""
+
+    def __init__(self, backend: str = CHECKPOINT_BACKEND):
+        if backend == "postgres":
+            self.impl = PostgresCheckpointer()
+            self.checkpointer = self.impl.saver
+        else:
+            self.impl = BoundedMemorySaver()
+            self.checkpointer = self.impl
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if isinstance(self.impl, PostgresCheckpointer):
+            await self.impl.open()
+        self._task = asyncio.create_task(self._sweeper())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if isinstance(self.impl, PostgresCheckpointer):
+            await self.impl.close()
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            try:
+                result = self.impl.sweep()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print("Session sweep failed:", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.impl.stats()
+
+
+# ---------------- History compaction ----------------
+def append_turn(history: List[Dict[str, str]], user_msg: str, reply: str) -> List[Dict[str, str]]:
+    return history + [{"role": "user", "content": user_msg}, {"role": "assistant", "content": reply}]
+
+
+def split_overflow(history: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """(kept, overflow): overflow is non-empty once SUMMARY_BATCH_TURNS turns beyond RECENT_TURNS pile up."""
+    keep = RECENT_TURNS * 2
+    if len(history) < keep + SUMMARY_BATCH_TURNS * 2:
+        return history, []
+    return history[-keep:] if keep else [], history[:-keep] if keep else history
+
+
+def summary_prompt(summary: str, overflow: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in overflow)
+    return [
+        {"role": "system", "content": (
+            "Update the running summary of a banking assistant conversation. "
+            "Keep facts the assistant may need later (names, amounts, pending confirmations). "
+            f"Reply with the summary only, under {SUMMARY_MAX_CHARS} characters."
+        )},
+        {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"},
+    ]
+
+
+def fallback_summary(summary: str, overflow: List[Dict[str, str]]) -> str:
+    """Used when the summary model is unavailable: keep the most recent text that fits."""
+    text = (summary + "\n" if summary else "") + "\n".join(f"{m['role']}: {m['content']}" for m in overflow)
+    return clip_summary(text)
+
+
+def clip_summary(text: str) -> str:
+    text = text.strip()
+    return text if len(text) <= SUMMARY_MAX_CHARS else text[-SUMMARY_MAX_CHARS:]
+
+
+def context_messages(summary: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Bounded prior context for the conversation prompt: rolling summary + last N turns."""
+    out = []
+    if summary:
+        out.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+    return out + history[-RECENT_TURNS * 2:]
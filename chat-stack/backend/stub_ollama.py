@@ -0,0 +1,192 @@
+"""Stub Ollama HTTP server for offline benchmarks.
+
+Speaks enough of the Ollama API (/api/chat, /api/generate, /api/tags) for
+ChatOllama, with a configurable time-to-first-token and token rate.
+
+    python stub_ollama.py --port 11435 --latency-ms 200 --tokens-per-sec 20
+    python stub_ollama.py --replies ../../bench/fixtures/replies.json
+
+A --replies file is either {substring: reply} or
+{"intents": {substring: intent}, "replies": {substring: reply}} to replay
+canned NLU and reply outputs; anything unmatched falls back to the defaults.
+"""
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+DEFAULT_REPLY = "Sure, I can help with your banking questions. What would you like to do today?"
+
+# Keyword → intent answers for the NLU classification prompt
+INTENT_KEYWORDS = [
+    ("beneficiary", "add_beneficiary"),
+    ("add ", "add_beneficiary"),
+    ("exchange", "exchange_rate"),
+    ("rate", "exchange_rate"),
+    ("transaction", "transactions"),
+    ("spent", "transactions"),
+    ("transfer", "transfer"),
+    ("send", "transfer"),
+    ("balance", "balance"),
+]
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 50.0, tokens_per_sec: float = 50.0,
+                 reply: str = DEFAULT_REPLY, replies: Optional[Dict[str, str]] = None,
+                 intents: Optional[Dict[str, str]] = None):
+        self.latency_ms = latency_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.reply = reply
+        self.replies = replies or {}  # substring of the user message → canned reply
+        self.intents = intents or {}  # substring of the user message → canned NLU answer
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def _classify(cfg: StubConfig, text: str) -> str:
+    text = text.lower()
+    for needle, intent in cfg.intents.items():
+        if needle.lower() in text:
+            return intent
+    for kw, intent in INTENT_KEYWORDS:
+        if kw in text:
+            return intent
+    return "conversation"
+
+
+def _reply_for(cfg: StubConfig, messages) -> str:
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    if "Classify the intent" in system:
+        return _classify(cfg, user)
+    for needle, reply in cfg.replies.items():
+        if needle.lower() in user.lower():
+            return reply
+    return cfg.reply
+
+
+def _tokens(text: str):
+    # Roughly one token per word, keeping the separating spaces
+    words = text.split(" ")
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+def make_handler(cfg: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, obj, status=200):
+            body = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/api/tags"):
+                return self._json({"models": [{"name": "stub"}]})
+            self._json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(length) or b"{}")
+            with cfg.lock:
+                cfg.requests += 1
+
+            if self.path.startswith("/api/chat"):
+                messages = req.get("messages", [])
+            elif self.path.startswith("/api/generate"):
+                messages = [{"role": "system", "content": req.get("system", "")},
+                            {"role": "user", "content": req.get("prompt", "")}]
+            else:
+                return self._json({"error": "not found"}, 404)
+
+            text = _reply_for(cfg, messages)
+            chat = self.path.startswith("/api/chat")
+            model = req.get("model", "stub")
+            t0 = time.perf_counter()
+            time.sleep(cfg.latency_ms / 1000)
+            toks = _tokens(text)
+            gap = 1.0 / cfg.tokens_per_sec if cfg.tokens_per_sec > 0 else 0.0
+
+            def frame(content, done):
+                obj = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+                if chat:
+                    obj["message"] = {"role": "assistant", "content": content}
+                else:
+                    obj["response"] = content
+                if done:
+                    obj.update({"done_reason": "stop", "eval_count": len(toks),
+                                "total_duration": int((time.perf_counter() - t0) * 1e9)})
+                return obj
+
+            if not req.get("stream", True):
+                time.sleep(gap * len(toks))
+                return self._json(frame(text, True))
+
+            # NDJSON stream; HTTP/1.0 so the connection close marks the end of the body
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for i, tok in enumerate(toks):
+                if i:
+                    time.sleep(gap)
+                self.wfile.write((json.dumps(frame(tok, False)) + "\n").encode())
+                self.wfile.flush()
+            self.wfile.write((json.dumps(frame("", True)) + "\n").encode())
+
+    return Handler
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def load_replies(cfg: StubConfig, path: str):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if "replies" in data or "intents" in data:
+        cfg.replies.update(data.get("replies") or {})
+        cfg.intents.update(data.get("intents") or {})
+    else:
+        cfg.replies.update(data)
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, cfg: Optional[StubConfig] = None, background: bool = True):
+    """Start the stub; returns (server, base_url). port=0 picks a free port."""
+    cfg = cfg or StubConfig()
+    server = StubServer((host, port), make_handler(cfg))
+    server.cfg = cfg
+    base_url = f"http://{host}:{server.server_address[1]}"
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="delay before the first token")
+    ap.add_argument("--tokens-per-sec", type=float, default=50.0)
+    ap.add_argument("--reply", default=DEFAULT_REPLY)
+    ap.add_argument("--replies", help="JSON file of canned replies (and optionally intents) by user-message substring")
+    args = ap.parse_args()
+
+    cfg = StubConfig(args.latency_ms, args.tokens_per_sec, args.reply)
+    if args.replies:
+        load_replies(cfg, args.replies)
+    server, url = serve(args.host, args.port, cfg, background=False)
+    print(f"Stub Ollama listening on {url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Stub exchange-rate providers for offline runs.
+
+Serves the exchangerate.host (/latest?base=&symbols=) and DuckDuckGo
+(/?q=...&format=json) response shapes with a configurable delay and failure
+mode, so rates.py can be pointed at it via EXCHANGERATE_HOST_URL / DDG_URL.
+
+    python stub_rates.py --kind exchangerate.host --port 8701 --latency-ms 300
+    python stub_rates.py --kind duckduckgo --port 8702 --fail
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+KINDS = ("exchangerate.host", "duckduckgo")
+DEFAULT_RATES = {("USD", "EUR"): 0.92, ("USD", "GBP"): 0.79, ("EUR", "USD"): 1.09}
+
+
+class StubRatesConfig:
+    def __init__(self, kind: str = "exchangerate.host", latency_ms: float = 20.0, fail: bool = False,
+                 rates: Optional[Dict] = None):
+        self.kind = kind
+        self.latency_ms = latency_ms
+        self.fail = fail  # answer 200 with an empty/error body, like the real APIs do
+        self.rates = rates or dict(DEFAULT_RATES)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def _body(cfg: StubRatesConfig, query: Dict[str, list]):
+    if cfg.kind == "exchangerate.host":
+        if cfg.fail:
+            return {"success": False, "error": {"type": "stub_failure"}}
+        base = query.get("base", ["USD"])[0].upper()
+        target = query.get("symbols", ["EUR"])[0].upper()
+        rate = cfg.rates.get((base, target))
+        return {"base": base, "rates": {target: rate} if rate else {}}
+
+    if cfg.fail:
+        return {"AbstractText": "", "Answer": ""}
+    words = query.get("q", [""])[0].upper().split()
+    base, target = (words[0], words[2]) if len(words) >= 3 else ("USD", "EUR")
+    rate = cfg.rates.get((base, target))
+    return {"AbstractText": "", "Answer": f"1 {base} = {rate} {target}" if rate else ""}
+
+
+def make_handler(cfg: StubRatesConfig):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with cfg.lock:
+                cfg.requests += 1
+            time.sleep(cfg.latency_ms / 1000)
+            body = json.dumps(_body(cfg, parse_qs(urlparse(self.path).query))).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, cfg: Optional[StubRatesConfig] = None, background: bool = True):
+    """Start the stub; returns (server, base_url). port=0 picks a free port."""
+    cfg = cfg or StubRatesConfig()
+    server = StubServer((host, port), make_handler(cfg))
+    server.cfg = cfg
+    base_url = f"http://{host}:{server.server_address[1]}"
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--kind", choices=KINDS, default="exchangerate.host")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8701)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--fail", action="store_true", help="return empty answers")
+    args = ap.parse_args()
+
+    server, url = serve(args.host, args.port, StubRatesConfig(args.kind, args.latency_ms, args.fail), background=False)
+    print(f"Stub {args.kind} listening on {url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
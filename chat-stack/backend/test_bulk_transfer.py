@@ -0,0 +1,34 @@
+"""POST /transfers/bulk may only debit the authenticated user's account.
+
+    PYTHONPATH=../../common python -m pytest -q test_bulk_transfer.py
+"""
+from fastapi.testclient import TestClient
+from jose import jwt
+
+import server
+
+
+def auth(username: str) -> dict:
+    return {"Authorization": "Bearer " + jwt.encode({"sub": username}, server.SECRET_KEY, algorithm=server.ALGORITHM)}
+
+
+def test_bulk_transfer_rejects_other_accounts(monkeypatch):
+    calls = []
+
+    async def fake_bulk(items):
+        calls.append(items)
+        return [{"status": "ok"} for _ in items]
+
+    monkeypatch.setattr(server, "aperform_bulk_transfer", fake_bulk)
+    client = TestClient(server.app)   # no lifespan: the handler never reaches the database
+    body = {"transfers": [{"from_user": "alice", "to_user": "carol", "amount": 5},
+                          {"from_user": "bob", "to_user": "carol", "amount": 500}]}
+
+    resp = client.post("/transfers/bulk", json=body, headers=auth("alice"))
+    assert resp.status_code == 403
+    assert calls == []
+
+    body["transfers"] = body["transfers"][:1]
+    resp = client.post("/transfers/bulk", json=body, headers=auth("alice"))
+    assert resp.status_code == 200
+    assert calls == [[("alice", "carol", 5.0)]]
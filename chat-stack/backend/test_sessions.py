@@ -0,0 +1,62 @@
+"""BoundedMemorySaver edits MemorySaver's private storage/writes/blobs. These tests
+fail when a langgraph-checkpoint release changes them; re-check sessions.py
+before bumping the pin in requirements.txt.
+
+    PYTHONPATH=../../common python -m pytest -q test_sessions.py
+"""
+import operator
+from typing import Annotated, TypedDict
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, END
+
+from sessions import BoundedMemorySaver
+
+
+class State(TypedDict):
+    n: Annotated[int, operator.add]
+
+
+def build(saver):
+    workflow = StateGraph(State)
+    workflow.add_node("step", lambda state: {"n": 1})
+    workflow.set_entry_point("step")
+    workflow.add_edge("step", END)
+    return workflow.compile(checkpointer=saver)
+
+
+def test_memory_saver_internals():
+    saver = MemorySaver()
+    for name in ("storage", "writes", "blobs"):
+        assert isinstance(getattr(saver, name), dict), name
+    assert callable(saver.serde.loads_typed)
+
+    build(saver).invoke({"n": 0}, {"configurable": {"thread_id": "t"}})
+    # storage[thread_id][checkpoint_ns][checkpoint_id] = (checkpoint, metadata, parent_id),
+    # each serialized as a (type, bytes) pair; blobs are keyed (thread_id, ns, channel, version)
+    for saved, meta, _parent in saver.storage["t"][""].values():
+        assert isinstance(saved[1], bytes) and isinstance(meta[1], bytes)
+        assert "channel_versions" in saver.serde.loads_typed(saved)
+    assert saver.blobs and all(key[0] == "t" and len(key) == 4 for key in saver.blobs)
+    assert all(key[0] == "t" and len(key) == 3 for key in saver.writes)
+
+
+def test_bounded_saver_prunes_and_evicts():
+    saver = BoundedMemorySaver(ttl=0, max_sessions=1, keep=1)
+    graph = build(saver)
+    config = {"configurable": {"thread_id": "t"}}
+    for _ in range(3):
+        graph.invoke({"n": 1}, config)
+
+    assert len(saver.storage["t"][""]) == 1
+    assert graph.get_state(config).values["n"] == 6
+    assert saver.stats()["bytes"] > 0
+    # Only blobs the kept checkpoint references survive
+    (saved, _meta, _parent), = saver.storage["t"][""].values()
+    live = set(saver.serde.loads_typed(saved)["channel_versions"].items())
+    assert {(key[2], key[3]) for key in saver.blobs if key[0] == "t"} <= live
+
+    graph.invoke({"n": 1}, {"configurable": {"thread_id": "u"}})   # LRU: max_sessions=1 drops "t"
+    assert "t" not in saver.storage
+    assert not [key for key in list(saver.blobs) + list(saver.writes) if key[0] == "t"]
+    assert saver.stats()["evictions"]["lru"] == 1
@@ -0,0 +1,95 @@
+-- Transfer engine: debit-with-funds-check, credit and both ledger rows in one
+-- server-side call. Rows are locked in account-id order so concurrent transfers
+-- between the same pair (in either direction) cannot deadlock, and balances are
+-- updated relatively (balance = balance - x) so concurrent transfers never lose updates.
+--
+-- A user's primary account is their lowest account id.
+
+CREATE OR REPLACE FUNCTION primary_account_id(p_user TEXT)
+RETURNS INT
+LANGUAGE sql STABLE AS $$
+    SELECT a.id
+    FROM accounts a
+    JOIN users u ON u.id = a.user_id
+    WHERE u.name = p_user
+    ORDER BY a.id
+    LIMIT 1
+$$;
+
+CREATE OR REPLACE FUNCTION transfer_funds(p_from TEXT, p_to TEXT, p_amount NUMERIC)
+RETURNS TABLE(status TEXT, balance_from NUMERIC, balance_to NUMERIC)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_from INT := primary_account_id(p_from);
+    v_to   INT := primary_account_id(p_to);
+    v_from_bal NUMERIC;
+    v_to_bal   NUMERIC;
+BEGIN
+    IF p_amount IS NULL OR p_amount <= 0 THEN
+        RETURN QUERY SELECT 'invalid_amount'::TEXT, NULL::NUMERIC, NULL::NUMERIC;
+        RETURN;
+    END IF;
+    IF v_from IS NULL THEN
+        RETURN QUERY SELECT 'sender_not_found'::TEXT, NULL::NUMERIC, NULL::NUMERIC;
+        RETURN;
+    END IF;
+    IF v_to IS NULL THEN
+        RETURN QUERY SELECT 'unknown_recipient'::TEXT, NULL::NUMERIC, NULL::NUMERIC;
+        RETURN;
+    END IF;
+    IF v_from = v_to THEN
+        RETURN QUERY SELECT 'same_account'::TEXT, NULL::NUMERIC, NULL::NUMERIC;
+        RETURN;
+    END IF;
+
+    -- deterministic lock order
+    PERFORM 1 FROM accounts WHERE id IN (v_from, v_to) ORDER BY id FOR UPDATE;
+
+    UPDATE accounts SET balance = balance - p_amount
+    WHERE id = v_from AND balance >= p_amount
+    RETURNING balance INTO v_from_bal;
+
+    IF NOT FOUND THEN
+        SELECT balance INTO v_from_bal FROM accounts WHERE id = v_from;
+        RETURN QUERY SELECT 'insufficient_funds'::TEXT, v_from_bal, NULL::NUMERIC;
+        RETURN;
+    END IF;
+
+    UPDATE accounts SET balance = balance + p_amount
+    WHERE id = v_to
+    RETURNING balance INTO v_to_bal;
+
+    INSERT INTO transactions (account_id, amount, category, description) VALUES
+        (v_from, -p_amount, 'transfer', 'Transfer to ' || p_to),
+        (v_to,    p_amount, 'transfer', 'Transfer from ' || p_from);
+
+    RETURN QUERY SELECT 'ok'::TEXT, v_from_bal, v_to_bal;
+END;
+$$;
+
+-- Bulk transfers (scheduled payments). Items are independent: a failed item
+-- reports its status and does not undo the others. All involved accounts are
+-- locked up front in id order, so concurrent batches cannot deadlock either.
+CREATE OR REPLACE FUNCTION transfer_funds_batch(p_from TEXT[], p_to TEXT[], p_amount NUMERIC[])
+RETURNS TABLE(idx INT, status TEXT, balance_from NUMERIC, balance_to NUMERIC)
+LANGUAGE plpgsql AS $$
+DECLARE
+    i INT;
+BEGIN
+    IF cardinality(p_from) <> cardinality(p_to) OR cardinality(p_from) <> cardinality(p_amount) THEN
+        RAISE EXCEPTION 'transfer_funds_batch: array lengths differ';
+    END IF;
+
+    PERFORM 1 FROM accounts
+    WHERE id IN (
+        SELECT primary_account_id(n) FROM unnest(p_from || p_to) AS n
+    )
+    ORDER BY id FOR UPDATE;
+
+    FOR i IN 1 .. coalesce(cardinality(p_from), 0) LOOP
+        RETURN QUERY
+            SELECT i, t.status, t.balance_from, t.balance_to
+            FROM transfer_funds(p_from[i], p_to[i], p_amount[i]) t;
+    END LOOP;
+END;
+$$;
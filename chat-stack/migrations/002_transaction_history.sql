@@ -0,0 +1,156 @@
+-- Transaction history at scale: indexes for per-account, newest-first scans and
+-- an incrementally maintained monthly rollup for spend summaries.
+
+-- accounts.user_id is the join key from users for every tool query
+CREATE INDEX IF NOT EXISTS idx_accounts_user_id ON accounts (user_id);
+
+-- Newest-first history per account; id breaks created_at ties for keyset pagination
+CREATE INDEX IF NOT EXISTS idx_transactions_account_created
+    ON transactions (account_id, created_at DESC, id DESC);
+
+-- Same, filtered by category
+CREATE INDEX IF NOT EXISTS idx_transactions_account_category_created
+    ON transactions (account_id, category, created_at DESC, id DESC);
+
+-- Spend per account, month and category
+CREATE TABLE IF NOT EXISTS transaction_monthly_rollup (
+    account_id INT NOT NULL REFERENCES accounts(id),
+    month      DATE NOT NULL,
+    category   VARCHAR(50) NOT NULL,
+    txn_count  BIGINT NOT NULL DEFAULT 0,
+    total_in   NUMERIC(14,2) NOT NULL DEFAULT 0,
+    total_out  NUMERIC(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (account_id, month, category)
+);
+
+-- Statement-level triggers with transition tables: one aggregated upsert per
+-- INSERT/COPY/UPDATE/DELETE statement rather than one per row, so bulk loads stay cheap.
+CREATE OR REPLACE FUNCTION rollup_transactions_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO transaction_monthly_rollup AS r (account_id, month, category, txn_count, total_in, total_out)
+    SELECT account_id,
+           date_trunc('month', coalesce(created_at, now()))::date,
+           coalesce(category, 'uncategorized'),
+           count(*),
+           coalesce(sum(amount) FILTER (WHERE amount > 0), 0),
+           coalesce(-sum(amount) FILTER (WHERE amount < 0), 0)
+    FROM new_rows
+    GROUP BY 1, 2, 3
+    ON CONFLICT (account_id, month, category) DO UPDATE SET
+        txn_count = r.txn_count + EXCLUDED.txn_count,
+        total_in  = r.total_in  + EXCLUDED.total_in,
+        total_out = r.total_out + EXCLUDED.total_out;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION rollup_transactions_delete() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE transaction_monthly_rollup r SET
+        txn_count = r.txn_count - d.n,
+        total_in  = r.total_in  - d.total_in,
+        total_out = r.total_out - d.total_out
+    FROM (
+        SELECT account_id,
+               date_trunc('month', coalesce(created_at, now()))::date AS month,
+               coalesce(category, 'uncategorized') AS category,
+               count(*) AS n,
+               coalesce(sum(amount) FILTER (WHERE amount > 0), 0) AS total_in,
+               coalesce(-sum(amount) FILTER (WHERE amount < 0), 0) AS total_out
+        FROM old_rows
+        GROUP BY 1, 2, 3
+    ) d
+    WHERE r.account_id = d.account_id AND r.month = d.month AND r.category = d.category;
+    -- Only the groups this statement touched, not a scan of the whole rollup
+    DELETE FROM transaction_monthly_rollup r
+    USING (
+        SELECT DISTINCT account_id,
+               date_trunc('month', coalesce(created_at, now()))::date AS month,
+               coalesce(category, 'uncategorized') AS category
+        FROM old_rows
+    ) d
+    WHERE r.account_id = d.account_id AND r.month = d.month AND r.category = d.category
+      AND r.txn_count <= 0;
+    RETURN NULL;
+END;
+$$;
+
+-- An UPDATE may move a row to another account, month or category, or change its
+-- amount: take the old rows out of their groups and add the new ones in one upsert
+CREATE OR REPLACE FUNCTION rollup_transactions_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO transaction_monthly_rollup AS r (account_id, month, category, txn_count, total_in, total_out)
+    SELECT account_id, month, category, sum(n), sum(total_in), sum(total_out)
+    FROM (
+        SELECT account_id,
+               date_trunc('month', coalesce(created_at, now()))::date AS month,
+               coalesce(category, 'uncategorized') AS category,
+               1 AS n,
+               greatest(amount, 0) AS total_in,
+               greatest(-amount, 0) AS total_out
+        FROM new_rows
+        UNION ALL
+        SELECT account_id,
+               date_trunc('month', coalesce(created_at, now()))::date,
+               coalesce(category, 'uncategorized'),
+               -1,
+               -greatest(amount, 0),
+               -greatest(-amount, 0)
+        FROM old_rows
+    ) d
+    GROUP BY 1, 2, 3
+    -- Updates that touch none of the rolled-up columns net out to nothing
+    HAVING sum(n) <> 0 OR sum(total_in) <> 0 OR sum(total_out) <> 0
+    ON CONFLICT (account_id, month, category) DO UPDATE SET
+        txn_count = r.txn_count + EXCLUDED.txn_count,
+        total_in  = r.total_in  + EXCLUDED.total_in,
+        total_out = r.total_out + EXCLUDED.total_out;
+    -- Rows only leave the groups they were in before the update
+    DELETE FROM transaction_monthly_rollup r
+    USING (
+        SELECT DISTINCT account_id,
+               date_trunc('month', coalesce(created_at, now()))::date AS month,
+               coalesce(category, 'uncategorized') AS category
+        FROM old_rows
+    ) d
+    WHERE r.account_id = d.account_id AND r.month = d.month AND r.category = d.category
+      AND r.txn_count <= 0;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_transactions_rollup_insert ON transactions;
+CREATE TRIGGER trg_transactions_rollup_insert
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_transactions_insert();
+
+DROP TRIGGER IF EXISTS trg_transactions_rollup_delete ON transactions;
+CREATE TRIGGER trg_transactions_rollup_delete
+    AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_transactions_delete();
+
+DROP TRIGGER IF EXISTS trg_transactions_rollup_update ON transactions;
+CREATE TRIGGER trg_transactions_rollup_update
+    AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_transactions_update();
+
+-- Backfill from existing rows
+TRUNCATE transaction_monthly_rollup;
+INSERT INTO transaction_monthly_rollup (account_id, month, category, txn_count, total_in, total_out)
+SELECT account_id,
+       date_trunc('month', coalesce(created_at, now()))::date,
+       coalesce(category, 'uncategorized'),
+       count(*),
+       coalesce(sum(amount) FILTER (WHERE amount > 0), 0),
+       coalesce(-sum(amount) FILTER (WHERE amount < 0), 0)
+FROM transactions
+GROUP BY 1, 2, 3;
+
+ANALYZE accounts;
+ANALYZE transactions;
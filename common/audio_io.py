@@ -0,0 +1,124 @@
+"""In-memory audio ingestion shared by STT and VoiceAuth.
+
+    from audio_io import decode_bytes
+
+    audio = decode_bytes(await file.read(), 16000)   # float32 mono in [-1, 1], no temp files
+
+16/32-bit PCM WAV at the target rate is decoded natively with numpy. Everything
+else (webm/ogg/opus, mp3, m4a, flac, WAV at another rate...) is piped through
+ffmpeg on stdin/stdout. If ffmpeg cannot read an MP4-family file from a pipe
+(index at the end of the file), it gets a seekable anonymous in-memory file
+(memfd) instead of a file on disk.
+"""
+import io
+import os
+import wave
+import subprocess
+from typing import Optional
+
+import numpy as np
+
+from instrumentation import timed
+
+# ---------------- Config ----------------
+SAMPLE_RATE = 16000
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFMPEG_TIMEOUT = float(os.getenv("FFMPEG_TIMEOUT", "30"))
+MAX_AUDIO_BYTES = int(os.getenv("MAX_AUDIO_BYTES", str(25 * 1024 * 1024)))
+
+
+class AudioDecodeError(ValueError):
+    pass
+
+
+def sniff(data: bytes) -> str:
+    """Container guess from magic bytes (for metrics labels and the native path)."""
+    head = data[:12]
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return "unknown"
+
+
+def _native_wav(data: bytes, sample_rate: int) -> Optional[np.ndarray]:
+    """16-bit / 32-bit PCM WAV already at the target rate; None means "use ffmpeg"."""
+    try:
+        with wave.open(io.BytesIO(data), "rb") as w:
+            if w.getframerate() != sample_rate or w.getsampwidth() not in (2, 4) or w.getcomptype() != "NONE":
+                return None
+            channels, width = w.getnchannels(), w.getsampwidth()
+            frames = w.readframes(w.getnframes())
+    except (wave.Error, EOFError):
+        return None   # float WAV, extensible headers etc.
+    dtype, scale = (np.int16, 32768.0) if width == 2 else (np.int32, 2147483648.0)
+    audio = np.frombuffer(frames, dtype=dtype).astype(np.float32) / scale
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    return audio
+
+
+# Input options per sniffed container. ffmpeg's default probe reads up to 5 MB
+# from a pipe before decoding; a WAV header tells it everything up front.
+INPUT_ARGS = {"wav": ["-f", "wav", "-probesize", "32"]}
+
+
+def _ffmpeg_args(src: str, sample_rate: int, fmt: str = "unknown"):
+    return [FFMPEG_BIN, "-nostdin", "-hide_banner", "-loglevel", "error", "-threads", "0",
+            *INPUT_ARGS.get(fmt, []), "-i", src,
+            "-f", "f32le", "-acodec", "pcm_f32le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"]
+
+
+def _ffmpeg_pipe(data: bytes, sample_rate: int, fmt: str) -> subprocess.CompletedProcess:
+    return subprocess.run(_ffmpeg_args("pipe:0", sample_rate, fmt), input=data,
+                          capture_output=True, timeout=FFMPEG_TIMEOUT, check=False)
+
+
+def _ffmpeg_memfd(data: bytes, sample_rate: int) -> subprocess.CompletedProcess:
+    # Seekable input without touching disk: an anonymous RAM-backed file
+    fd = os.memfd_create("upload")
+    try:
+        os.write(fd, data)
+        os.lseek(fd, 0, os.SEEK_SET)
+        return subprocess.run(_ffmpeg_args(f"/proc/self/fd/{fd}", sample_rate), pass_fds=(fd,),
+                              capture_output=True, timeout=FFMPEG_TIMEOUT, check=False)
+    finally:
+        os.close(fd)
+
+
+def decode_bytes(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode an encoded upload to float32 mono at sample_rate."""
+    if not data:
+        raise AudioDecodeError("empty audio")
+    if len(data) > MAX_AUDIO_BYTES:
+        raise AudioDecodeError(f"audio larger than {MAX_AUDIO_BYTES} bytes")
+
+    fmt = sniff(data)
+    if fmt == "wav":
+        with timed("audio_decode", "wav_native"):
+            audio = _native_wav(data, sample_rate)
+        if audio is not None:
+            return audio
+
+    with timed("audio_decode", f"ffmpeg_{fmt}"):
+        try:
+            proc = _ffmpeg_pipe(data, sample_rate, fmt)
+            if (proc.returncode != 0 or not proc.stdout) and fmt == "mp4" and hasattr(os, "memfd_create"):
+                proc = _ffmpeg_memfd(data, sample_rate)
+        except FileNotFoundError:
+            raise AudioDecodeError(f"{FFMPEG_BIN} not found")
+        except subprocess.TimeoutExpired:
+            raise AudioDecodeError("audio decoding timed out")
+    if proc.returncode != 0:
+        err = proc.stderr.decode(errors="replace").strip().splitlines()
+        raise AudioDecodeError(f"could not decode {fmt} audio: {err[-1] if err else proc.returncode}")
+    # f32le output: 4 bytes per sample, little endian
+    return np.frombuffer(proc.stdout[: len(proc.stdout) // 4 * 4], dtype="<f4")
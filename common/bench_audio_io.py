@@ -0,0 +1,116 @@
+"""Per-format decode timings: in-memory ingestion vs the old temp-file paths.
+
+The source clip is re-encoded with ffmpeg into each upload format the services
+see, then each format is decoded --repeat times by every available path:
+
+  memory       audio_io.decode_bytes (native WAV / ffmpeg stdin->stdout / memfd)
+  tempfile     upload written to a NamedTemporaryFile, ffmpeg reads the path (old STT shape)
+  pyav         temp file + faster_whisper.decode_audio (old STT code), if installed
+  pydub        pydub decode + WAV re-export to a temp file + read back (old VoiceAuth), if installed
+
+    PYTHONPATH=. python bench_audio_io.py --audio ../chat-stack/alice.wav
+    PYTHONPATH=. python bench_audio_io.py --formats webm mp3 --repeat 50
+"""
+import os
+import io
+import time
+import wave
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from audio_io import FFMPEG_BIN, SAMPLE_RATE, decode_bytes, _ffmpeg_args
+
+# name -> ffmpeg output args (container chosen by -f)
+FORMATS = {
+    "wav16k": ["-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le", "-f", "wav"],
+    "wav44k": ["-ar", "44100", "-ac", "2", "-c:a", "pcm_s16le", "-f", "wav"],
+    "flac": ["-ar", "16000", "-ac", "1", "-c:a", "flac", "-f", "flac"],
+    "mp3": ["-ar", "44100", "-ac", "1", "-c:a", "libmp3lame", "-b:a", "64k", "-f", "mp3"],
+    "ogg": ["-ar", "48000", "-ac", "1", "-c:a", "libopus", "-b:a", "32k", "-f", "ogg"],
+    "webm": ["-ar", "48000", "-ac", "1", "-c:a", "libopus", "-b:a", "32k", "-f", "webm"],
+    "m4a": ["-ar", "44100", "-ac", "1", "-c:a", "aac", "-b:a", "64k", "-f", "ipod"],   # moov at the end
+}
+
+
+def encode(source: str, args) -> bytes:
+    # m4a needs a seekable output to write its index; everything else streams
+    with tempfile.NamedTemporaryFile(suffix=".bin") as out:
+        subprocess.run([FFMPEG_BIN, "-y", "-hide_banner", "-loglevel", "error", "-i", source, *args, out.name],
+                       check=True)
+        return open(out.name, "rb").read()
+
+
+def via_tempfile(data: bytes) -> np.ndarray:
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        tmp.write(data)
+    try:
+        out = subprocess.run(_ffmpeg_args(tmp.name, SAMPLE_RATE), capture_output=True, check=True).stdout
+        return np.frombuffer(out, dtype="<f4")
+    finally:
+        os.remove(tmp.name)
+
+
+def via_pyav(data: bytes) -> np.ndarray:
+    from faster_whisper import decode_audio
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        tmp.write(data)
+    try:
+        return decode_audio(tmp.name, sampling_rate=SAMPLE_RATE)
+    finally:
+        os.remove(tmp.name)
+
+
+def via_pydub(data: bytes) -> np.ndarray:
+    from pydub import AudioSegment
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+        AudioSegment.from_file(io.BytesIO(data)).export(tmp.name, format="wav")
+    try:
+        with wave.open(tmp.name, "rb") as w:
+            return np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16).astype(np.float32) / 32768.0
+    finally:
+        os.remove(tmp.name)
+
+
+def available_paths():
+    paths = {"memory": lambda d: decode_bytes(d, SAMPLE_RATE), "tempfile": via_tempfile}
+    for name, fn, module in (("pyav", via_pyav, "faster_whisper"), ("pydub", via_pydub, "pydub")):
+        try:
+            __import__(module)
+            paths[name] = fn
+        except ImportError:
+            pass
+    return paths
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--audio", default=os.path.join(os.path.dirname(__file__), "..", "chat-stack", "alice.wav"))
+    ap.add_argument("--formats", nargs="*", choices=sorted(FORMATS), default=list(FORMATS))
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    paths = available_paths()
+    print(f"source {args.audio}, {args.repeat} runs per cell, paths: {', '.join(paths)}")
+    print(f"{'format':8} {'bytes':>9} {'path':9} {'p50 ms':>8} {'p95 ms':>8} {'audio s':>8}")
+    for fmt in args.formats:
+        data = encode(args.audio, FORMATS[fmt])
+        for name, fn in paths.items():
+            try:
+                audio = fn(data)
+                times = []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    fn(data)
+                    times.append((time.perf_counter() - t0) * 1000)
+            except Exception as e:
+                print(f"{fmt:8} {len(data):>9} {name:9} failed: {e}")
+                continue
+            print(f"{fmt:8} {len(data):>9} {name:9} {np.percentile(times, 50):>8.2f} {np.percentile(times, 95):>8.2f} "
+                  f"{len(audio) / SAMPLE_RATE:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
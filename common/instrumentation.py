@@ -0,0 +1,177 @@
+"""Shared request / stage instrumentation for the four services.
+
+    from instrumentation import instrument, timed
+
+    instrument(app, "stt")                    # /metrics, request histograms, in-flight gauge, trace ids
+    with timed("inference", "transcribe"):    # stage histogram + in-flight gauge + error counter
+        ...
+
+Stage kinds used across services: node (LangGraph node), db (banking query),
+inference (model compute), queue (waiting for a model slot), audio_decode,
+audio_encode, text.
+
+Trace ids: an incoming X-Trace-ID header is reused, otherwise one is minted.
+It is echoed on the response, available via trace_id() / trace_headers() for
+outgoing calls, and prefixed to every log() line, so one voice turn can be
+followed through voiceauth -> stt -> llm-backend -> tts.
+"""
+import os
+import time
+import uuid
+import asyncio
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.responses import Response
+from starlette.routing import Match
+
+# ---------------- Config ----------------
+SERVICE_NAME = os.getenv("SERVICE_NAME", "app")
+TRACE_HEADER = os.getenv("TRACE_HEADER", "x-trace-id").lower()
+TRACE_LOG = os.getenv("TRACE_LOG", "false").lower() in {"1", "true", "yes"}   # print one line per timed stage
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# ---------------- Metrics ----------------
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency (until the last body byte is sent)",
+    ["service", "method", "route", "status"], buckets=BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled", ["service"])
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Time spent in one stage of a request",
+    ["service", "kind", "stage"], buckets=BUCKETS,
+)
+STAGES_IN_FLIGHT = Gauge("stage_in_flight", "Stages currently running", ["service", "kind", "stage"])
+STAGE_ERRORS = Counter("stage_errors_total", "Stages that raised", ["service", "kind", "stage"])
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar("trace_id", default=None)
+_service = {"name": SERVICE_NAME}
+
+
+def trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def trace_headers() -> Dict[str, str]:
+    tid = _trace_id.get()
+    return {TRACE_HEADER: tid} if tid else {}
+
+
+def log(*args):
+    print(f"[{_service['name']} trace={_trace_id.get() or '-'}]", *args)
+
+
+# ---------------- Stage timing ----------------
+@contextmanager
+def timed(kind: str, stage: str):
+    service = _service["name"]
+    gauge = STAGES_IN_FLIGHT.labels(service, kind, stage)
+    gauge.inc()
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(service, kind, stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        gauge.dec()
+        STAGE_LATENCY.labels(service, kind, stage).observe(elapsed)
+        if TRACE_LOG:
+            log(f"{kind}/{stage} {elapsed * 1000:.1f}ms")
+
+
+def timed_fn(kind: str, stage: Optional[str] = None):
+    """Decorator form of timed(); works on sync and async functions.
+    An async a<name> whose module also defines <name> (the repo's async twin
+    convention) reports as <name>, so both variants share one stage label."""
+    def wrap(fn):
+        if asyncio.iscoroutinefunction(fn):
+            names = []
+
+            def async_name():
+                # Resolved on first call: the sync twin may be defined after fn
+                if not names:
+                    twin = fn.__name__[1:]
+                    names.append(twin if fn.__name__.startswith("a") and twin in fn.__globals__ else fn.__name__)
+                return names[0]
+
+            @functools.wraps(fn)
+            async def awrapper(*args, **kwargs):
+                with timed(kind, stage or async_name()):
+                    return await fn(*args, **kwargs)
+            return awrapper
+
+        name = stage or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(kind, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return wrap
+
+
+# ---------------- HTTP ----------------
+class MetricsMiddleware:
+    """Pure ASGI middleware so streamed responses are timed to their last byte."""
+
+    def __init__(self, app, router, service: str):
+        self.app = app
+        self.router = router
+        self.service = service
+
+    def _route(self, scope) -> str:
+        # Route template, not the raw path, to keep label cardinality bounded (/enroll/{username})
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        raw = dict(scope.get("headers") or []).get(TRACE_HEADER.encode())
+        tid = raw.decode("latin-1")[:64] if raw else uuid.uuid4().hex
+        token = _trace_id.set(tid)
+        if scope["type"] == "websocket":
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                _trace_id.reset(token)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers") or []) + [(TRACE_HEADER.encode(), tid.encode())]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(self.service)
+        in_flight.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(self.service, scope["method"], self._route(scope), str(status["code"])) \
+                .observe(time.perf_counter() - t0)
+            _trace_id.reset(token)
+
+
+def metrics_endpoint():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def instrument(app, service: Optional[str] = None):
+    """Add /metrics and the request/trace middleware to a FastAPI app."""
+    if service and SERVICE_NAME == "app":
+        _service["name"] = service
+    app.add_middleware(MetricsMiddleware, router=app.router, service=_service["name"])
+    app.add_api_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
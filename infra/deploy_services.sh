@@ -59,7 +59,7 @@ for SERVICE in "${SERVICES_TO_BUILD[@]}"; do
     --repository-name "$SERVICE" \
     --region "$AWS_REGION"
 
-  docker build --no-cache -t "$IMAGE" "$CONTEXT_DIR"
+  docker build --no-cache --build-context common=../common -t "$IMAGE" "$CONTEXT_DIR"
   docker push "$IMAGE"
 done
 
@@ -1,12 +1,18 @@
 # app.py
-import os, tempfile
+import os, json, time, asyncio, threading
 from typing import Optional, List
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+import numpy as np
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from faster_whisper import WhisperModel
+
+from instrumentation import instrument, timed, log
+from audio_io import AudioDecodeError, decode_bytes
+from streaming import SAMPLE_RATE, StreamSession, make_decoder
+from inference import STT_CPU_THREADS, STT_REPLICAS, InferenceScheduler, QueueFull
+import warmup
 
 # ---------- Config ----------
 MODEL_NAME = os.getenv("WHISPER_MODEL", "tiny.en")
@@ -17,6 +23,9 @@ BEAM_SIZE = 5
 TEMPERATURE = 0.0
 NO_SPEECH_THRESHOLD = 0.8
 LOG_PROB_THRESHOLD = -0.3
+STREAM_MAX_SESSIONS = int(os.getenv("STREAM_MAX_SESSIONS", "8"))
+STREAM_PARTIAL_INTERVAL_MS = int(os.getenv("STREAM_PARTIAL_INTERVAL_MS", "700"))
+STREAM_PARTIAL_BEAM_SIZE = int(os.getenv("STREAM_PARTIAL_BEAM_SIZE", "1"))   # partials are throwaway: greedy
 # ----------------------------
 
 app = FastAPI(title="STT Backend", version="1.0.0")
@@ -29,9 +38,54 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument(app, "stt")
+
+# ---------- Model startup ----------
+# Replicas load (and optionally autotune + warm up) on a background thread, so
+# /healthz can answer "not ready" meanwhile; all transcription goes through the
+# batching scheduler once it is up.
+scheduler: Optional[InferenceScheduler] = None
+startup = {"ready": False, "stage": "starting", "error": None, "compute_type": COMPUTE_TYPE,
+           "cpu_threads": None, "autotune": None, "seconds": None}
+
+
+def _load_models():
+    global scheduler
+    t0 = time.perf_counter()
+    try:
+        compute_type, cpu_threads, clip = COMPUTE_TYPE, STT_CPU_THREADS, None
+        if warmup.STT_WARMUP or warmup.STT_AUTOTUNE:
+            clip = warmup.load_clip()
+        if warmup.STT_AUTOTUNE:
+            startup["stage"] = "autotune"
+            cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+            budget = STT_CPU_THREADS or max(cores // max(STT_REPLICAS, 1), 1)
+            choice = warmup.autotune(MODEL_NAME, clip, budget, warmup.clip_reference())
+            compute_type, cpu_threads = choice["compute_type"], choice["cpu_threads"]
+            startup["autotune"] = choice
+        startup["stage"] = "loading"
+        sched = InferenceScheduler(MODEL_NAME, compute_type, cpu_threads=cpu_threads,
+                                   warmup_audio=clip if warmup.STT_WARMUP else None)
+        sched.start()
+        scheduler = sched
+        startup.update(ready=True, stage="ready", compute_type=compute_type, cpu_threads=sched.cpu_threads)
+    except Exception as e:
+        startup.update(stage="failed", error=str(e))
+        print("STT model startup failed: ", e)
+    finally:
+        startup["seconds"] = round(time.perf_counter() - t0, 2)
+
+
+@app.on_event("startup")
+def start_models():
+    threading.Thread(target=_load_models, name="whisper-startup", daemon=True).start()
+
+
+def require_ready() -> InferenceScheduler:
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail=f"Model not ready ({startup['stage']})", headers={"Retry-After": "5"})
+    return scheduler
 
-# Load model once at startup
-model = WhisperModel(MODEL_NAME, compute_type=COMPUTE_TYPE)
 
 class Segment(BaseModel):
     start: float
@@ -58,52 +112,158 @@ def transcribe_file(
 ):
     if file.size is not None and file.size == 0:
         raise HTTPException(status_code=400, detail="Empty file.")
+    if condition_on_previous_text:
+        # Batched decoding transcribes each VAD clip independently, so there is no
+        # previous text to condition on; refuse rather than silently ignore it
+        raise HTTPException(status_code=400, detail="condition_on_previous_text is not supported with batched decoding.")
 
-    suffix = os.path.splitext(file.filename or "")[1] or ".audio"
+    sched = require_ready()
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp_path = tmp.name
-            tmp.write(file.file.read())
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save upload: {e}")
+        # Straight from the request body to float32 samples, no temp file
+        audio = decode_bytes(file.file.read(), SAMPLE_RATE)
+    except AudioDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Could not decode audio: {e}")
 
     try:
-        segments, info = model.transcribe(
-            tmp_path,
+        # Waits for a batch slot
+        segments, info = sched.transcribe(
+            audio,
+            vad=vad,
+            min_silence_ms=VAD_MIN_SILENCE_MS,
             language=language,
-            vad_filter=vad,
-            vad_parameters=dict(min_silence_duration_ms=VAD_MIN_SILENCE_MS),
             beam_size=beam_size,
             temperature=temperature,
             no_speech_threshold=no_speech_threshold,
             log_prob_threshold=log_prob_threshold,
-            condition_on_previous_text=condition_on_previous_text,
         )
 
-        segs = []
-        text_parts = []
-        for s in segments:
-            segs.append(Segment(start=s.start, end=s.end, text=s.text))
-            text_parts.append(s.text)
-
-        full_text = "".join(text_parts).strip()
+        segs = [Segment(**s) for s in segments]
+        full_text = "".join(s.text for s in segs).strip()
 
         return TranscriptionResponse(
             text=full_text,
             segments=segs,
-            language=getattr(info, "language", language),
-            duration=getattr(info, "duration", None),
+            language=info.get("language") or language,
+            duration=info.get("duration"),
             model_name=MODEL_NAME,
         )
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Transcription error: {e}")
-    finally:
+
+# ---------- Streaming ----------
+_active_streams = 0
+
+
+def _transcribe_segment(audio: np.ndarray, final: bool, prompt: str, language: Optional[str]) -> str:
+    # The stream is already VAD-segmented, so Whisper's own VAD is off here
+    with timed("inference", "segment" if final else "partial"):
+        segments, _info = scheduler.transcribe(
+            audio,
+            vad=False,
+            language=language,
+            beam_size=BEAM_SIZE if final else STREAM_PARTIAL_BEAM_SIZE,
+            temperature=TEMPERATURE,
+            no_speech_threshold=NO_SPEECH_THRESHOLD,
+            log_prob_threshold=LOG_PROB_THRESHOLD,
+            initial_prompt=prompt or None,
+        )
+        return "".join(s["text"] for s in segments).strip()
+
+
+@app.websocket("/ws/transcribe")
+async def transcribe_stream(ws: WebSocket):
+    """Live transcription while the user is speaking.
+
+    Client -> server: an optional JSON {"event": "start", "format": "pcm16" | "webm" | "ogg" | ...,
+    "sample_rate": 16000, "language": "en", "partials": true}, then binary audio chunks,
+    then {"event": "end"}. pcm16 is raw mono int16; anything else is piped through ffmpeg.
+
+    Server -> client: {"type": "vad"}, {"type": "partial"} for the open segment,
+    {"type": "segment"} for each closed one, then a single {"type": "final"}.
+    """
+    global _active_streams
+    await ws.accept()
+    if scheduler is None or _active_streams >= STREAM_MAX_SESSIONS:
+        detail = "Model not ready" if scheduler is None else "Too many live transcriptions"
+        await ws.send_json({"type": "error", "detail": f"{detail}, try again shortly."})
+        await ws.close(code=1013)
+        return
+
+    _active_streams += 1
+    send_lock = asyncio.Lock()
+
+    async def send(msg: dict):
+        async with send_lock:
+            await ws.send_json(msg)
+
+    config = {}
+    session = decoder = None
+    try:
+        await send({"type": "ready", "sample_rate": SAMPLE_RATE})
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                return   # client gone, nobody to deliver a final to
+            if msg.get("bytes"):
+                if session is None:
+                    language = config.get("language", "en")
+                    session = StreamSession(
+                        lambda audio, final, prompt: _transcribe_segment(audio, final, prompt, language),
+                        send,
+                        partial_interval=STREAM_PARTIAL_INTERVAL_MS / 1000,
+                        partials=bool(config.get("partials", True)),
+                    )
+                    decoder = make_decoder(str(config.get("format", "pcm16")).lower(), session.feed,
+                                           int(config.get("sample_rate", SAMPLE_RATE)))
+                with timed("preprocess", "stream_chunk"):
+                    await decoder.write(msg["bytes"])
+            elif msg.get("text"):
+                event = json.loads(msg["text"])
+                if event.get("event") == "start" and session is None:
+                    config = event
+                elif event.get("event") == "end":
+                    break
+
+        ended = time.perf_counter()
+        if session is None:
+            await send({"type": "final", "text": "", "segments": [], "duration": 0.0, "finalize_ms": 0.0})
+        else:
+            await decoder.close()
+            result = await session.finish()
+            # Time from end of audio to the final transcript: only the tail segment is left to decode
+            result["finalize_ms"] = round((time.perf_counter() - ended) * 1000, 1)
+            log("stream transcribed", f"{result['duration']}s audio, {len(result['segments'])} segments, "
+                f"final after {result['finalize_ms']}ms")
+            await send(result)
+        await ws.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
         try:
-            os.remove(tmp_path)
+            await send({"type": "error", "detail": f"Transcription error: {e}"})
+            await ws.close(code=1011)
         except Exception:
             pass
+    finally:
+        _active_streams -= 1
+        if session:
+            session.cancel()
+        if decoder:
+            decoder.kill()
+
+
+@app.get("/inference/stats")
+def inference_stats():
+    return JSONResponse({"startup": startup, **(scheduler.stats() if scheduler else {})})
 
 @app.get("/healthz")
 def health_check():
-    return JSONResponse({"ok": True, "model": MODEL_NAME, "compute_type": COMPUTE_TYPE})
+    # 503 until the replicas are loaded and warm, so orchestrators hold traffic back
+    body = {"ok": startup["ready"], "stage": startup["stage"], "model": MODEL_NAME,
+            "compute_type": startup["compute_type"], "cpu_threads": startup["cpu_threads"], "streams": _active_streams}
+    if startup["error"]:
+        body["error"] = startup["error"]
+    return JSONResponse(body, status_code=200 if startup["ready"] else 503)
 
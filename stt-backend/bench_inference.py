@@ -0,0 +1,99 @@
+"""Requests/sec vs cores for the Whisper batching scheduler.
+
+For each core count the process is pinned to that many cores and --requests
+transcriptions of the same clip are sent --concurrency at a time, against:
+
+  serial    1 replica using all the cores, batch 1, no wait (one request at a time
+            on one model, as before the scheduler)
+  batched   --replicas replicas splitting the cores, batches of <= --max-batch clips
+            collected for <= --max-wait-ms
+
+    PYTHONPATH=../common python bench_inference.py --audio ../chat-stack/alice.wav
+    PYTHONPATH=../common python bench_inference.py --cores 2 4 8 --replicas 2 --concurrency 32 --json out.json
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_io import decode_bytes
+from inference import SAMPLE_RATE, InferenceScheduler
+
+
+def run_config(args, audio, cores, replicas, max_batch, max_wait_ms):
+    os.sched_setaffinity(0, cores)
+    sched = InferenceScheduler(args.model, args.compute_type, replicas=replicas,
+                               cpu_threads=max(len(cores) // replicas, 1), max_batch=max_batch,
+                               max_wait_ms=max_wait_ms, max_queue=args.requests, pin_cores=replicas > 1)
+    sched.start()
+    sched.transcribe(audio, language="en")   # warm up
+
+    def one(_):
+        t0 = time.perf_counter()
+        sched.transcribe(audio, language="en", beam_size=args.beam_size)
+        return time.perf_counter() - t0
+
+    before = dict(sched.counters)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        latencies = list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - t0
+    sched.stop()
+    batches = sched.counters["batches"] - before["batches"]
+    return {
+        "cores": len(cores),
+        "replicas": replicas,
+        "threads_per_replica": sched.cpu_threads,
+        "max_batch": max_batch,
+        "req_per_s": round(args.requests / wall, 2),
+        "audio_s_per_s": round(args.requests * len(audio) / SAMPLE_RATE / wall, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1),
+        "avg_batch": round((sched.counters["batched_requests"] - before["batched_requests"]) / max(batches, 1), 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--audio", default=os.path.join(os.path.dirname(__file__), "..", "chat-stack", "alice.wav"))
+    ap.add_argument("--model", default=os.getenv("WHISPER_MODEL", "tiny.en"))
+    ap.add_argument("--compute-type", default=os.getenv("WHISPER_COMPUTE_TYPE", "int8"))
+    available = sorted(os.sched_getaffinity(0))
+    default_cores = [c for c in (1, 2, 4, 8, 16) if c <= len(available)]
+    ap.add_argument("--cores", type=int, nargs="*", default=default_cores)
+    ap.add_argument("--replicas", type=int, default=0, help="batched replicas; 0 = one per 2 cores")
+    ap.add_argument("--max-batch", type=int, default=8)
+    ap.add_argument("--max-wait-ms", type=float, default=20.0)
+    ap.add_argument("--beam-size", type=int, default=5)
+    ap.add_argument("--requests", type=int, default=48)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--json", help="write the rows to this file")
+    args = ap.parse_args()
+
+    with open(args.audio, "rb") as f:
+        audio = decode_bytes(f.read(), SAMPLE_RATE)
+    print(f"clip {len(audio) / SAMPLE_RATE:.1f}s, model {args.model}/{args.compute_type}, "
+          f"{args.requests} requests x{args.concurrency} concurrent")
+    print(f"{'cores':>5} {'mode':8} {'replicas':>8} {'thr':>4} {'req/s':>7} {'audio x':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'batch':>6}")
+    rows = []
+    for n in args.cores:
+        cores = available[:n]
+        replicas = args.replicas or max(n // 2, 1)
+        for mode, cfg in (("serial", (1, 1, 0.0)), ("batched", (min(replicas, n), args.max_batch, args.max_wait_ms))):
+            row = {"mode": mode, **run_config(args, audio, cores, *cfg)}
+            rows.append(row)
+            print(f"{row['cores']:>5} {mode:8} {row['replicas']:>8} {row['threads_per_replica']:>4} "
+                  f"{row['req_per_s']:>7} {row['audio_s_per_s']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                  f"{row['avg_batch']:>6}")
+    os.sched_setaffinity(0, available)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": args.model, "compute_type": args.compute_type, "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
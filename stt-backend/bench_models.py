@@ -0,0 +1,108 @@
+"""Offline accuracy / speed table per Whisper model size and compute type.
+
+For every (model, compute type) pair the reference set is transcribed and the
+script reports load time, first-pass (cold) time, real-time factor (decode
+seconds / audio seconds, lower is faster) and corpus WER against the reference
+text. Nothing is served; run it on the hardware you deploy to.
+
+The reference set is a directory with manifest.jsonl, one {"audio": "<file>",
+"text": "<what is said>"} per line (audio paths relative to the directory).
+--make-refset builds one by synthesizing phrases through the TTS service:
+
+    PYTHONPATH=../common python bench_models.py --make-refset refset --tts-url http://localhost:8001
+    PYTHONPATH=../common python bench_models.py --refset refset --models tiny.en base.en small.en \\
+        --compute-types int8 int8_float32 float32 --threads 4 --json models.json
+"""
+import os
+import json
+import argparse
+
+import warmup
+
+PHRASES = [
+    "what's my balance",
+    "show my last transactions",
+    "what is the usd to eur exchange rate",
+    "transfer 1 dollar to Bob",
+    "hello, what can you do?",
+    "send two hundred and fifty dollars to my savings account",
+    "how much did I spend on groceries last month",
+    "block my debit card ending in four two one seven",
+]
+
+
+def make_refset(out_dir: str, tts_url: str, phrases_path: str = None):
+    import httpx
+    phrases = json.load(open(phrases_path)) if phrases_path else PHRASES
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "manifest.jsonl"), "w") as manifest, httpx.Client(timeout=120) as client:
+        for i, text in enumerate(phrases):
+            resp = client.post(f"{tts_url.rstrip('/')}/tts", json={"text": text, "audio_format": "wav"})
+            resp.raise_for_status()
+            name = f"{i:03d}.wav"
+            with open(os.path.join(out_dir, name), "wb") as f:
+                f.write(resp.content)
+            manifest.write(json.dumps({"audio": name, "text": text}) + "\n")
+            print(f"{name}: {text}")
+
+
+def load_refset(ref_dir: str):
+    clips, texts = [], []
+    with open(os.path.join(ref_dir, "manifest.jsonl")) as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                clips.append(warmup.load_clip(os.path.join(ref_dir, item["audio"])))
+                texts.append(item["text"])
+    return clips, texts
+
+
+def corpus_wer(refs, hyps) -> float:
+    edits = sum(warmup.edit_distance(warmup._words(r), warmup._words(h)) for r, h in zip(refs, hyps))
+    return edits / max(sum(len(warmup._words(r)) for r in refs), 1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--refset", help="directory with manifest.jsonl")
+    ap.add_argument("--make-refset", metavar="DIR", help="synthesize a reference set into DIR and exit")
+    ap.add_argument("--tts-url", default="http://localhost:8001")
+    ap.add_argument("--phrases", help="JSON list of phrases for --make-refset")
+    ap.add_argument("--models", nargs="*", default=["tiny.en", "base.en", "small.en"])
+    ap.add_argument("--compute-types", nargs="*", default=["int8", "int8_float32", "float32"])
+    ap.add_argument("--threads", type=int, default=len(os.sched_getaffinity(0)))
+    ap.add_argument("--runs", type=int, default=2)
+    ap.add_argument("--json", help="write the rows to this file")
+    args = ap.parse_args()
+
+    if args.make_refset:
+        make_refset(args.make_refset, args.tts_url, args.phrases)
+        return
+    if not args.refset:
+        ap.error("--refset or --make-refset is required")
+
+    clips, refs = load_refset(args.refset)
+    audio_s = sum(len(c) for c in clips) / warmup.SAMPLE_RATE
+    print(f"{len(clips)} clips, {audio_s:.1f}s audio, {args.threads} threads, cpu: {warmup.cpu_profile()['cpu']}")
+    print(f"{'model':10} {'compute':13} {'load s':>7} {'cold s':>7} {'RTF':>7} {'x realtime':>10} {'WER':>6}")
+    rows = []
+    for model in args.models:
+        for ct in args.compute_types:
+            try:
+                r = warmup.measure(model, ct, args.threads, clips, args.runs)
+            except ValueError as e:
+                print(f"{model:10} {ct:13} unsupported: {e}")
+                continue
+            row = {"model": model, **{k: v for k, v in r.items() if k != "texts"},
+                   "wer": round(corpus_wer(refs, r["texts"]), 4)}
+            rows.append(row)
+            speed = 1 / row["rtf"] if row["rtf"] else float("inf")
+            print(f"{model:10} {ct:13} {row['load_s']:>7.2f} {row['first_pass_s']:>7.2f} {row['rtf']:>7.3f} "
+                  f"{speed:>10.1f} {row['wer']:>6.3f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"profile": warmup.cpu_profile(), "audio_s": audio_s, "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# inference.py
+import os
+import time
+import bisect
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+from faster_whisper import WhisperModel, BatchedInferencePipeline
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+from instrumentation import timed
+
+SAMPLE_RATE = 16000
+CLIP_SECONDS = 30          # Whisper's window: one clip = one batch row
+
+# ---------- Config ----------
+STT_REPLICAS = int(os.getenv("STT_REPLICAS", "1"))             # model copies, one worker thread each
+STT_CPU_THREADS = int(os.getenv("STT_CPU_THREADS", "0"))       # per replica; 0 = available cores / replicas
+STT_NUM_WORKERS = int(os.getenv("STT_NUM_WORKERS", "1"))       # CTranslate2 workers per replica
+STT_PIN_CORES = os.getenv("STT_PIN_CORES", "false").lower() in {"1", "true", "yes"}  # give each replica its own cores
+STT_MAX_BATCH = int(os.getenv("STT_MAX_BATCH", "8"))           # clips per forward pass
+STT_MAX_WAIT_MS = float(os.getenv("STT_MAX_WAIT_MS", "20"))    # how long a batch may wait to fill up
+STT_MAX_QUEUE = int(os.getenv("STT_MAX_QUEUE", "64"))          # queued requests before we shed load
+# ----------------------------
+
+BATCH_REQUESTS = Histogram("stt_batch_requests", "Requests per inference batch",
+                           buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32))
+BATCH_CLIPS = Histogram("stt_batch_clips", "30 s clips per inference batch",
+                        buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32))
+QUEUE_WAIT = Histogram("stt_queue_wait_seconds", "Time a request waited for a batch",
+                       buckets=(0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+QUEUE_DEPTH = Gauge("stt_queue_depth", "Requests waiting for a replica")
+REJECTED = Counter("stt_rejected_total", "Requests refused because the queue was full")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def speech_clips(audio: np.ndarray, vad: bool = True, min_silence_ms: int = 200) -> List[Tuple[float, float]]:
+    """Split audio into <= 30 s (start, end) windows in seconds, over speech only when vad is set."""
+    if vad:
+        regions = [(r["start"] / SAMPLE_RATE, r["end"] / SAMPLE_RATE)
+                   for r in get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=min_silence_ms))]
+    else:
+        regions = [(0.0, len(audio) / SAMPLE_RATE)]
+
+    clips = []
+    for start, end in regions:
+        # Extend the open clip while it stays inside one window, otherwise start a new one
+        if clips and end - clips[-1][0] <= CLIP_SECONDS:
+            clips[-1] = (clips[-1][0], end)
+            continue
+        while end - start > CLIP_SECONDS:
+            clips.append((start, start + CLIP_SECONDS))
+            start += CLIP_SECONDS
+        clips.append((start, end))
+    return [c for c in clips if c[1] - c[0] >= 0.1]
+
+
+class Job:
+    def __init__(self, audio: np.ndarray, clips: List[Tuple[float, float]], options: Dict[str, Any]):
+        self.audio = audio
+        self.clips = clips
+        self.options = options
+        self.key = tuple(sorted(options.items()))   # only identical decode options share a batch
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+
+
+class Replica(threading.Thread):
+    def __init__(self, scheduler: "InferenceScheduler", index: int, cores: Optional[List[int]]):
+        super().__init__(name=f"whisper-{index}", daemon=True)
+        self.scheduler = scheduler
+        self.index = index
+        self.cores = cores
+        self.ready = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.pipeline = None
+        self.batches = 0
+        self.warmup_s = None
+
+    def run(self):
+        try:
+            if self.cores:
+                # Set before loading so CTranslate2's thread pool inherits the affinity
+                os.sched_setaffinity(0, self.cores)
+            s = self.scheduler
+            model = WhisperModel(s.model_name, compute_type=s.compute_type,
+                                 cpu_threads=s.cpu_threads, num_workers=s.num_workers)
+            self.pipeline = BatchedInferencePipeline(model=model)
+            if s.warmup_audio is not None:
+                # Pay CTranslate2's lazy init and first-allocation cost before real traffic
+                t0 = time.perf_counter()
+                clip = [{"start": 0.0, "end": min(len(s.warmup_audio) / SAMPLE_RATE, CLIP_SECONDS)}]
+                segments, _info = self.pipeline.transcribe(s.warmup_audio, clip_timestamps=clip, vad_filter=False,
+                                                           language="en")
+                for _ in segments:
+                    pass
+                self.warmup_s = round(time.perf_counter() - t0, 3)
+        except BaseException as e:
+            self.error = e
+            return
+        finally:
+            self.ready.set()
+
+        while True:
+            batch = self.scheduler._take_batch()
+            if batch is None:
+                return
+            self.scheduler._run_batch(self, batch)
+            self.batches += 1
+
+
+# ---------- Scheduler ----------
+class InferenceScheduler:
+    """Collects concurrent transcriptions into micro-batches for a pool of model replicas.
+
+    A replica takes the oldest request, then keeps adding requests with the same
+    decode options until max_batch clips are queued or max_wait_ms has passed since
+    that oldest request arrived. The batch is concatenated and decoded in one
+    BatchedInferencePipeline call (one clip per batch row, via clip_timestamps);
+    segments are then mapped back to their requests by offset.
+    """
+
+    def __init__(self, model_name: str, compute_type: str, replicas: int = STT_REPLICAS,
+                 cpu_threads: int = STT_CPU_THREADS, num_workers: int = STT_NUM_WORKERS,
+                 max_batch: int = STT_MAX_BATCH, max_wait_ms: float = STT_MAX_WAIT_MS,
+                 max_queue: int = STT_MAX_QUEUE, pin_cores: bool = STT_PIN_CORES,
+                 warmup_audio: Optional[np.ndarray] = None):
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.replicas = max(replicas, 1)
+        self.cpu_threads = cpu_threads or max(len(cores) // self.replicas, 1)
+        self.num_workers = max(num_workers, 1)
+        self.max_batch = max(max_batch, 1)
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max(max_queue, 1)
+        self.warmup_audio = warmup_audio
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = []
+        for i in range(self.replicas):
+            pinned = cores[i * self.cpu_threads:(i + 1) * self.cpu_threads] if pin_cores else None
+            self._workers.append(Replica(self, i, pinned or None))
+        self.counters = {"requests": 0, "batches": 0, "batched_requests": 0, "clips": 0, "rejected": 0}
+
+    def start(self):
+        """Load (and warm) every replica, blocking, then start serving."""
+        if self.warmup_audio is not None:
+            speech_clips(self.warmup_audio)   # loads the VAD model
+        for w in self._workers:
+            w.start()
+        for w in self._workers:
+            w.ready.wait()
+            if w.error:
+                raise w.error
+        print(f"Whisper {self.model_name}: {self.replicas} replica(s) x {self.cpu_threads} threads, "
+              f"batch<={self.max_batch} clips, wait<={self.max_wait * 1000:.0f}ms")
+
+    def stop(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # -------- submit --------
+    def submit(self, audio: np.ndarray, clips: List[Tuple[float, float]], **options) -> Future:
+        job = Job(audio, clips, options)
+        if not clips:
+            # Nothing to decode (silence): answer without touching a replica
+            job.future.set_result(([], {"language": options.get("language"), "duration": len(audio) / SAMPLE_RATE}))
+            return job.future
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.counters["rejected"] += 1
+                REJECTED.inc()
+                raise QueueFull("transcription queue is full")
+            self._queue.append(job)
+            self.counters["requests"] += 1
+            QUEUE_DEPTH.set(len(self._queue))
+            self._cond.notify_all()
+        return job.future
+
+    def transcribe(self, audio: np.ndarray, vad: bool = True, min_silence_ms: int = 200, **options):
+        """Blocking: returns (segments, info); segment times are relative to `audio`."""
+        return self.submit(audio, speech_clips(audio, vad, min_silence_ms), **options).result()
+
+    async def atranscribe(self, audio: np.ndarray, vad: bool = True, min_silence_ms: int = 200, **options):
+        clips = await asyncio.to_thread(speech_clips, audio, vad, min_silence_ms)
+        return await asyncio.wrap_future(self.submit(audio, clips, **options))
+
+    # -------- worker side --------
+    def _take_batch(self) -> Optional[List[Job]]:
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            first = self._queue.popleft()
+            batch, clips = [first], len(first.clips)
+            deadline = first.enqueued + self.max_wait
+            while clips < self.max_batch:
+                for job in list(self._queue):
+                    if job.key == first.key and clips + len(job.clips) <= self.max_batch:
+                        self._queue.remove(job)
+                        batch.append(job)
+                        clips += len(job.clips)
+                remaining = deadline - time.monotonic()
+                if clips >= self.max_batch or remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+            QUEUE_DEPTH.set(len(self._queue))
+            return batch
+
+    def _run_batch(self, replica: Replica, batch: List[Job]):
+        now = time.monotonic()
+        offsets, clip_ts, owners, pos = [], [], [], 0.0
+        for i, job in enumerate(batch):
+            QUEUE_WAIT.observe(now - job.enqueued)
+            offsets.append(pos)
+            for start, end in job.clips:
+                clip_ts.append({"start": pos + start, "end": pos + end})
+                owners.append(i)
+            pos += len(job.audio) / SAMPLE_RATE
+        starts = [c["start"] for c in clip_ts]
+        BATCH_REQUESTS.observe(len(batch))
+        BATCH_CLIPS.observe(len(clip_ts))
+        with self._cond:   # several replica threads run batches at once
+            self.counters["batches"] += 1
+            self.counters["batched_requests"] += len(batch)
+            self.counters["clips"] += len(clip_ts)
+
+        try:
+            audio = batch[0].audio if len(batch) == 1 else np.concatenate([j.audio for j in batch])
+            results = [[] for _ in batch]
+            # transcribe() is lazy: decoding happens while iterating
+            with timed("inference", "transcribe_batch"):
+                segments, info = replica.pipeline.transcribe(
+                    audio, clip_timestamps=clip_ts, vad_filter=False, batch_size=self.max_batch, **batch[0].options)
+                for s in segments:
+                    k = owners[max(bisect.bisect_right(starts, s.start + 1e-3) - 1, 0)]
+                    results[k].append({"start": round(s.start - offsets[k], 3),
+                                       "end": round(s.end - offsets[k], 3), "text": s.text})
+        except Exception as e:
+            for job in batch:
+                job.future.set_exception(e)
+            return
+        for job, segs in zip(batch, results):
+            job.future.set_result((segs, {"language": getattr(info, "language", None),
+                                          "duration": len(job.audio) / SAMPLE_RATE}))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            c = dict(self.counters)
+            queue_depth = len(self._queue)
+        return {
+            "model": self.model_name,
+            "compute_type": self.compute_type,
+            "replicas": self.replicas,
+            "cpu_threads": self.cpu_threads,
+            "num_workers": self.num_workers,
+            "pinned_cores": [w.cores for w in self._workers] if any(w.cores for w in self._workers) else None,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": queue_depth,
+            **c,
+            "avg_batch_requests": round(c["batched_requests"] / c["batches"], 2) if c["batches"] else 0.0,
+            "batches_per_replica": [w.batches for w in self._workers],
+            "warmup_s": [w.warmup_s for w in self._workers],
+        }
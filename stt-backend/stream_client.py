@@ -0,0 +1,91 @@
+"""Stream an audio file to /ws/transcribe at real-time pace and print what comes back.
+
+WAV files are sent as raw pcm16 (any sample rate, mono or first channel);
+other files are sent as-is in chunks and decoded server-side by ffmpeg.
+Reports how long after the end of audio the final transcript arrived.
+
+    python stream_client.py sample.wav
+    python stream_client.py recording.webm --url ws://localhost:8000/ws/transcribe --speed 4
+"""
+import json
+import time
+import wave
+import asyncio
+import argparse
+
+import numpy as np
+import websockets
+
+
+def wav_chunks(path: str, chunk_ms: int):
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise SystemExit("only 16-bit WAV is supported; send other formats as-is")
+        rate, channels = w.getframerate(), w.getnchannels()
+        pcm = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+    if channels > 1:
+        pcm = pcm[::channels]
+    step = rate * chunk_ms // 1000
+    chunks = [pcm[i:i + step].tobytes() for i in range(0, len(pcm), step)]
+    return {"format": "pcm16", "sample_rate": rate}, chunks, chunk_ms / 1000
+
+
+def file_chunks(path: str, chunk_ms: int, fmt: str):
+    # Container audio has no fixed bytes/second; pace by an assumed ~32 kbit/s
+    data = open(path, "rb").read()
+    step = max(4 * chunk_ms, 1)
+    return {"format": fmt}, [data[i:i + step] for i in range(0, len(data), step)], chunk_ms / 1000
+
+
+async def run(args):
+    if args.file.lower().endswith(".wav"):
+        config, chunks, interval = wav_chunks(args.file, args.chunk_ms)
+    else:
+        config, chunks, interval = file_chunks(args.file, args.chunk_ms, args.file.rsplit(".", 1)[-1].lower())
+    config.update({"event": "start", "language": args.language, "partials": not args.no_partials})
+
+    t0 = time.perf_counter()
+    ended = None
+    async with websockets.connect(args.url, max_size=None) as ws:
+        async def sender():
+            nonlocal ended
+            await ws.send(json.dumps(config))
+            for chunk in chunks:
+                await ws.send(chunk)
+                await asyncio.sleep(interval / args.speed)
+            await ws.send(json.dumps({"event": "end"}))
+            ended = time.perf_counter()
+
+        send_task = asyncio.create_task(sender())
+        async for raw in ws:
+            msg = json.loads(raw)
+            at = time.perf_counter() - t0
+            if msg["type"] == "partial":
+                print(f"{at:6.2f}s  partial #{msg['segment']}: {msg['text']}")
+            elif msg["type"] == "segment":
+                print(f"{at:6.2f}s  segment #{msg['segment']} [{msg['start']:.2f}-{msg['end']:.2f}]: {msg['text']}")
+            elif msg["type"] == "vad":
+                print(f"{at:6.2f}s  {'speech' if msg['speech'] else 'silence'} at {msg['at']:.2f}s")
+            elif msg["type"] == "final":
+                waited = (time.perf_counter() - ended) * 1000 if ended else float("nan")
+                print(f"{at:6.2f}s  final: {msg['text']}")
+                print(f"final transcript {waited:.0f}ms after end of audio (server: {msg.get('finalize_ms')}ms)")
+                break
+            else:
+                print(f"{at:6.2f}s  {msg}")
+        await send_task
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("file")
+    ap.add_argument("--url", default="ws://localhost:8000/ws/transcribe")
+    ap.add_argument("--language", default="en")
+    ap.add_argument("--chunk-ms", type=int, default=100)
+    ap.add_argument("--speed", type=float, default=1.0, help="playback speed multiplier")
+    ap.add_argument("--no-partials", action="store_true")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# streaming.py
+import os
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+# ---------- Config ----------
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+STREAM_END_SILENCE_MS = int(os.getenv("STREAM_END_SILENCE_MS", "500"))      # silence that closes a segment
+STREAM_MIN_SPEECH_MS = int(os.getenv("STREAM_MIN_SPEECH_MS", "250"))        # shorter blips are dropped
+STREAM_MAX_SEGMENT_S = float(os.getenv("STREAM_MAX_SEGMENT_S", "15"))       # force a cut in long monologues
+STREAM_PREROLL_MS = int(os.getenv("STREAM_PREROLL_MS", "200"))              # audio kept before speech onset
+STREAM_VAD_MARGIN_DB = float(os.getenv("STREAM_VAD_MARGIN_DB", "12"))       # speech = this far above noise floor
+STREAM_VAD_MIN_DB = float(os.getenv("STREAM_VAD_MIN_DB", "-50"))            # ...and at least this loud
+# ----------------------------
+
+
+# ---------- VAD segmentation ----------
+class StreamingSegmenter:
+    """Energy VAD over 30 ms frames with an adaptive noise floor.
+
+    feed() takes float32 mono samples at SAMPLE_RATE and returns finished
+    segments as (audio, start_s, end_s); current() is the speech heard so far
+    in the open segment (for partial hypotheses).
+    """
+
+    def __init__(self):
+        self.frame = SAMPLE_RATE * FRAME_MS // 1000
+        self.end_frames = max(STREAM_END_SILENCE_MS // FRAME_MS, 1)
+        self.min_frames = max(STREAM_MIN_SPEECH_MS // FRAME_MS, 1)
+        self.max_frames = int(STREAM_MAX_SEGMENT_S * 1000 // FRAME_MS)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._preroll = deque(maxlen=max(STREAM_PREROLL_MS // FRAME_MS, 1))
+        self._segment: List[np.ndarray] = []
+        self._speech_frames = 0
+        self._silence_run = 0
+        self._frames_seen = 0
+        self._start_frame = 0
+        self.noise_db = -60.0
+        self.in_speech = False
+
+    def _is_speech(self, frame: np.ndarray) -> bool:
+        db = 10 * np.log10(float(np.mean(frame * frame)) + 1e-10)
+        speech = db > max(self.noise_db + STREAM_VAD_MARGIN_DB, STREAM_VAD_MIN_DB)
+        if not speech:
+            # Track the floor slowly upwards, quickly downwards
+            self.noise_db += (0.05 if db > self.noise_db else 0.5) * (db - self.noise_db)
+        return speech
+
+    def feed(self, samples: np.ndarray) -> List[Tuple[np.ndarray, float, float]]:
+        done = []
+        buf = np.concatenate([self._pending, samples.astype(np.float32, copy=False)])
+        n = len(buf) // self.frame
+        self._pending = buf[n * self.frame:]
+        for i in range(n):
+            frame = buf[i * self.frame:(i + 1) * self.frame]
+            speech = self._is_speech(frame)
+            self._frames_seen += 1
+            if not self.in_speech:
+                if speech:
+                    self.in_speech = True
+                    self._segment = list(self._preroll) + [frame]
+                    self._start_frame = self._frames_seen - len(self._segment)
+                    self._speech_frames, self._silence_run = 1, 0
+                    self._preroll.clear()
+                else:
+                    self._preroll.append(frame)
+                continue
+
+            self._segment.append(frame)
+            if speech:
+                self._speech_frames += 1
+                self._silence_run = 0
+            else:
+                self._silence_run += 1
+            if self._silence_run >= self.end_frames or len(self._segment) >= self.max_frames:
+                seg = self._close()
+                if seg:
+                    done.append(seg)
+        return done
+
+    def _close(self) -> Optional[Tuple[np.ndarray, float, float]]:
+        # Keep ~100 ms of the trailing silence, drop the rest
+        keep = len(self._segment) - max(self._silence_run - 100 // FRAME_MS, 0)
+        frames = self._segment[:keep]
+        speech_frames = self._speech_frames
+        start = self._start_frame
+        self.in_speech = False
+        self._segment, self._speech_frames, self._silence_run = [], 0, 0
+        if speech_frames < self.min_frames or not frames:
+            return None
+        start_s = start * FRAME_MS / 1000
+        return np.concatenate(frames), start_s, start_s + len(frames) * FRAME_MS / 1000
+
+    def current(self) -> Optional[np.ndarray]:
+        if not self.in_speech or self._speech_frames < self.min_frames:
+            return None
+        return np.concatenate(self._segment)
+
+    def flush(self) -> Optional[Tuple[np.ndarray, float, float]]:
+        return self._close() if self.in_speech else None
+
+
+# ---------- Chunk decoding ----------
+class PCMDecoder:
+    """Raw little-endian int16 mono chunks (e.g. from an AudioWorklet)."""
+
+    def __init__(self, on_samples: Callable[[np.ndarray], Awaitable[None]], sample_rate: int = SAMPLE_RATE):
+        self.on_samples = on_samples
+        self.sample_rate = sample_rate
+        self._carry = b""
+
+    async def write(self, chunk: bytes):
+        data = self._carry + chunk
+        cut = len(data) - len(data) % 2
+        self._carry = data[cut:]
+        samples = np.frombuffer(data[:cut], dtype=np.int16).astype(np.float32) / 32768.0
+        if self.sample_rate != SAMPLE_RATE and len(samples):
+            n = int(round(len(samples) * SAMPLE_RATE / self.sample_rate))
+            samples = np.interp(np.linspace(0, len(samples) - 1, n), np.arange(len(samples)), samples).astype(np.float32)
+        if len(samples):
+            await self.on_samples(samples)
+
+    async def close(self):
+        pass
+
+    def kill(self):
+        pass
+
+
+class FFmpegStreamDecoder:
+    """Container chunks (MediaRecorder webm/ogg, mp3...) piped through one long-lived
+    ffmpeg that emits 16 kHz mono s16le as soon as it can decode it."""
+
+    READ_BYTES = SAMPLE_RATE * 2 // 10   # ~100 ms
+
+    def __init__(self, on_samples: Callable[[np.ndarray], Awaitable[None]]):
+        self.on_samples = on_samples
+        self.proc = None
+        self._reader = None
+        self._pcm = None
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-loglevel", "error", "-i", "pipe:0",
+            "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._pcm = PCMDecoder(self.on_samples)
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            chunk = await self.proc.stdout.read(self.READ_BYTES)
+            if not chunk:
+                return
+            await self._pcm.write(chunk)
+
+    async def write(self, chunk: bytes):
+        if self.proc is None:
+            await self.start()
+        self.proc.stdin.write(chunk)
+        await self.proc.stdin.drain()
+
+    async def close(self):
+        # EOF lets ffmpeg flush its last frames before we stop reading
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        await self._reader
+        await self.proc.wait()
+
+    def kill(self):
+        if self.proc and self.proc.returncode is None:
+            self.proc.kill()
+        if self._reader:
+            self._reader.cancel()
+
+
+PCM_FORMATS = {"pcm16", "pcm_s16le", "s16le"}
+
+
+def make_decoder(fmt: str, on_samples, sample_rate: int = SAMPLE_RATE):
+    if fmt in PCM_FORMATS:
+        return PCMDecoder(on_samples, sample_rate)
+    return FFmpegStreamDecoder(on_samples)
+
+
+# ---------- Session ----------
+class StreamSession:
+    """One WebSocket stream: segments audio as it arrives, transcribes closed
+    segments in order on a worker thread, and refreshes a partial hypothesis for
+    the open segment at most every partial_interval seconds.
+
+    transcribe(audio, final, prompt) -> str is blocking and runs off the loop.
+    send(dict) pushes a message to the client.
+    """
+
+    def __init__(self, transcribe: Callable[[np.ndarray, bool, str], str],
+                 send: Callable[[dict], Awaitable[None]], partial_interval: float = 0.7, partials: bool = True):
+        self.transcribe = transcribe
+        self.send = send
+        self.partial_interval = partial_interval
+        self.partials = partials
+        self.segmenter = StreamingSegmenter()
+        self.segments: List[dict] = []
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._finalize_loop())
+        self._partial_task: Optional[asyncio.Task] = None
+        self._partial_at = 0.0            # stream seconds at the last partial
+        self._received = 0                # samples
+        self._closed = 0                  # segments closed by the VAD so far
+        self._in_speech = False
+
+    @property
+    def position(self) -> float:
+        return self._received / SAMPLE_RATE
+
+    def _prompt(self) -> str:
+        # Tail of the confirmed transcript keeps wording consistent across segments
+        return " ".join(s["text"] for s in self.segments)[-200:]
+
+    async def feed(self, samples: np.ndarray):
+        self._received += len(samples)
+        for seg in self.segmenter.feed(samples):
+            await self._close(seg)
+        if self.segmenter.in_speech != self._in_speech:
+            self._in_speech = self.segmenter.in_speech
+            await self.send({"type": "vad", "speech": self._in_speech, "at": round(self.position, 2)})
+        self._maybe_partial()
+
+    async def _close(self, seg):
+        await self._queue.put((self._closed, *seg))
+        self._closed += 1
+
+    def _maybe_partial(self):
+        if not self.partials or not self.segmenter.in_speech:
+            return
+        if self._partial_task and not self._partial_task.done():
+            return   # never queue partials behind each other; the next feed retries
+        if self.position - self._partial_at < self.partial_interval:
+            return
+        audio = self.segmenter.current()
+        if audio is None:
+            return
+        self._partial_at = self.position
+        self._partial_task = asyncio.create_task(self._partial(audio, self._closed))
+
+    async def _partial(self, audio: np.ndarray, index: int):
+        text = await asyncio.to_thread(self.transcribe, audio, False, self._prompt())
+        # Drop it if the segment was closed meanwhile; its final is on the way
+        if text and self.segmenter.in_speech and index == self._closed:
+            await self.send({"type": "partial", "segment": index, "text": text})
+
+    async def _finalize_loop(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                if item is None:
+                    return
+                index, audio, start, end = item
+                try:
+                    text = await asyncio.to_thread(self.transcribe, audio, True, self._prompt())
+                except Exception as e:
+                    # Lose this segment, not the rest of the stream
+                    await self.send({"type": "error", "segment": index, "detail": f"Transcription error: {e}"})
+                    continue
+                if text:
+                    seg = {"segment": index, "start": round(start, 2), "end": round(end, 2), "text": text}
+                    self.segments.append(seg)
+                    await self.send({"type": "segment", **seg})
+            finally:
+                self._queue.task_done()
+
+    async def finish(self) -> dict:
+        """Flush the open segment and wait until every segment is transcribed."""
+        tail = self.segmenter.flush()
+        if tail:
+            await self._close(tail)
+        await self._queue.put(None)
+        await self._worker
+        if self._partial_task:
+            self._partial_task.cancel()
+        return {
+            "type": "final",
+            "text": " ".join(s["text"] for s in self.segments).strip(),
+            "segments": self.segments,
+            "duration": round(self.position, 2),
+        }
+
+    def cancel(self):
+        self._worker.cancel()
+        if self._partial_task:
+            self._partial_task.cancel()
@@ -0,0 +1,205 @@
+# warmup.py
+import os
+import re
+import json
+import time
+import hashlib
+import platform
+from typing import Dict, List, Optional
+
+import numpy as np
+from faster_whisper import WhisperModel
+
+from audio_io import decode_bytes
+
+SAMPLE_RATE = 16000
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ---------- Config ----------
+STT_WARMUP = os.getenv("STT_WARMUP", "true").lower() in {"1", "true", "yes"}
+STT_WARMUP_CLIP = os.getenv("STT_WARMUP_CLIP", os.path.join(HERE, "warmup", "alice.wav"))
+STT_WARMUP_REFERENCE = os.getenv("STT_WARMUP_REFERENCE", "")     # default: <clip>.txt, else the float32 transcript
+STT_AUTOTUNE = os.getenv("STT_AUTOTUNE", "false").lower() in {"1", "true", "yes"}
+STT_AUTOTUNE_COMPUTE_TYPES = os.getenv("STT_AUTOTUNE_COMPUTE_TYPES", "int8,int8_float32,float32")
+STT_AUTOTUNE_THREADS = os.getenv("STT_AUTOTUNE_THREADS", "")     # e.g. "1,2,4"; default: powers of two up to the budget
+STT_AUTOTUNE_MAX_WER = float(os.getenv("STT_AUTOTUNE_MAX_WER", "0.1"))
+STT_AUTOTUNE_RUNS = int(os.getenv("STT_AUTOTUNE_RUNS", "2"))
+STT_AUTOTUNE_CACHE = os.getenv("STT_AUTOTUNE_CACHE", "/models/stt-autotune.json")
+# ----------------------------
+
+
+# ---------- WER ----------
+def _words(text: str) -> List[str]:
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split()
+
+
+def edit_distance(ref: List[str], hyp: List[str]) -> int:
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1]
+
+
+def wer(reference: str, hypothesis: str) -> float:
+    ref = _words(reference)
+    if not ref:
+        return 0.0 if not _words(hypothesis) else 1.0
+    return edit_distance(ref, _words(hypothesis)) / len(ref)
+
+
+# ---------- Clip ----------
+def load_clip(path: str = STT_WARMUP_CLIP) -> np.ndarray:
+    with open(path, "rb") as f:
+        return decode_bytes(f.read(), SAMPLE_RATE)
+
+
+def clip_reference(path: str = STT_WARMUP_CLIP) -> Optional[str]:
+    if STT_WARMUP_REFERENCE:
+        return STT_WARMUP_REFERENCE
+    txt = os.path.splitext(path)[0] + ".txt"
+    if os.path.exists(txt):
+        with open(txt) as f:
+            return f.read().strip()
+    return None
+
+
+def cpu_profile() -> Dict[str, object]:
+    """What the tuning result depends on: CPU model, SIMD support and usable cores."""
+    model, flags = platform.processor(), set()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key.strip() == "model name":
+                    model = value.strip()
+                elif key.strip() == "flags":
+                    flags = set(value.split())
+    except OSError:
+        pass
+    simd = sorted(f for f in flags if f in {"avx2", "avx512f", "avx512_vnni", "avx512_bf16", "amx_int8", "fma"})
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    return {"cpu": model, "simd": simd, "cores": cores, "machine": platform.machine()}
+
+
+# ---------- Measuring ----------
+def transcribe_text(model: WhisperModel, audio: np.ndarray, beam_size: int = 5) -> str:
+    segments, _info = model.transcribe(audio, language="en", beam_size=beam_size, vad_filter=False,
+                                       condition_on_previous_text=False)
+    return "".join(s.text for s in segments).strip()
+
+
+def measure(model_name: str, compute_type: str, cpu_threads: int, clips: List[np.ndarray],
+            runs: int = STT_AUTOTUNE_RUNS) -> Dict[str, object]:
+    """Load one model, warm it, then time `runs` passes over the clips.
+    rtf = decode seconds / audio seconds (lower is faster)."""
+    t0 = time.perf_counter()
+    model = WhisperModel(model_name, compute_type=compute_type, cpu_threads=cpu_threads)
+    load_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    texts = [transcribe_text(model, clip) for clip in clips]
+    warm_s = time.perf_counter() - t0
+    timings = []
+    for _ in range(max(runs, 1)):
+        t0 = time.perf_counter()
+        texts = [transcribe_text(model, clip) for clip in clips]
+        timings.append(time.perf_counter() - t0)
+    audio_s = sum(len(c) for c in clips) / SAMPLE_RATE
+    return {
+        "compute_type": compute_type,
+        "cpu_threads": cpu_threads,
+        "load_s": round(load_s, 3),
+        "first_pass_s": round(warm_s, 3),
+        "rtf": round(float(np.median(timings)) / audio_s, 4),
+        "texts": texts,
+    }
+
+
+def _thread_candidates(budget: int) -> List[int]:
+    if STT_AUTOTUNE_THREADS:
+        return sorted({int(t) for t in STT_AUTOTUNE_THREADS.split(",") if t.strip()})
+    out, t = [], 1
+    while t < budget:
+        out.append(t)
+        t *= 2
+    return out + [budget]
+
+
+# ---------- Auto-selection ----------
+def autotune(model_name: str, clip: np.ndarray, thread_budget: int, reference: Optional[str] = None,
+             compute_types: str = STT_AUTOTUNE_COMPUTE_TYPES, max_wer: float = STT_AUTOTUNE_MAX_WER,
+             cache_path: Optional[str] = STT_AUTOTUNE_CACHE) -> Dict[str, object]:
+    """Fastest compute type, then fastest thread count (fewest threads on a near tie),
+    among the settings whose WER on the clip stays within max_wer.
+
+    Without a reference transcript, float32's own transcript is the reference, so
+    the floor bounds how far quantization may drift from the unquantized model.
+    """
+    profile = cpu_profile()
+    key = hashlib.sha256(json.dumps([model_name, compute_types, thread_budget, max_wer, reference,
+                                     profile, hashlib.sha256(clip.tobytes()).hexdigest()]).encode()).hexdigest()
+    cached = _read_cache(cache_path).get(key)
+    if cached:
+        print(f"STT autotune: cached choice {cached['compute_type']} x {cached['cpu_threads']} threads")
+        return cached
+
+    types = [t.strip() for t in compute_types.split(",") if t.strip()]
+    if reference is None and "float32" not in types:
+        types.append("float32")
+    trials = []
+    for ct in types:
+        try:
+            trials.append(measure(model_name, ct, thread_budget, [clip]))
+        except ValueError as e:   # compute type not supported on this CPU
+            print(f"STT autotune: skipping {ct}: {e}")
+    if not trials:
+        raise RuntimeError("no usable compute type")
+
+    ref = reference if reference is not None else next(t for t in trials if t["compute_type"] == "float32")["texts"][0]
+    for t in trials:
+        t["wer"] = round(wer(ref, t["texts"][0]), 4)
+    ok = [t for t in trials if t["wer"] <= max_wer] or [min(trials, key=lambda t: t["wer"])]
+    best = min(ok, key=lambda t: t["rtf"])
+
+    thread_trials = [best] + [measure(model_name, best["compute_type"], n, [clip])
+                              for n in _thread_candidates(thread_budget) if n != thread_budget]
+    fastest = min(t["rtf"] for t in thread_trials)
+    chosen = min((t for t in thread_trials if t["rtf"] <= fastest * 1.05), key=lambda t: t["cpu_threads"])
+
+    result = {
+        "compute_type": chosen["compute_type"],
+        "cpu_threads": chosen["cpu_threads"],
+        "rtf": chosen["rtf"],
+        "wer": best["wer"],
+        "reference": "given" if reference is not None else "float32",
+        "profile": profile,
+        "trials": [{k: v for k, v in t.items() if k != "texts"} for t in trials + thread_trials[1:]],
+    }
+    print(f"STT autotune: {result['compute_type']} x {result['cpu_threads']} threads "
+          f"(rtf={result['rtf']}, wer={result['wer']})")
+    _write_cache(cache_path, key, result)
+    return result
+
+
+def _read_cache(path: Optional[str]) -> Dict[str, dict]:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(path: Optional[str], key: str, result: dict):
+    if not path:
+        return
+    try:
+        data = _read_cache(path)
+        data[key] = result
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+    except OSError as e:
+        print("STT autotune: could not cache the result: ", e)
@@ -0,0 +1,118 @@
+# audio_encode.py
+"""In-memory audio encoding for synthesized speech: no ffmpeg processes, no temp files.
+
+    data = encode_pcm(pcm16, 22050, "opus")           # a whole reply
+
+    enc = Encoder("mp3", 22050)                        # a stream: each call returns what is ready
+    for pcm16 in chunks:
+        send(enc.encode(pcm16))
+    send(enc.close())
+
+Input is 16-bit mono PCM at the model's rate. MP3 (libmp3lame) and Opus
+(libopus in Ogg) run in-process through PyAV, whose wheels bundle the FFmpeg
+libraries; WAV is a header in front of the PCM.
+"""
+import os
+import struct
+from typing import List
+
+import av
+import numpy as np
+
+# ---------- Config ----------
+TTS_MP3_BITRATE = int(os.getenv("TTS_MP3_BITRATE", "48000"))     # CBR, so players know the length without a Xing header
+TTS_OPUS_BITRATE = int(os.getenv("TTS_OPUS_BITRATE", "24000"))
+TTS_OPUS_PAGE_MS = int(os.getenv("TTS_OPUS_PAGE_MS", "200"))      # Ogg page length: container overhead vs stream latency
+# ----------------------------
+
+MEDIA_TYPES = {"mp3": "audio/mpeg", "opus": "audio/ogg", "wav": "audio/wav"}
+OPUS_RATE = 24000   # libopus takes 8/12/16/24/48 kHz; the models' 22.05 kHz is resampled to this
+
+
+def encoding_id(fmt: str) -> str:
+    """The format plus the settings that change its bytes (part of the cache key)."""
+    return {"mp3": f"mp3@{TTS_MP3_BITRATE}", "opus": f"opus@{TTS_OPUS_BITRATE}"}.get(fmt, fmt)
+
+
+def wav_header(rate: int, data_bytes: int = 0xFFFFFFFF - 36) -> bytes:
+    # The default sizes mean "until the stream ends", which players accept
+    return struct.pack("<4sI4s4sIHHIIHH4sI", b"RIFF", data_bytes + 36, b"WAVE", b"fmt ", 16, 1, 1,
+                       rate, rate * 2, 2, 16, b"data", data_bytes)
+
+
+class _Sink:
+    """Where the Ogg muxer writes; take() hands over what it wrote since the last call."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        out = b"".join(self.parts)
+        self.parts.clear()
+        return out
+
+
+class Encoder:
+    """Incremental encoder for one output. Not thread-safe; one per reply."""
+
+    def __init__(self, fmt: str, rate: int):
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(f"unsupported audio format: {fmt}")
+        self.fmt = fmt
+        self.rate = rate
+        self._started = False
+        if fmt == "mp3":
+            # Raw MP3 frames need no container: concatenated, they are the file
+            self._codec = av.CodecContext.create("libmp3lame", "w")
+            self._codec.sample_rate = rate
+            self._codec.layout = "mono"
+            self._codec.format = "s16p"
+            self._codec.bit_rate = TTS_MP3_BITRATE
+        elif fmt == "opus":
+            self._sink = _Sink()
+            self._ogg = av.open(self._sink, "w", format="ogg",
+                                options={"page_duration": str(TTS_OPUS_PAGE_MS * 1000)})
+            self._stream = self._ogg.add_stream("libopus", rate=OPUS_RATE, layout="mono")
+            self._stream.bit_rate = TTS_OPUS_BITRATE
+
+    def _frame(self, pcm: bytes, sample_format: str) -> av.AudioFrame:
+        frame = av.AudioFrame.from_ndarray(np.frombuffer(pcm, dtype="<i2").reshape(1, -1),
+                                           format=sample_format, layout="mono")
+        frame.sample_rate = self.rate
+        return frame
+
+    def encode(self, pcm: bytes) -> bytes:
+        """Feed 16-bit PCM; returns the encoded bytes that are ready (possibly none)."""
+        first, self._started = not self._started, True
+        if self.fmt == "wav":
+            return wav_header(self.rate) + pcm if first else pcm
+        if not pcm:
+            return b""
+        if self.fmt == "mp3":
+            return b"".join(bytes(p) for p in self._codec.encode(self._frame(pcm, "s16p")))
+        for packet in self._stream.encode(self._frame(pcm, "s16")):
+            self._ogg.mux(packet)
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        """Flush the encoder; returns the last bytes of the output."""
+        if self.fmt == "wav":
+            return b"" if self._started else wav_header(self.rate)
+        if self.fmt == "mp3":
+            return b"".join(bytes(p) for p in self._codec.encode(None))
+        for packet in self._stream.encode(None):
+            self._ogg.mux(packet)
+        self._ogg.close()
+        return self._sink.take()
+
+
+def encode_pcm(pcm: bytes, rate: int, fmt: str) -> bytes:
+    """A whole reply, encoded in one go."""
+    if fmt == "wav":
+        return wav_header(rate, len(pcm)) + pcm
+    encoder = Encoder(fmt, rate)
+    return encoder.encode(pcm) + encoder.close()
@@ -0,0 +1,91 @@
+"""Encoding cost per reply: the old ffmpeg subprocess path vs in-process encoding.
+
+`ffmpeg` is what /tts used to do for every MP3 reply: write a temp WAV, spawn
+ffmpeg (-q:a 4), write a temp MP3 and read it back. The other rows encode the
+same PCM in memory with audio_encode (PyAV). Rows are skipped for an encoder
+that is not available.
+
+    PYTHONPATH=../common python bench_encode.py
+    PYTHONPATH=../common python bench_encode.py --audio reply.wav --repeat 50 --json encode.json
+"""
+import os
+import json
+import time
+import wave
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from audio_encode import encode_pcm
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def ffmpeg_subprocess(pcm: bytes, rate: int) -> bytes:
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as wav_f:
+        wav_path = wav_f.name
+    mp3_path = wav_path.replace(".wav", ".mp3")
+    try:
+        with wave.open(wav_path, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(rate)
+            w.writeframes(pcm)
+        subprocess.run(["ffmpeg", "-y", "-i", wav_path, "-codec:a", "libmp3lame", "-q:a", "4", mp3_path],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        with open(mp3_path, "rb") as f:
+            return f.read()
+    finally:
+        for path in (wav_path, mp3_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def read_pcm(path: str):
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise SystemExit("only 16-bit WAV is supported")
+        rate, channels = w.getframerate(), w.getnchannels()
+        pcm = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+    if channels > 1:
+        pcm = pcm[::channels]
+    return pcm.tobytes(), rate
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--audio", default=os.path.join(HERE, "..", "chat-stack", "alice.wav"), help="16-bit WAV")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--json", help="write the rows to this file")
+    args = ap.parse_args()
+
+    pcm, rate = read_pcm(args.audio)
+    seconds = len(pcm) / 2 / rate
+    print(f"{seconds:.1f}s of {rate} Hz speech, {args.repeat} runs per row")
+    print(f"{'encoder':18} {'p50 ms':>8} {'p99 ms':>8} {'bytes':>9} {'kbit/s':>7}")
+
+    modes = [("ffmpeg subprocess", lambda: ffmpeg_subprocess(pcm, rate))] if shutil.which("ffmpeg") else []
+    modes += [(f"in-process {fmt}", lambda fmt=fmt: encode_pcm(pcm, rate, fmt)) for fmt in ("mp3", "opus", "wav")]
+    rows = []
+    for name, run in modes:
+        run()   # warm
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            data = run()
+            times.append(time.perf_counter() - t0)
+        row = {"encoder": name, "p50_ms": round(float(np.percentile(times, 50)) * 1000, 2),
+               "p99_ms": round(float(np.percentile(times, 99)) * 1000, 2), "bytes": len(data),
+               "kbps": round(len(data) * 8 / seconds / 1000, 1)}
+        rows.append(row)
+        print(f"{name:18} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['bytes']:>9} {row['kbps']:>7.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"seconds": seconds, "rate": rate, "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
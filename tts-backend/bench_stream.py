@@ -0,0 +1,78 @@
+"""Time-to-first-audio: /tts (whole reply) vs /tts/stream (sentence chunks).
+
+/tts can only answer once the whole reply is synthesized and encoded, so its
+first audio arrives with its last. /tts/stream answers after the first chunk;
+the rest is synthesized while that plays. Runs the server's code in-process
+with the synthesis cache off, so every row really synthesizes.
+
+    PYTHONPATH=../common python bench_stream.py
+    PYTHONPATH=../common python bench_stream.py --texts replies.txt --formats mp3 wav --repeat 5 --json stream.json
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+os.environ["TTS_CACHE"] = "false"
+import server  # noqa: E402
+
+REPLIES = [
+    "Your balance is $2,450.17.",
+    "Sure. I can help with that. Your checking account ending in 48213 has a balance of $12345.67, "
+    "and your last payment of 89.99 went through yesterday.",
+    "I have checked your recent transactions. There were 3 card payments this week: 42.50 at the grocery store, "
+    "18.20 at the pharmacy, and 120.00 at the airport. Everything looks normal. "
+    "If you don't recognize any of these, I can freeze your card or connect you to an agent at +1 (555) 123-4567. "
+    "Is there anything else I can help you with?",
+]
+
+
+def whole(norm_text: str, fmt: str):
+    t0 = time.perf_counter()
+    data = server.synthesize(norm_text, fmt)
+    total = time.perf_counter() - t0
+    return total, total, len(data)
+
+
+def streamed(norm_text: str, fmt: str):
+    t0 = time.perf_counter()
+    audio = server.stream_speech(server.chunk_text(norm_text), fmt)
+    size = len(next(audio))
+    first = time.perf_counter() - t0
+    size += sum(len(b) for b in audio)
+    return first, time.perf_counter() - t0, size
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--texts", help="one reply per line (default: built-in banking replies)")
+    ap.add_argument("--formats", nargs="*", default=["mp3"])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", help="write the rows to this file")
+    args = ap.parse_args()
+
+    texts = server.read_phrases(args.texts) if args.texts else REPLIES
+    server.synthesize_pcm("Warming up.")
+    print(f"{'chars':>5} {'chunks':>6} {'fmt':4} {'endpoint':11} {'first ms':>9} {'total ms':>9} {'bytes':>8}")
+    rows = []
+    for text in texts:
+        norm_text = server.normalize_text(text)
+        chunks = len(server.chunk_text(norm_text))
+        for fmt in args.formats:
+            for endpoint, run in (("/tts", whole), ("/tts/stream", streamed)):
+                runs = [run(norm_text, fmt) for _ in range(args.repeat)]
+                row = {"chars": len(text), "chunks": chunks, "format": fmt, "endpoint": endpoint,
+                       "first_audio_ms": round(statistics.median(r[0] for r in runs) * 1000, 1),
+                       "total_ms": round(statistics.median(r[1] for r in runs) * 1000, 1),
+                       "bytes": runs[-1][2]}
+                rows.append(row)
+                print(f"{row['chars']:>5} {chunks:>6} {fmt:4} {endpoint:11} {row['first_audio_ms']:>9.1f} "
+                      f"{row['total_ms']:>9.1f} {row['bytes']:>8}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
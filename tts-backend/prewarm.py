@@ -0,0 +1,33 @@
+"""Synthesize common phrases into the TTS cache before traffic arrives.
+
+Writes through both cache tiers; point TTS_CACHE_DIR at the directory the server
+uses (a shared volume) so it starts with these replies already on disk. The
+server can also do this itself at startup via TTS_PREWARM_FILE.
+
+    PYTHONPATH=../common TTS_CACHE_DIR=/cache/tts python prewarm.py prewarm_phrases.txt --formats mp3 wav
+"""
+import time
+import argparse
+
+import server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("phrases", nargs="?", default="prewarm_phrases.txt", help="one phrase per line, # comments")
+    ap.add_argument("--formats", nargs="*", default=[server.AUDIO_FORMAT_DEFAULT])
+    ap.add_argument("--speaker")
+    ap.add_argument("--language")
+    args = ap.parse_args()
+
+    if server.cache is None:
+        raise SystemExit("TTS_CACHE is disabled")
+    phrases = server.read_phrases(args.phrases)
+    t0 = time.perf_counter()
+    done = server.prewarm(phrases, args.formats, args.speaker, args.language)
+    print(f"{len(phrases)} phrases x {len(args.formats)} formats in {time.perf_counter() - t0:.1f}s: {done}")
+    print(server.cache.stats())
+
+
+if __name__ == "__main__":
+    main()
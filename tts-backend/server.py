@@ -1,20 +1,29 @@
 import os
 import re
-import tempfile
-import subprocess
-from typing import Optional
+import time
+import queue
+import contextvars
+import threading
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from fastapi.responses import FileResponse
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import Histogram
+
+from instrumentation import instrument, timed, log
+from tts_cache import TTS_CACHE, SynthesisCache, cache_key
+from audio_encode import MEDIA_TYPES, Encoder, encode_pcm, encoding_id, wav_header
 
 # ---------- Config ----------
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:3000")
 origins = [o.strip() for o in CORS_ORIGINS.split(",") if o.strip()]
 
 MODEL_NAME = os.getenv("MODEL_NAME", "tts_models/en/ljspeech/tacotron2-DDC_ph")
-AUDIO_FORMAT_DEFAULT = os.getenv("AUDIO_FORMAT", "mp3")  # "mp3" | "wav"
+AUDIO_FORMAT_DEFAULT = os.getenv("AUDIO_FORMAT", "mp3")  # "mp3" | "opus" | "wav"
 DEVICE = os.getenv("DEVICE", "cpu")
 
 # Number-normalization knobs
@@ -22,6 +31,19 @@ ALWAYS_SAY_DIGITS = os.getenv("ALWAYS_SAY_DIGITS", "false").lower() in {"1", "tr
 DIGITS_AS_SEQUENCE_MINLEN = int(os.getenv("DIGITS_AS_SEQUENCE_MINLEN", "5"))
 DECIMAL_WORD = os.getenv("DECIMAL_WORD", "point")
 
+# Phrases synthesized into the cache at startup (one per line; "" = none)
+TTS_PREWARM_FILE = os.getenv("TTS_PREWARM_FILE", "")
+TTS_PREWARM_FORMATS = os.getenv("TTS_PREWARM_FORMATS", AUDIO_FORMAT_DEFAULT)
+
+# /tts/stream: replies are synthesized and sent chunk by chunk
+TTS_STREAM_FIRST_CHARS = int(os.getenv("TTS_STREAM_FIRST_CHARS", "80"))   # first chunk sets time-to-first-audio
+TTS_STREAM_MAX_CHARS = int(os.getenv("TTS_STREAM_MAX_CHARS", "200"))      # longer sentences are cut at clauses
+TTS_STREAM_MIN_CHARS = int(os.getenv("TTS_STREAM_MIN_CHARS", "12"))       # shorter pieces join the next one
+TTS_STREAM_PAUSE_MS = int(os.getenv("TTS_STREAM_PAUSE_MS", "250"))        # silence between sentences
+
+FIRST_AUDIO = Histogram("tts_first_audio_seconds", "Request start until the first audio bytes are ready",
+                        ["endpoint"], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 12, 20, 30, 60))
+
 # ---------- App ----------
 app = FastAPI()
 app.add_middleware(
@@ -31,13 +53,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument(app, "tts")
 
 # ---------- TTS engine (Coqui) ----------
 _tts = None
 _model_meta = {"speakers": None, "languages": None}
+_tts_lock = threading.Lock()   # requests and the prewarm thread may race to load the model
 
 
 def _load_tts():
+    with _tts_lock:
+        _load_tts_locked()
+
+
+def _load_tts_locked():
     global _tts, _model_meta
     if _tts is not None:
         return
@@ -152,6 +181,218 @@ def normalize_text(text: str) -> str:
     return out
 
 
+# ---------- Sentence chunking (streaming) ----------
+# Works on normalize_text() output, where numbers read digit by digit as
+# "4, 5, 6," or "3 point 1, 4,": a comma touching a digit is never a clause break,
+# and a period only ends a sentence when whitespace follows it ("v1.2" keeps its dot).
+SENTENCE_END_RE = re.compile(r"[.!?]+[\"'”’)\]]*\s+|\n\s*")
+CLAUSE_END_RE = re.compile(
+    rf"(?<!\d)[,;:](?=\s)(?!\s*(?:\d|{re.escape(DECIMAL_WORD)}\b|minus\b|plus\b))\s+|\s+[–—]\s+"
+)
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "jr", "sr", "vs", "etc", "approx", "acct",
+                 "e.g", "i.e", "a.m", "p.m", "inc", "ltd"}
+
+
+def split_sentences(norm_text: str) -> List[str]:
+    sentences, start = [], 0
+    for m in SENTENCE_END_RE.finditer(norm_text):
+        head = norm_text[start:m.start()].strip()
+        if not head:
+            continue
+        if m.group().rstrip().rstrip("\"'”’)]") == ".":
+            word = head.rsplit(None, 1)[-1].lstrip("(\"'“‘").lower()
+            # "Dr. Smith", "J. Smith", "e.g. this", and list markers like "2. Open the app"
+            if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()) or head.isdigit():
+                continue
+        sentences.append(norm_text[start:m.end()].strip())
+        start = m.end()
+    tail = norm_text[start:].strip()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def split_clauses(sentence: str, limit: int) -> List[str]:
+    """Cut a sentence at clause punctuation into pieces of about `limit` chars or less."""
+    pieces, start, cut = [], 0, 0
+    for m in CLAUSE_END_RE.finditer(sentence):
+        if m.end() - start > limit and cut > start:
+            pieces.append(sentence[start:cut].strip())
+            start = cut
+        cut = m.end()
+    if len(sentence) - start > limit and cut > start:
+        pieces.append(sentence[start:cut].strip())
+        start = cut
+    pieces.append(sentence[start:].strip())
+    return [p for p in pieces if p]
+
+
+def chunk_text(norm_text: str, first_chars: int = TTS_STREAM_FIRST_CHARS, max_chars: int = TTS_STREAM_MAX_CHARS,
+               min_chars: int = TTS_STREAM_MIN_CHARS) -> List[Tuple[str, bool]]:
+    """Synthesis units for streaming, in order: (text, ends_sentence).
+
+    One sentence per chunk; sentences longer than max_chars (first_chars for the
+    first chunk, so audio starts sooner) are cut at clause breaks, and pieces
+    shorter than min_chars are joined to the next one.
+    """
+    chunks: List[Tuple[str, bool]] = []
+    carry = ""   # a piece too short to synthesize alone, waiting for the next one
+    for sentence in split_sentences(norm_text):
+        limit = max_chars if chunks else first_chars
+        if len(carry) + len(sentence) > limit:
+            pieces = split_clauses(sentence, max(limit - len(carry), min_chars))
+            if limit < max_chars and len(pieces) > 1:
+                # Only the first chunk needs to be short
+                pieces = pieces[:1] + split_clauses(sentence[len(pieces[0]):].strip(), max_chars)
+        else:
+            pieces = [sentence]
+        for i, piece in enumerate(pieces):
+            text = f"{carry} {piece}" if carry else piece
+            carry = ""
+            if len(text) < min_chars:
+                carry = text
+            else:
+                chunks.append((text, i == len(pieces) - 1))
+    if carry:
+        if chunks:
+            chunks[-1] = (f"{chunks[-1][0]} {carry}", True)
+        else:
+            chunks.append((carry, True))
+    return chunks
+
+
+# ---------- Synthesis ----------
+# Repeated replies (apologies, greetings, declines) are served from here
+cache = SynthesisCache() if TTS_CACHE else None
+
+
+def synthesize_pcm(text: str, speaker: Optional[str] = None, language: Optional[str] = None) -> bytes:
+    """Already-normalized text as 16-bit mono PCM at the model's output rate."""
+    _load_tts()
+    synth_kwargs = {"text": text}
+    if speaker:
+        synth_kwargs["speaker"] = speaker
+    if language:
+        synth_kwargs["language"] = language
+    with timed("inference", "synthesize"):
+        wav = np.asarray(_tts.tts(**synth_kwargs), dtype=np.float32)
+    # Peak-normalized like Coqui's save_wav (what tts_to_file wrote)
+    wav *= 32767 / max(0.01, float(np.max(np.abs(wav))) if len(wav) else 0.0)
+    return wav.astype("<i2").tobytes()
+
+
+def synthesize(norm_text: str, fmt: str, speaker: Optional[str] = None, language: Optional[str] = None) -> bytes:
+    """Coqui on already-normalized text, encoded in memory; returns the audio file's bytes."""
+    pcm = synthesize_pcm(norm_text, speaker, language)
+    with timed("audio_encode", fmt):
+        return encode_pcm(pcm, _tts.synthesizer.output_sample_rate, fmt)
+
+
+def synthesize_cached(norm_text: str, fmt: str, speaker: Optional[str] = None,
+                      language: Optional[str] = None) -> Tuple[bytes, str]:
+    """(audio, source): source is memory | disk | miss | coalesced, or off without a cache."""
+    def produce() -> bytes:
+        return synthesize(norm_text, fmt, speaker, language)
+
+    if cache is None:
+        return produce(), "off"
+    return cache.get_or_create(cache_key(norm_text, MODEL_NAME, speaker, language, encoding_id(fmt)), produce)
+
+
+def synthesize_pcm_cached(text: str, speaker: Optional[str] = None, language: Optional[str] = None) -> bytes:
+    if cache is None:
+        return synthesize_pcm(text, speaker, language)
+    key = cache_key(text, MODEL_NAME, speaker, language, "pcm16")
+    return cache.get_or_create(key, lambda: synthesize_pcm(text, speaker, language))[0]
+
+
+def stream_speech(chunks: List[Tuple[str, bool]], fmt: str, speaker: Optional[str] = None,
+                  language: Optional[str] = None, store_key: Optional[str] = None) -> Iterator[bytes]:
+    """Encoded audio for the chunks, yielded as it is produced.
+
+    A producer thread synthesizes and encodes chunk after chunk while the earlier
+    ones are sent, so nothing waits for the whole reply. The first yield comes once
+    the first chunk is ready (or raises if that failed). A stream that completes
+    is stored in the cache under store_key.
+    """
+    _load_tts()
+    rate = _tts.synthesizer.output_sample_rate
+    pause = b"\0\0" * (rate * TTS_STREAM_PAUSE_MS // 1000)
+    out_q: "queue.Queue[Optional[bytes]]" = queue.Queue()
+    stop = threading.Event()
+    failed: List[BaseException] = []
+
+    def produce():
+        encoder = Encoder(fmt, rate)
+        try:
+            for i, (text, ends_sentence) in enumerate(chunks):
+                if stop.is_set():
+                    return
+                pcm = synthesize_pcm_cached(text, speaker, language)
+                if ends_sentence and i < len(chunks) - 1:
+                    pcm += pause
+                with timed("audio_encode", fmt):
+                    data = encoder.encode(pcm)
+                if data:
+                    out_q.put(data)
+            tail = encoder.close()
+            if tail:
+                out_q.put(tail)
+        except Exception as e:
+            failed.append(e)
+            log("TTS stream failed:", e)
+        finally:
+            out_q.put(None)
+
+    # copy_context: the producer's log lines keep the request's trace id
+    threading.Thread(target=contextvars.copy_context().run, args=(produce,), name="tts-stream", daemon=True).start()
+    parts: List[bytes] = []
+    try:
+        while (data := out_q.get()) is not None:
+            parts.append(data)
+            yield data
+        if failed:
+            raise failed[0]   # after the first yield the client just sees a truncated response
+        if cache is not None and store_key:
+            data = b"".join(parts)
+            if fmt == "wav":
+                data = wav_header(rate, len(data) - 44) + data[44:]
+            cache.put(store_key, data)
+    finally:
+        stop.set()
+
+
+def read_phrases(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def prewarm(phrases: Iterable[str], formats: Iterable[str] = (AUDIO_FORMAT_DEFAULT,),
+            speaker: Optional[str] = None, language: Optional[str] = None) -> dict:
+    """Synthesize phrases into the cache ahead of traffic; returns outcome counts."""
+    done = {"memory": 0, "disk": 0, "miss": 0, "coalesced": 0, "off": 0, "failed": 0}
+    for text in phrases:
+        for fmt in formats:
+            try:
+                _data, source = synthesize_cached(normalize_text(text), fmt, speaker, language)
+                done[source] += 1
+            except Exception as e:
+                done["failed"] += 1
+                print(f"TTS prewarm failed for {text!r} ({fmt}): {e}")
+    return done
+
+
+@app.on_event("startup")
+def start_prewarm():
+    if TTS_PREWARM_FILE and cache is not None:
+        formats = [f.strip() for f in TTS_PREWARM_FORMATS.split(",") if f.strip()]
+
+        def run():
+            print("TTS prewarm:", prewarm(read_phrases(TTS_PREWARM_FILE), formats))
+
+        threading.Thread(target=run, name="tts-prewarm", daemon=True).start()
+
+
 # ---------- I/O schemas ----------
 class TTSIn(BaseModel):
     text: str
@@ -160,51 +401,95 @@ class TTSIn(BaseModel):
     language: Optional[str] = None
 
 # ---------- Routes ----------
-@app.post("/tts")
-def tts(body: TTSIn):
-    _load_tts()
-
-    text = (body.text or "").strip()
+def _prepare(text: Optional[str], audio_format: Optional[str]) -> Tuple[str, str]:
+    """(normalized text, format) of a request, or 400."""
+    text = (text or "").strip()
     if not text:
         raise HTTPException(400, "text is required")
 
-    fmt = (body.audio_format or AUDIO_FORMAT_DEFAULT).lower()
-    if fmt not in {"mp3", "wav"}:
-        raise HTTPException(400, "audio_format must be mp3 or wav")
+    fmt = (audio_format or AUDIO_FORMAT_DEFAULT).lower()
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(400, f"audio_format must be one of {', '.join(MEDIA_TYPES)}")
 
-    norm_text = normalize_text(text)
-    print("Normalized:", norm_text)
+    with timed("text", "normalize"):
+        norm_text = normalize_text(text)
+    log("Normalized:", norm_text)
+    return norm_text, fmt
 
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as wav_f:
-        wav_path = wav_f.name
 
-    synth_kwargs = {"text": norm_text, "file_path": wav_path}
-    if body.speaker:
-        synth_kwargs["speaker"] = body.speaker
-    if body.language:
-        synth_kwargs["language"] = body.language
+@app.post("/tts")
+def tts(body: TTSIn):
+    t0 = time.perf_counter()
+    norm_text, fmt = _prepare(body.text, body.audio_format)
 
     try:
-        _tts.tts_to_file(**synth_kwargs)
+        data, source = synthesize_cached(norm_text, fmt, body.speaker, body.language)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Coqui TTS failed: {e}")
+    FIRST_AUDIO.labels("tts").observe(time.perf_counter() - t0)
 
-        if fmt == "wav":
-            return FileResponse(wav_path, media_type="audio/wav", filename="speech.wav")
+    return Response(data, media_type=MEDIA_TYPES[fmt], headers={
+        "Content-Disposition": f'attachment; filename="speech.{fmt}"',
+        "X-TTS-Cache": source,
+    })
 
-        mp3_path = wav_path.replace(".wav", ".mp3")
-        q = subprocess.run(
-            ["ffmpeg", "-y", "-i", wav_path, "-codec:a", "libmp3lame", "-q:a", "4", mp3_path],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False,
-        )
-        if q.returncode != 0 or not os.path.exists(mp3_path):
-            err = q.stderr.decode("utf-8", "ignore")
-            raise HTTPException(500, f"ffmpeg failed: {err}")
 
-        return FileResponse(mp3_path, media_type="audio/mpeg", filename="speech.mp3")
+def _resume(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    try:
+        yield first
+        yield from rest
+    finally:
+        rest.close()
 
-    except HTTPException:
-        raise
+
+def _stream(text: Optional[str], audio_format: Optional[str], speaker: Optional[str], language: Optional[str]):
+    t0 = time.perf_counter()
+    norm_text, fmt = _prepare(text, audio_format)
+    key = cache_key(norm_text, MODEL_NAME, speaker, language, encoding_id(fmt))
+
+    # A reply that is cached whole (prewarmed, or streamed before) goes out at once
+    if cache is not None:
+        data, source = cache.get(key)
+        if data is not None:
+            FIRST_AUDIO.labels("stream").observe(time.perf_counter() - t0)
+            return Response(data, media_type=MEDIA_TYPES[fmt], headers={"X-TTS-Cache": source})
+
+    with timed("text", "chunk"):
+        chunks = chunk_text(norm_text)
+    log("Stream chunks:", [c for c, _ in chunks])
+
+    audio = stream_speech(chunks, fmt, speaker, language, store_key=key)
+    try:
+        # Synthesize the first chunk before answering, so its failure is still a 500
+        first = next(audio)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Coqui TTS failed: {e}")
+    FIRST_AUDIO.labels("stream").observe(time.perf_counter() - t0)
+
+    return StreamingResponse(_resume(first, audio), media_type=MEDIA_TYPES[fmt], headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "X-TTS-Cache": "stream",
+        "X-TTS-Chunks": str(len(chunks)),
+    })
+
+
+@app.post("/tts/stream")
+def tts_stream(body: TTSIn):
+    return _stream(body.text, body.audio_format, body.speaker, body.language)
+
+
+@app.get("/tts/stream")
+def tts_stream_get(text: str, audio_format: Optional[str] = None, speaker: Optional[str] = None,
+                   language: Optional[str] = None):
+    # For <audio src="..."> players, which start playing while the body is still arriving
+    return _stream(text, audio_format, speaker, language)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats() if cache else {"enabled": False}
 
 @app.get("/healthz")
 def healthz():
@@ -0,0 +1,211 @@
+# tts_cache.py
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+# ---------- Config ----------
+TTS_CACHE = os.getenv("TTS_CACHE", "true").lower() in {"1", "true", "yes"}
+TTS_CACHE_MEM_MB = float(os.getenv("TTS_CACHE_MEM_MB", "64"))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "/cache/tts")      # "" = memory tier only
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "1024"))
+TTS_CACHE_SALT = os.getenv("TTS_CACHE_SALT", "1")             # bump to invalidate after encoder changes
+# ----------------------------
+
+LOOKUPS = Counter("tts_cache_lookups_total", "TTS cache lookups by outcome", ["result"])   # memory|disk|miss|coalesced
+BYTES_SERVED = Counter("tts_cache_bytes_served_total", "Audio bytes returned, by where they came from", ["source"])
+CACHE_BYTES = Gauge("tts_cache_bytes", "Bytes held per cache tier", ["tier"])
+
+
+def cache_key(text: str, model: str, speaker: Optional[str], language: Optional[str], fmt: str) -> str:
+    """Content address of one synthesis: the normalized text plus everything that changes the audio."""
+    raw = json.dumps([TTS_CACHE_SALT, model, speaker or "", language or "", fmt, text], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SynthesisCache:
+    """Audio bytes by content key: a memory LRU in front of an on-disk LRU.
+
+    Both tiers are bounded in bytes. Concurrent misses on the same key are
+    coalesced: the first request synthesizes, the others wait for its result.
+    """
+
+    def __init__(self, mem_bytes: int = int(TTS_CACHE_MEM_MB * 2**20), disk_dir: str = TTS_CACHE_DIR,
+                 disk_bytes: int = int(TTS_CACHE_DISK_MB * 2**20)):
+        self.mem_limit = mem_bytes
+        self.disk_dir = disk_dir or None
+        self.disk_limit = disk_bytes
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()   # key -> size, oldest first
+        self._disk_bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.counters = {"memory": 0, "disk": 0, "miss": 0, "coalesced": 0, "evicted": 0,
+                         "bytes_served": 0, "bytes_from_cache": 0}
+        if self.disk_dir:
+            self._scan_disk()
+
+    # -------- disk tier --------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _scan_disk(self):
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+        except OSError as e:
+            print(f"TTS cache: disk tier disabled ({self.disk_dir}: {e})")
+            self.disk_dir = None
+            return
+        entries = []
+        for sub in os.listdir(self.disk_dir):
+            d = os.path.join(self.disk_dir, sub)
+            if not os.path.isdir(d):
+                continue
+            for name in os.listdir(d):
+                if len(name) != 64:
+                    continue   # leftover .tmp files of interrupted writes
+                st = os.stat(os.path.join(d, name))
+                entries.append((st.st_mtime, name, st.st_size))
+        for _mtime, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+        CACHE_BYTES.labels("disk").set(self._disk_bytes)
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir or key not in self._disk:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))   # mtime is the LRU order across restarts
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return data
+
+    def _disk_put(self, key: str, data: bytes):
+        if not self.disk_dir or len(data) > self.disk_limit:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"TTS cache: could not write {path}: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._evict_disk()
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_limit and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.counters["evicted"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+        CACHE_BYTES.labels("disk").set(self._disk_bytes)
+
+    # -------- memory tier --------
+    def _mem_put(self, key: str, data: bytes):
+        if len(data) > self.mem_limit:
+            return
+        with self._lock:
+            self._mem_bytes += len(data) - len(self._mem.pop(key, b""))
+            self._mem[key] = data
+            while self._mem_bytes > self.mem_limit:
+                _k, old = self._mem.popitem(last=False)
+                self._mem_bytes -= len(old)
+                self.counters["evicted"] += 1
+            CACHE_BYTES.labels("memory").set(self._mem_bytes)
+
+    # -------- API --------
+    def get(self, key: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """(data, memory | disk) on a hit, (None, None) otherwise. Only hits are counted."""
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+        source = "memory" if data is not None else None
+        if data is None:
+            data = self._disk_get(key)
+            if data is not None:
+                self._mem_put(key, data)
+                source = "disk"
+        if data is not None:
+            self._record(source, len(data))
+        return data, source
+
+    def put(self, key: str, data: bytes):
+        self._mem_put(key, data)
+        self._disk_put(key, data)
+
+    def get_or_create(self, key: str, produce: Callable[[], bytes]) -> Tuple[bytes, str]:
+        """Cached bytes for key, or produce() them once however many callers ask at the same time.
+        Returns (data, source) with source one of memory | disk | miss | coalesced."""
+        data, source = self.get(key)
+        if data is not None:
+            return data, source
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if owner:
+            try:
+                data = produce()
+                self.put(key, data)
+                future.set_result(data)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+            source = "miss"
+        else:
+            data, source = future.result(), "coalesced"
+        self._record(source, len(data))
+        return data, source
+
+    def _record(self, source: str, size: int):
+        LOOKUPS.labels(source).inc()
+        BYTES_SERVED.labels(source).inc(size)
+        with self._lock:
+            self.counters[source] += 1
+            self.counters["bytes_served"] += size
+            if source != "miss":
+                self.counters["bytes_from_cache"] += size
+
+    def stats(self) -> Dict[str, object]:
+        c = self.counters
+        lookups = c["memory"] + c["disk"] + c["miss"] + c["coalesced"]
+        return {
+            **c,
+            "lookups": lookups,
+            "hit_rate": round((lookups - c["miss"]) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._mem),
+            "memory_bytes": self._mem_bytes,
+            "memory_limit": self.mem_limit,
+            "disk_dir": self.disk_dir,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "disk_limit": self.disk_limit,
+        }
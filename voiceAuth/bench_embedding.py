@@ -0,0 +1,110 @@
+"""Speaker-embedding throughput: logins/sec vs encoder processes.
+
+Each simulated login embeds one utterance. `inline` is the old path (preprocess +
+embed_utterance one at a time in the serving process, which blocks its event loop);
+the other rows go through EmbeddingPool with W encoder processes, C concurrent
+clients and micro-batching. `max diff` compares the pool's embeddings with inline
+embed_utterance on the same clip.
+
+    PYTHONPATH=../common python bench_embedding.py
+    PYTHONPATH=../common python bench_embedding.py --audio enroll.wav --workers 1 2 4 --concurrency 1 8 32
+"""
+import os
+import json
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from audio_io import decode_bytes
+from embedding import SAMPLE_RATE, EmbeddingPool
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def inline_embed(audio: np.ndarray, n: int):
+    from resemblyzer import VoiceEncoder, preprocess_wav
+    encoder = VoiceEncoder(device="cpu", verbose=False)
+    encoder.embed_utterance(preprocess_wav(audio, source_sr=SAMPLE_RATE))   # warm
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        emb = encoder.embed_utterance(preprocess_wav(audio, source_sr=SAMPLE_RATE))
+        times.append(time.perf_counter() - t0)
+    return emb, times
+
+
+def drive(pool: EmbeddingPool, audio: np.ndarray, requests: int, concurrency: int):
+    latencies, lock, out = [], threading.Lock(), {}
+    remaining = [requests]
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            t0 = time.perf_counter()
+            emb = pool.embed(audio)
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+                out["emb"] = emb
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out["emb"], latencies, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--audio", default=os.path.join(HERE, "..", "stt-backend", "warmup", "alice.wav"))
+    ap.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    ap.add_argument("--concurrency", type=int, nargs="*", default=[1, 8, 32])
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--max-batch", type=int, default=16)
+    ap.add_argument("--max-wait-ms", type=float, default=5)
+    ap.add_argument("--json", help="write the rows to this file")
+    args = ap.parse_args()
+
+    with open(args.audio, "rb") as f:
+        audio = decode_bytes(f.read(), SAMPLE_RATE)
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    print(f"clip {len(audio) / SAMPLE_RATE:.1f}s, {cores} cores, {args.requests} logins per row")
+    print(f"{'mode':8} {'workers':>7} {'clients':>7} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'avg batch':>9} {'max diff':>9}")
+
+    ref, times = inline_embed(audio, min(args.requests, 50))
+    rows = [{"mode": "inline", "workers": 1, "clients": 1, "logins_per_s": round(len(times) / sum(times), 2),
+             "p50_ms": round(float(np.percentile(times, 50)) * 1000, 1),
+             "p99_ms": round(float(np.percentile(times, 99)) * 1000, 1), "avg_batch": 1.0, "max_diff": 0.0}]
+
+    for workers in args.workers:
+        pool = EmbeddingPool(workers=workers, threads=max(cores // workers, 1), max_batch=args.max_batch,
+                             max_wait_ms=args.max_wait_ms, max_queue=max(args.concurrency) * 2, timeout_s=300)
+        pool.start()
+        for clients in args.concurrency:
+            before = dict(pool.counters)
+            emb, lat, wall = drive(pool, audio, args.requests, clients)
+            batches = pool.counters["batches"] - before["batches"]
+            rows.append({"mode": "pool", "workers": workers, "clients": clients,
+                         "logins_per_s": round(len(lat) / wall, 2),
+                         "p50_ms": round(float(np.percentile(lat, 50)) * 1000, 1),
+                         "p99_ms": round(float(np.percentile(lat, 99)) * 1000, 1),
+                         "avg_batch": round((pool.counters["batched"] - before["batched"]) / max(batches, 1), 2),
+                         "max_diff": float(np.abs(emb - ref).max())})
+        pool.stop()
+
+    for r in rows:
+        print(f"{r['mode']:8} {r['workers']:>7} {r['clients']:>7} {r['logins_per_s']:>9.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['avg_batch']:>9.2f} {r['max_diff']:>9.2e}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cores": cores, "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
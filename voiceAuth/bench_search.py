@@ -0,0 +1,92 @@
+"""Speaker search timings and IVF recall on synthetic voiceprints.
+
+Builds N synthetic speakers (non-negative, L2-normalized 256-d vectors like
+resemblyzer's) and queries that are noisy re-recordings of enrolled speakers, then
+compares per-login search latency for:
+
+  loop      the old per-user Python loop with cosine_similarity
+  matrix    SpeakerIndex exact search (one matrix-vector product + top-k)
+  ivf/P     SpeakerIndex with the IVF index, P cells probed, plus recall@1 vs exact
+
+    python bench_search.py
+    python bench_search.py --users 1000 10000 100000 --nprobe 4 8 16 --queries 500
+"""
+import time
+import argparse
+
+import numpy as np
+
+from speaker_index import SpeakerIndex
+
+
+def synthetic(n: int, dim: int, rng) -> np.ndarray:
+    v = np.maximum(rng.normal(size=(n, dim)), 0).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def cosine_similarity(v1, v2):
+    return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+
+
+def loop_search(voices: dict, emb):
+    best_user, best_score = None, -1
+    for username, enrolled in voices.items():
+        sim = float(cosine_similarity(emb, enrolled))
+        if sim > best_score:
+            best_user, best_score = username, sim
+    return best_user, best_score
+
+
+def timed_queries(fn, queries):
+    times, out = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        out.append(fn(q))
+        times.append((time.perf_counter() - t0) * 1000)
+    return out, np.percentile(times, 50), np.percentile(times, 99)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, nargs="*", default=[1000, 10000, 100000])
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--nprobe", type=int, nargs="*", default=[4, 8, 16, 32])
+    ap.add_argument("--noise", type=float, default=0.35, help="query noise relative to the voiceprint")
+    ap.add_argument("--loop-max", type=int, default=20000, help="skip the Python loop above this many users")
+    ap.add_argument("--dim", type=int, default=256)
+    args = ap.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'users':>7} {'method':10} {'p50 ms':>9} {'p99 ms':>9} {'recall@1':>9} {'build s':>8}")
+    for n in args.users:
+        prints = synthetic(n, args.dim, rng)
+        names = [f"user{i}" for i in range(n)]
+        truth = rng.integers(0, n, size=args.queries)
+        queries = prints[truth] + args.noise * synthetic(args.queries, args.dim, rng)
+
+        t0 = time.perf_counter()
+        exact = SpeakerIndex(dim=args.dim, ann="off")
+        for name, v in zip(names, prints):
+            exact.add(name, v)
+        build = time.perf_counter() - t0
+        ref, p50, p99 = timed_queries(lambda q: exact.search(q, k=1)[0][0], queries)
+        print(f"{n:>7} {'matrix':10} {p50:>9.3f} {p99:>9.3f} {'1.000':>9} {build:>8.2f}")
+
+        if n <= args.loop_max:
+            voices = dict(zip(names, prints))
+            _, p50, p99 = timed_queries(lambda q: loop_search(voices, q)[0], queries)
+            print(f"{n:>7} {'loop':10} {p50:>9.3f} {p99:>9.3f} {'1.000':>9} {'':>8}")
+
+        t0 = time.perf_counter()
+        ivf = SpeakerIndex(dim=args.dim, ann="ivf", ann_min_users=n)
+        for name, v in zip(names, prints):
+            ivf.add(name, v)
+        build = time.perf_counter() - t0
+        for nprobe in args.nprobe:
+            got, p50, p99 = timed_queries(lambda q: ivf.search(q, k=1, nprobe=nprobe)[0][0], queries)
+            recall = float(np.mean([a == b for a, b in zip(got, ref)]))
+            print(f"{n:>7} {'ivf/' + str(nprobe):10} {p50:>9.3f} {p99:>9.3f} {recall:>9.3f} {build:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""1:1 verification vs 1:N identification as the enrolled population grows.
+
+Synthetic speakers share a common spectral profile, so an utterance scores
+~0.5-0.6 against unrelated voiceprints and ~0.8 against its own speaker, roughly
+what resemblyzer produces. Each enrolled user has --utterances enrollment
+utterances (voiceprint = their centroid).
+Trials per population size:
+
+  genuine   a fresh utterance of an enrolled user (claiming their own name for 1:1)
+  impostor  an utterance of a speaker who never enrolled (claiming a random user for 1:1)
+
+  1:N       best match over everyone, accepted at the global --threshold (VOICE_MATCH_THRESHOLD)
+  1:N@T     the same, at T = the median calibrated per-user threshold
+  1:1       score against the claimed user only, at their calibrated threshold
+  1:1 fixed score against the claimed user only, at the global --threshold
+
+FAR = accepted impostors, FRR = rejected (or, for 1:N, misidentified) genuine users.
+
+    python bench_verify.py
+    python bench_verify.py --users 1000 10000 100000 --trials 1000 --json verify.json
+"""
+import json
+import time
+import zlib
+import argparse
+
+import numpy as np
+
+from speaker_index import SpeakerIndex
+from verification import VOICE_CALIB_COHORT, calibrate
+
+
+def unit(m: np.ndarray) -> np.ndarray:
+    return m / np.linalg.norm(m, axis=-1, keepdims=True)
+
+
+class Voices:
+    def __init__(self, dim: int, spread: float, noise: float, seed: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.dim, self.spread, self.noise = dim, spread, noise
+        self.profile = np.abs(self.rng.normal(size=dim))
+
+    def speakers(self, n: int) -> np.ndarray:
+        spread = self.spread * self.rng.uniform(0.6, 1.4, size=(n, 1))
+        return unit(np.maximum(self.profile + spread * self.rng.normal(size=(n, self.dim)), 0)).astype(np.float32)
+
+    def utterances(self, voices: np.ndarray, k: int) -> np.ndarray:
+        noise = unit(self.rng.normal(size=(len(voices), k, self.dim)))
+        return unit(voices[:, None, :] + self.noise * noise).astype(np.float32)
+
+
+def ms(times):
+    return round(float(np.percentile(times, 50)) * 1000, 4), round(float(np.percentile(times, 99)) * 1000, 4)
+
+
+def run(n: int, args, voices: Voices):
+    rng = np.random.default_rng(n)
+    truth = rng.integers(0, n, size=args.trials)              # genuine trials
+    claims = rng.integers(0, n, size=args.trials)             # identities impostors claim
+    needed = set(truth.tolist()) | set(claims.tolist())
+
+    names = [f"user{i}" for i in range(n)]
+    prints = voices.speakers(n)
+    centroids = np.empty_like(prints)
+    enrolled = {}
+    for i in range(0, n, 8192):
+        utts = voices.utterances(prints[i:i + 8192], args.utterances)
+        centroids[i:i + 8192] = unit(utts.sum(axis=1))
+        for j in needed.intersection(range(i, i + len(utts))):
+            enrolled[j] = utts[j - i]
+    index = SpeakerIndex(dim=args.dim, ann="off")
+    index.load(names, centroids)
+
+    t0 = time.perf_counter()
+    calib = {j: calibrate(enrolled[j], index.cohort(names[j], VOICE_CALIB_COHORT, seed=zlib.crc32(names[j].encode())))
+             for j in needed}
+    calib_ms = (time.perf_counter() - t0) * 1000 / len(needed)
+
+    genuine = voices.utterances(prints[truth], 1)[:, 0]
+    impostors = voices.utterances(voices.speakers(args.trials), 1)[:, 0]
+
+    rows = []
+    # 1:N identification, at the global threshold and at the median calibrated one
+    strict = float(np.median([c["threshold"] for c in calib.values()]))
+    times, genuine_hits, impostor_best = [], [], []
+    for j, q in zip(truth, genuine):
+        t0 = time.perf_counter()
+        user, score = index.search(q, k=1)[0]
+        times.append(time.perf_counter() - t0)
+        genuine_hits.append(score if user == names[j] else -1.0)
+    for q in impostors:
+        t0 = time.perf_counter()
+        impostor_best.append(index.search(q, k=1)[0][1])
+        times.append(time.perf_counter() - t0)
+    for mode, threshold in (("1:N", args.threshold), (f"1:N@{strict:.2f}", strict)):
+        rows.append((mode, times, int(np.sum(np.array(impostor_best) >= threshold)),
+                     int(np.sum(np.array(genuine_hits) < threshold))))
+
+    # 1:1 verification, calibrated and fixed thresholds
+    for mode in ("1:1", "1:1 fixed"):
+        times, false_rejects, false_accepts = [], 0, 0
+        for claimed, q, is_genuine in [(j, q, True) for j, q in zip(truth, genuine)] + \
+                                      [(j, q, False) for j, q in zip(claims, impostors)]:
+            t0 = time.perf_counter()
+            score = index.score(names[claimed], q)
+            threshold = calib[claimed]["threshold"] if mode == "1:1" else args.threshold
+            accepted = score >= threshold
+            times.append(time.perf_counter() - t0)
+            if is_genuine:
+                false_rejects += not accepted
+            else:
+                false_accepts += accepted
+        rows.append((mode, times, false_accepts, false_rejects))
+
+    out = []
+    for mode, times, fa, fr in rows:
+        p50, p99 = ms(times)
+        out.append({"users": n, "mode": mode, "p50_ms": p50, "p99_ms": p99,
+                    "far": round(fa / args.trials, 4), "frr": round(fr / args.trials, 4)})
+    thresholds = [c["threshold"] for c in calib.values()]
+    out.append({"users": n, "mode": "calibration", "ms_per_user": round(calib_ms, 3),
+                "threshold_p5": round(float(np.percentile(thresholds, 5)), 3),
+                "threshold_p50": round(float(np.percentile(thresholds, 50)), 3),
+                "threshold_p95": round(float(np.percentile(thresholds, 95)), 3)})
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, nargs="*", default=[100, 1000, 10000, 50000])
+    ap.add_argument("--trials", type=int, default=500, help="genuine and impostor trials each")
+    ap.add_argument("--utterances", type=int, default=3, help="enrollment utterances per user")
+    ap.add_argument("--threshold", type=float, default=0.5, help="global threshold (VOICE_MATCH_THRESHOLD)")
+    ap.add_argument("--spread", type=float, default=1.2, help="how different speakers are")
+    ap.add_argument("--noise", type=float, default=0.6, help="utterance noise relative to the voice")
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--json", help="write the rows to this file")
+    args = ap.parse_args()
+
+    voices = Voices(args.dim, args.spread, args.noise)
+    print(f"{'users':>7} {'mode':10} {'p50 ms':>8} {'p99 ms':>8} {'FAR':>7} {'FRR':>7}")
+    rows = []
+    for n in args.users:
+        for r in run(n, args, voices):
+            rows.append(r)
+            if r["mode"] == "calibration":
+                print(f"{n:>7} {'thresholds':10} p5={r['threshold_p5']} p50={r['threshold_p50']} "
+                      f"p95={r['threshold_p95']} ({r['ms_per_user']} ms/user to calibrate)")
+            else:
+                print(f"{n:>7} {r['mode']:10} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['far']:>7.3f} {r['frr']:>7.3f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# embedding.py
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+
+from instrumentation import timed
+
+SAMPLE_RATE = 16000        # resemblyzer.hparams.sampling_rate
+PARTIAL_RATE = 1.3         # embed_utterance() defaults
+MIN_COVERAGE = 0.75
+
+# ---------------- Config ----------------
+VOICE_EMBED_WORKERS = int(os.getenv("VOICE_EMBED_WORKERS", "1"))             # encoder processes
+VOICE_EMBED_THREADS = int(os.getenv("VOICE_EMBED_THREADS", "0"))             # torch threads each; 0 = cores / workers
+VOICE_EMBED_MAX_BATCH = int(os.getenv("VOICE_EMBED_MAX_BATCH", "16"))        # utterances per forward pass
+VOICE_EMBED_MAX_WAIT_MS = float(os.getenv("VOICE_EMBED_MAX_WAIT_MS", "5"))   # how long a batch may wait to fill up
+VOICE_EMBED_MAX_QUEUE = int(os.getenv("VOICE_EMBED_MAX_QUEUE", "64"))        # queued utterances before we shed load
+VOICE_EMBED_TIMEOUT_S = float(os.getenv("VOICE_EMBED_TIMEOUT_S", "10"))      # queue wait + embedding, per request
+
+BATCH_SIZE = Histogram("voiceauth_embed_batch_size", "Utterances per encoder forward pass",
+                       buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32))
+QUEUE_WAIT = Histogram("voiceauth_embed_queue_wait_seconds", "Time an utterance waited for a batch",
+                       buckets=(0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+QUEUE_DEPTH = Gauge("voiceauth_embed_queue_depth", "Utterances waiting for an encoder process")
+REJECTED = Counter("voiceauth_embed_rejected_total", "Utterances refused because the queue was full")
+TIMEOUTS = Counter("voiceauth_embed_timeouts_total", "Utterances that were not embedded in time")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class NoSpeech(ValueError):
+    pass
+
+
+# ---------------- Encoder process ----------------
+# Runs inside each pool process: the model is loaded once by the initializer and
+# kept for the life of the process.
+_encoder = None
+
+
+def _init_encoder(threads: int):
+    global _encoder
+    import torch
+    from resemblyzer import VoiceEncoder
+    torch.set_num_threads(threads)
+    _encoder = VoiceEncoder(device="cpu", verbose=False)
+
+
+def _warm() -> bool:
+    import torch
+    from resemblyzer.hparams import mel_n_channels, partials_n_frames
+    with torch.no_grad():
+        _encoder(torch.zeros((1, partials_n_frames, mel_n_channels)))
+    return True
+
+
+def _embed_batch(audios: List[np.ndarray]) -> List[Any]:
+    """embed_utterance() for many utterances with one LSTM forward pass.
+
+    Every utterance is split into 1.6 s partial windows exactly as embed_utterance()
+    does; the windows of all utterances are stacked into one batch, and each
+    utterance's embedding is the normalized mean of its own windows. Utterances
+    without speech come back as an error string, and utterances that fail to
+    process as the exception, instead of an embedding; the others are unaffected.
+    """
+    import torch
+    from resemblyzer import preprocess_wav
+    from resemblyzer.audio import wav_to_mel_spectrogram
+
+    results: List[Any] = [None] * len(audios)
+    mels: Dict[int, List[np.ndarray]] = {}
+    for i, audio in enumerate(audios):
+        try:
+            wav = preprocess_wav(audio, source_sr=SAMPLE_RATE)
+            if not len(wav):
+                results[i] = "no speech in audio"
+                continue
+            wav_slices, mel_slices = _encoder.compute_partial_slices(len(wav), PARTIAL_RATE, MIN_COVERAGE)
+            if wav_slices[-1].stop >= len(wav):
+                wav = np.pad(wav, (0, wav_slices[-1].stop - len(wav)), "constant")
+            mel = wav_to_mel_spectrogram(wav)
+            mels[i] = [mel[s] for s in mel_slices]
+        except Exception as e:
+            results[i] = e
+
+    def forward(owners: List[int]):
+        batch = np.stack([m for i in owners for m in mels[i]])
+        with torch.no_grad():
+            partials = _encoder(torch.from_numpy(batch)).numpy()
+        start = 0
+        for i in owners:
+            raw = partials[start:start + len(mels[i])].mean(axis=0)
+            start += len(mels[i])
+            results[i] = raw / np.linalg.norm(raw, 2)
+
+    if mels:
+        try:
+            forward(list(mels))
+        except Exception:
+            # Find the culprit: one forward pass per utterance
+            for i in mels:
+                try:
+                    forward([i])
+                except Exception as e:
+                    results[i] = e
+    return results
+
+
+class Job:
+    def __init__(self, audio: np.ndarray, timeout: float):
+        self.audio = audio
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+        self.deadline = self.enqueued + timeout
+
+
+class EncoderWorker(threading.Thread):
+    """Feeds batches to one encoder process and hands the results back."""
+
+    def __init__(self, pool: "EmbeddingPool", index: int):
+        super().__init__(name=f"encoder-{index}", daemon=True)
+        self.pool = pool
+        self.index = index
+        self.ready = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.batches = 0
+        self.restarts = 0
+
+    def _spawn(self):
+        # spawn, not fork: torch's thread pools do not survive a fork of a threaded parent
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_encoder, initargs=(self.pool.threads,))
+        self.executor.submit(_warm).result()
+
+    def run(self):
+        try:
+            self._spawn()
+        except BaseException as e:
+            self.error = e
+            return
+        finally:
+            self.ready.set()
+
+        while True:
+            batch = self.pool._take_batch()
+            if batch is None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                return
+            self.pool._run_batch(self, batch)
+            self.batches += 1
+
+
+# ---------------- Pool ----------------
+class EmbeddingPool:
+    """Speaker embedding off the event loop, micro-batched across requests.
+
+    An encoder thread takes the oldest queued utterance, then keeps adding queued
+    utterances until max_batch are collected or max_wait_ms has passed since that
+    oldest one arrived, and sends the batch to its own encoder process. Utterances
+    still queued at their deadline fail with TimeoutError; a full queue raises
+    QueueFull immediately.
+    """
+
+    def __init__(self, workers: int = VOICE_EMBED_WORKERS, threads: int = VOICE_EMBED_THREADS,
+                 max_batch: int = VOICE_EMBED_MAX_BATCH, max_wait_ms: float = VOICE_EMBED_MAX_WAIT_MS,
+                 max_queue: int = VOICE_EMBED_MAX_QUEUE, timeout_s: float = VOICE_EMBED_TIMEOUT_S):
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+        self.workers = max(workers, 1)
+        self.threads = threads or max(cores // self.workers, 1)
+        self.max_batch = max(max_batch, 1)
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max(max_queue, 1)
+        self.timeout = timeout_s
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._workers = [EncoderWorker(self, i) for i in range(self.workers)]
+        self.counters = {"requests": 0, "batches": 0, "batched": 0, "embedded": 0, "rejected": 0, "timeouts": 0}
+
+    def start(self):
+        """Start the encoder processes and load the model in each, blocking."""
+        t0 = time.perf_counter()
+        for w in self._workers:
+            w.start()
+        for w in self._workers:
+            w.ready.wait()
+            if w.error:
+                raise w.error
+        print(f"Voice encoder: {self.workers} process(es) x {self.threads} threads, batch<={self.max_batch}, "
+              f"wait<={self.max_wait * 1000:.0f}ms, ready in {time.perf_counter() - t0:.1f}s")
+
+    def stop(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # -------- submit --------
+    def submit(self, audio: np.ndarray) -> Future:
+        job = Job(np.asarray(audio, dtype=np.float32), self.timeout)
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self.counters["rejected"] += 1
+                REJECTED.inc()
+                raise QueueFull("embedding queue is full")
+            self._queue.append(job)
+            self.counters["requests"] += 1
+            QUEUE_DEPTH.set(len(self._queue))
+            self._cond.notify_all()
+        return job.future
+
+    def embed(self, audio: np.ndarray) -> np.ndarray:
+        """Blocking: one 256-d embedding for 16 kHz mono float32 audio."""
+        return self.submit(audio).result(timeout=self.timeout + 1)
+
+    async def aembed(self, audio: np.ndarray) -> np.ndarray:
+        future = self.submit(audio)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except (asyncio.TimeoutError, TimeoutError):
+            # Cancelling the wrapper also drops the job if it is still queued
+            self.counters["timeouts"] += 1
+            TIMEOUTS.inc()
+            raise TimeoutError("speaker embedding timed out")
+
+    # -------- worker side --------
+    def _take_batch(self) -> Optional[List[Job]]:
+        with self._cond:
+            batch: List[Job] = []
+            while True:
+                now = time.monotonic()
+                while self._queue and len(batch) < self.max_batch:
+                    job = self._queue.popleft()
+                    if now >= job.deadline:
+                        # Expired while queued; its caller has given up already
+                        if job.future.set_running_or_notify_cancel():
+                            job.future.set_exception(TimeoutError("speaker embedding timed out in the queue"))
+                        continue
+                    if job.future.set_running_or_notify_cancel():
+                        batch.append(job)
+                if self._closed and not batch:
+                    return None
+                if not batch:
+                    self._cond.wait()
+                    continue
+                remaining = batch[0].enqueued + self.max_wait - now
+                if len(batch) >= self.max_batch or remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+            QUEUE_DEPTH.set(len(self._queue))
+            return batch
+
+    def _run_batch(self, worker: EncoderWorker, batch: List[Job]):
+        now = time.monotonic()
+        for job in batch:
+            QUEUE_WAIT.observe(now - job.enqueued)
+        BATCH_SIZE.observe(len(batch))
+        self.counters["batches"] += 1
+        self.counters["batched"] += len(batch)
+        try:
+            with timed("inference", "embed_batch"):
+                results = worker.executor.submit(_embed_batch, [j.audio for j in batch]).result()
+        except Exception as e:
+            for job in batch:
+                job.future.set_exception(e)
+            if isinstance(e, BrokenProcessPool):
+                # The encoder process died (e.g. OOM-killed): replace it
+                print(f"Voice encoder {worker.index} died, restarting: {e}")
+                worker.restarts += 1
+                try:
+                    worker._spawn()
+                except Exception as spawn_error:
+                    print(f"Voice encoder {worker.index} could not restart: {spawn_error}")
+            return
+        for job, result in zip(batch, results):
+            if isinstance(result, Exception):
+                job.future.set_exception(result)
+            elif isinstance(result, str):
+                job.future.set_exception(NoSpeech(result))
+            else:
+                self.counters["embedded"] += 1
+                job.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        c = self.counters
+        return {
+            "workers": self.workers,
+            "threads": self.threads,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_queue": self.max_queue,
+            "timeout_s": self.timeout,
+            "queue_depth": len(self._queue),
+            **c,
+            "avg_batch": round(c["batched"] / c["batches"], 2) if c["batches"] else 0.0,
+            "batches_per_worker": [w.batches for w in self._workers],
+            "restarts": [w.restarts for w in self._workers],
+        }
@@ -0,0 +1,231 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# ---------------- Config ----------------
+VOICE_ANN = os.getenv("VOICE_ANN", "off").lower()                       # "off" | "ivf"
+VOICE_ANN_MIN_USERS = int(os.getenv("VOICE_ANN_MIN_USERS", "20000"))     # exact search below this
+VOICE_IVF_NLIST = int(os.getenv("VOICE_IVF_NLIST", "0"))                 # 0 = ~4 * sqrt(n)
+VOICE_IVF_NPROBE = int(os.getenv("VOICE_IVF_NPROBE", "8"))
+
+
+def normalize(v) -> np.ndarray:
+    v = np.asarray(v, dtype=np.float32).reshape(-1)
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+
+# ---------------- Approximate index ----------------
+class IVFIndex:
+    """Inverted-file index over the rows of a SpeakerIndex matrix.
+
+    k-means centroids split the rows into nlist cells; a query scores only the rows
+    in its nprobe closest cells. Rows are added to / removed from their cell as the
+    matrix changes; the centroids are retrained once the population has grown 4x.
+    """
+
+    def __init__(self, nlist: int = VOICE_IVF_NLIST, nprobe: int = VOICE_IVF_NPROBE):
+        self.nlist_setting = nlist
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.cells: List[List[int]] = []
+        self.cell_of: Dict[int, int] = {}       # row -> cell
+        self.trained_at = 0
+
+    def train(self, matrix: np.ndarray, iters: int = 10, seed: int = 0):
+        n = len(matrix)
+        nlist = self.nlist_setting or max(int(4 * np.sqrt(n)), 1)
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n, size=min(n, nlist * 32), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            # Spherical k-means: assign by cosine, re-normalize the means
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = normalize(members.sum(axis=0))
+        self.centroids = centroids
+        self.cells = [[] for _ in range(nlist)]
+        self.cell_of = {}
+        for row, cell in enumerate(self._assign(matrix)):
+            self.cells[cell].append(row)
+            self.cell_of[row] = int(cell)
+        self.trained_at = n
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        out = np.empty(len(vectors), dtype=np.int64)
+        for i in range(0, len(vectors), 8192):
+            out[i:i + 8192] = np.argmax(vectors[i:i + 8192] @ self.centroids.T, axis=1)
+        return out
+
+    def add(self, row: int, vector: np.ndarray):
+        cell = int(np.argmax(self.centroids @ vector))
+        self.cells[cell].append(row)
+        self.cell_of[row] = cell
+
+    def remove(self, row: int):
+        cell = self.cell_of.pop(row)
+        self.cells[cell].remove(row)
+
+    def move(self, old_row: int, new_row: int):
+        cell = self.cell_of.pop(old_row)
+        lst = self.cells[cell]
+        lst[lst.index(old_row)] = new_row
+        self.cell_of[new_row] = cell
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        nprobe = min(nprobe or self.nprobe, len(self.cells))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = [r for c in probe for r in self.cells[c]]
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+
+# ---------------- Exact index ----------------
+class SpeakerIndex:
+    """Enrolled voiceprints as one contiguous, L2-normalized float32 matrix plus a
+    parallel username list. Identification is one matrix-vector product + top-k.
+
+    add() overwrites a user's row in place or appends (capacity doubles, amortized);
+    remove() moves the last row into the freed slot. Neither rebuilds the matrix.
+    """
+
+    def __init__(self, dim: int = 256, capacity: int = 1024, ann: str = VOICE_ANN,
+                 ann_min_users: int = VOICE_ANN_MIN_USERS):
+        self.dim = dim
+        self._matrix = np.zeros((max(capacity, 1), dim), dtype=np.float32)
+        self._names: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.ann_kind = ann
+        self.ann_min_users = ann_min_users
+        self.ann: Optional[IVFIndex] = None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._rows
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._matrix[:len(self._names)]
+
+    def load(self, names: List[str], matrix: np.ndarray) -> None:
+        """Replace the whole population in one go (startup / store reload)."""
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        with self._lock:
+            self._matrix = np.zeros((max(2 * len(names), 1024), self.dim), dtype=np.float32)
+            self._matrix[:len(names)] = matrix / np.where(norms == 0, 1, norms)
+            self._names = list(names)
+            self._rows = {name: i for i, name in enumerate(self._names)}
+            self.ann = None
+            self._maybe_train()
+
+    def add(self, username: str, embedding) -> None:
+        vec = normalize(embedding)
+        with self._lock:
+            row = self._rows.get(username)
+            if row is not None:
+                self._matrix[row] = vec
+                if self.ann:
+                    self.ann.remove(row)
+                    self.ann.add(row, vec)
+                return
+            row = len(self._names)
+            if row == len(self._matrix):
+                grown = np.zeros((2 * len(self._matrix), self.dim), dtype=np.float32)
+                grown[:row] = self._matrix[:row]
+                self._matrix = grown
+            self._matrix[row] = vec
+            self._names.append(username)
+            self._rows[username] = row
+            if self.ann:
+                self.ann.add(row, vec)
+            self._maybe_train()
+
+    def remove(self, username: str) -> bool:
+        with self._lock:
+            row = self._rows.pop(username, None)
+            if row is None:
+                return False
+            last = len(self._names) - 1
+            if self.ann:
+                self.ann.remove(row)
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                moved = self._names[last]
+                self._names[row] = moved
+                self._rows[moved] = row
+                if self.ann:
+                    self.ann.move(last, row)
+            self._names.pop()
+            self._matrix[last] = 0
+            return True
+
+    def get(self, username: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(username)
+            return None if row is None else self._matrix[row].copy()
+
+    def score(self, username: str, embedding) -> Optional[float]:
+        """Cosine between a query and one enrolled voiceprint (1:1 verification)."""
+        q = normalize(embedding)
+        with self._lock:
+            row = self._rows.get(username)
+            return None if row is None else float(self._matrix[row] @ q)
+
+    def cohort(self, username: str, size: int, seed: int = 0) -> np.ndarray:
+        """Up to `size` other users' voiceprints, a fixed random sample for a given seed."""
+        with self._lock:
+            n = len(self._names)
+            row = self._rows.get(username, -1)
+            if n - (row >= 0) <= size:
+                idx = np.arange(n)
+            else:
+                idx = np.random.default_rng(seed).choice(n, size=size + 1, replace=False)
+            return self._matrix[idx[idx != row][:size]].copy()
+
+    def _maybe_train(self):
+        n = len(self._names)
+        if self.ann_kind != "ivf" or n < self.ann_min_users:
+            return
+        if self.ann is None or n >= 4 * self.ann.trained_at:
+            ann = self.ann or IVFIndex()
+            ann.train(self.matrix)
+            self.ann = ann
+
+    def search(self, embedding, k: int = 1, exact: bool = False, nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Top-k (username, cosine) for one query embedding, best first."""
+        q = normalize(embedding)
+        with self._lock:
+            n = len(self._names)
+            if not n:
+                return []
+            rows = self.ann.candidates(q, nprobe) if self.ann and not exact else None
+            if rows is not None and len(rows):
+                scores = self._matrix[rows] @ q
+            else:
+                rows = None
+                scores = self._matrix[:n] @ q
+            k = min(k, len(scores))
+            if not k:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            idx = top if rows is None else rows[top]
+            return [(self._names[int(i)], float(s)) for i, s in zip(idx, scores[top])]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "users": len(self._names),
+            "dim": self.dim,
+            "capacity": len(self._matrix),
+            "ann": self.ann_kind if self.ann else "exact",
+            "ivf_cells": len(self.ann.cells) if self.ann else 0,
+            "ivf_nprobe": self.ann.nprobe if self.ann else 0,
+        }
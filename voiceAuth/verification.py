@@ -0,0 +1,99 @@
+import os
+import time
+import zlib
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+# ---------------- Config ----------------
+VOICE_VERIFY_THRESHOLD = float(os.getenv("VOICE_VERIFY_THRESHOLD", "0.75"))        # before a user can be calibrated
+VOICE_VERIFY_MIN_THRESHOLD = float(os.getenv("VOICE_VERIFY_MIN_THRESHOLD", "0.6"))  # calibration never goes below...
+VOICE_VERIFY_MAX_THRESHOLD = float(os.getenv("VOICE_VERIFY_MAX_THRESHOLD", "0.9"))  # ...or above these
+VOICE_CALIB_COHORT = int(os.getenv("VOICE_CALIB_COHORT", "1000"))                  # other voiceprints used as impostors
+VOICE_CALIB_MIN_COHORT = int(os.getenv("VOICE_CALIB_MIN_COHORT", "20"))
+VOICE_CALIB_IMPOSTOR_Q = float(os.getenv("VOICE_CALIB_IMPOSTOR_Q", "0.99"))
+VOICE_CALIB_MARGIN = float(os.getenv("VOICE_CALIB_MARGIN", "0.02"))
+VOICE_CALIB_TTL_S = float(os.getenv("VOICE_CALIB_TTL_S", "3600"))                  # re-sample the cohort this often
+
+
+def _unit_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms == 0, 1, norms)
+
+
+def calibrate(utterances: np.ndarray, cohort: np.ndarray, default: float = VOICE_VERIFY_THRESHOLD,
+              lo: float = VOICE_VERIFY_MIN_THRESHOLD, hi: float = VOICE_VERIFY_MAX_THRESHOLD) -> Dict[str, object]:
+    """Acceptance threshold for one user's voiceprint.
+
+    Genuine scores are leave-one-out: each enrollment utterance against the centroid
+    of the others (needs >= 2 utterances). Impostor scores are the user's centroid
+    against a cohort of other users' voiceprints. The threshold sits halfway between
+    the weakest genuine score and the VOICE_CALIB_IMPOSTOR_Q impostor quantile; when
+    the two overlap, above the impostors. Missing evidence falls back to `default`,
+    and the result is clamped to [lo, hi].
+    """
+    utterances = _unit_rows(np.asarray(utterances, dtype=np.float32).reshape(-1, cohort.shape[1]))
+    if not len(utterances):
+        return {"threshold": default, "source": "default", "genuine_min": None, "impostor_q": None,
+                "utterances": 0, "cohort": len(cohort)}
+    total = utterances.sum(axis=0)
+    centroid = total / (np.linalg.norm(total) or 1)
+
+    genuine = None
+    if len(utterances) >= 2:
+        others = _unit_rows(total[None, :] - utterances)
+        genuine = float(np.min(np.sum(others * utterances, axis=1)))
+    impostor = None
+    if len(cohort) >= VOICE_CALIB_MIN_COHORT:
+        impostor = float(np.quantile(cohort @ centroid, VOICE_CALIB_IMPOSTOR_Q))
+
+    if genuine is None and impostor is None:
+        threshold, source = default, "default"
+    elif genuine is None:
+        threshold, source = max(default, impostor + VOICE_CALIB_MARGIN), "impostors"
+    elif impostor is None:
+        threshold, source = min(default, genuine - VOICE_CALIB_MARGIN), "enrollment"
+    elif genuine > impostor + 2 * VOICE_CALIB_MARGIN:
+        threshold, source = (genuine + impostor) / 2, "calibrated"
+    else:
+        threshold, source = impostor + VOICE_CALIB_MARGIN, "calibrated"
+    return {
+        "threshold": round(float(np.clip(threshold, lo, hi)), 4),
+        "source": source,
+        "genuine_min": None if genuine is None else round(genuine, 4),
+        "impostor_q": None if impostor is None else round(impostor, 4),
+        "utterances": len(utterances),
+        "cohort": len(cohort),
+    }
+
+
+class Thresholds:
+    """Per-user thresholds, recomputed when the user's enrollment version changes
+    or the cached value is older than VOICE_CALIB_TTL_S (the cohort drifts as users enroll)."""
+
+    def __init__(self, store, speakers, cohort: int = VOICE_CALIB_COHORT, ttl_s: float = VOICE_CALIB_TTL_S):
+        self.store = store
+        self.speakers = speakers
+        self.cohort = cohort
+        self.ttl = ttl_s
+        self._cache: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[Dict[str, object]]:
+        info = self.store.info(username)
+        if info is None:
+            return None
+        with self._lock:
+            hit = self._cache.get(username)
+        if hit and hit[0] == info["version"] and time.monotonic() - hit[1] < self.ttl:
+            return hit[2]
+        cohort = self.speakers.cohort(username, self.cohort, seed=zlib.crc32(username.encode()))
+        result = calibrate(self.store.embeddings(username), cohort)
+        with self._lock:
+            self._cache[username] = (info["version"], time.monotonic(), result)
+        return result
+
+    def forget(self, username: str):
+        with self._lock:
+            self._cache.pop(username, None)
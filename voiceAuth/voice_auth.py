@@ -1,19 +1,34 @@
 import os
+import time
+import asyncio
 import jwt
 import numpy as np
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydub import AudioSegment
-from resemblyzer import VoiceEncoder, preprocess_wav
-import uuid, tempfile
+import uuid
+from typing import Optional
+
+from instrumentation import instrument, timed
+from audio_io import AudioDecodeError, decode_bytes
+from embedding import SAMPLE_RATE, EmbeddingPool, NoSpeech, QueueFull
+from speaker_index import SpeakerIndex
+from voiceprint_store import VoiceprintStore, VOICE_STORE_DIR
+from verification import VOICE_VERIFY_MIN_THRESHOLD, Thresholds
 
 # ---------------- Config ----------------
 SECRET = os.getenv("JWT_SECRET", "supersecret")
 JWT_ALGO = "HS256"
+MATCH_THRESHOLD = float(os.getenv("VOICE_MATCH_THRESHOLD", "0.5"))                # 1:N login bar
+# Opt-in: 1:N logins must also clear the best match's calibrated 1:1 threshold (0.6-0.9)
+VOICE_LOGIN_CALIBRATED = os.getenv("VOICE_LOGIN_CALIBRATED", "false").lower() in {"1", "true", "yes"}
+VOICE_STORE_REFRESH_S = float(os.getenv("VOICE_STORE_REFRESH_S", "1.0"))   # how often to pick up other replicas' writes
 
-# For demo: store enrolled voices in memory
-# In production: use a DB
-enrolled_voices = {}  # {username: embedding_vector}
+# Voiceprints persist in a memory-mapped store shared by all replicas; the search
+# index holds one centroid per user and is rebuilt from the store at startup
+store = VoiceprintStore(VOICE_STORE_DIR, dim=256)
+speakers = SpeakerIndex(dim=256)  # normalized embedding matrix + username index
+thresholds = Thresholds(store, speakers)  # per-user calibrated thresholds for 1:1 verification
+_last_refresh = 0.0
 
 app = FastAPI()
 app.add_middleware(
@@ -23,59 +38,163 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+instrument(app, "voiceauth")
+
+# Embedding runs in encoder processes (one preloaded VoiceEncoder each), never on
+# the event loop; concurrent requests share a forward pass
+embedder = EmbeddingPool()
 
-encoder = VoiceEncoder()
+@app.on_event("startup")
+def start_encoders():
+    embedder.start()
+
+@app.on_event("shutdown")
+def stop_encoders():
+    embedder.stop()
 
 # ---------------- Helpers ----------------
-def extract_embedding(audio_path: str):
-    wav = preprocess_wav(audio_path)
-    return encoder.embed_utterance(wav)
+def reload_speakers():
+    t0 = time.perf_counter()
+    names, centroids = store.centroids()
+    speakers.load(names, centroids)
+    print(f"Loaded {len(names)} voiceprints from {store.path} in {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+def sync_user(username: str):
+    centroid = store.centroid(username)
+    if centroid is None:
+        speakers.remove(username)
+    else:
+        speakers.add(username, centroid)
 
-def cosine_similarity(v1, v2):
-    return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+def refresh_speakers(force: bool = False):
+    global _last_refresh
+    if not force and time.monotonic() - _last_refresh < VOICE_STORE_REFRESH_S:
+        return
+    _last_refresh = time.monotonic()
+    changed = store.refresh()
+    if changed is None:
+        reload_speakers()
+    else:
+        for username in changed:
+            sync_user(username)
+
+def load_audio(upload) -> np.ndarray:
+    # Decoded in memory at the encoder's rate: no temp WAV, no pydub re-export
+    try:
+        return decode_bytes(upload.read(), SAMPLE_RATE)
+    except AudioDecodeError as e:
+        raise HTTPException(400, f"Could not decode audio: {e}")
+
+async def extract_embedding(upload) -> np.ndarray:
+    audio = await asyncio.to_thread(load_audio, upload)
+    try:
+        with timed("inference", "embed"):
+            return await embedder.aembed(audio)
+    except NoSpeech as e:
+        raise HTTPException(400, f"Could not embed audio: {e}")
+    except (QueueFull, TimeoutError) as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "1"})
 
 def issue_jwt(username: str):
     payload = {"sub": username, "jti": str(uuid.uuid4())}
     return jwt.encode(payload, SECRET, algorithm=JWT_ALGO)
 
+async def user_threshold(username: str) -> Optional[dict]:
+    # Calibration scores a cohort of voiceprints: keep it off the event loop
+    return await asyncio.to_thread(thresholds.get, username)
+
+async def verify_claim(username: str, emb: np.ndarray) -> dict:
+    # 1:1: one dot product against the claimed user's voiceprint, whatever the population size
+    with timed("search", "verify"):
+        score = speakers.score(username, emb)
+    if score is None:
+        raise HTTPException(404, f"{username} is not enrolled")
+    calib = await user_threshold(username)
+    if calib is None:   # removed since the index was refreshed
+        raise HTTPException(404, f"{username} is not enrolled")
+    if score < calib["threshold"]:
+        raise HTTPException(401, f"Voice does not match {username} (score={score:.2f})")
+    return {"username": username, "score": score, "threshold": calib["threshold"], "mode": "verify",
+            "token": issue_jwt(username)}
+
+reload_speakers()
+
 # ---------------- API ----------------
 @app.post("/enroll/{username}")
-async def enroll(username: str, file: UploadFile = File(...)):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-        audio = AudioSegment.from_file(file.file)
-        audio.export(tmp.name, format="wav")
-        emb = extract_embedding(tmp.name)
-        enrolled_voices[username] = emb
-    return {"message": f"Enrolled {username}"}
+async def enroll(username: str, file: UploadFile = File(...), replace: bool = False):
+    # Each call adds one utterance; the user's voiceprint is the centroid of all of them
+    emb = await extract_embedding(file.file)
+    info = await asyncio.to_thread(store.enroll, username, emb, replace=replace)
+    sync_user(username)
+    return {"message": f"Enrolled {username}", "utterances": info["count"], "version": info["version"]}
+
+@app.delete("/enroll/{username}")
+async def unenroll(username: str):
+    if not await asyncio.to_thread(store.delete, username):
+        raise HTTPException(404, f"{username} is not enrolled")
+    refresh_speakers(force=True)
+    speakers.remove(username)
+    thresholds.forget(username)
+    return {"message": f"Removed {username}"}
+
+@app.get("/speakers/stats")
+async def speaker_stats():
+    return {**speakers.stats(), "store": store.stats()}
+
+@app.get("/embedding/stats")
+async def embedding_stats():
+    return embedder.stats()
 
 @app.get("/healthz")
 async def healthz():
     return {"ok": True}
 
+@app.get("/verify/{username}/threshold")
+async def verify_threshold(username: str):
+    refresh_speakers()
+    calib = await user_threshold(username)
+    if calib is None:
+        raise HTTPException(404, f"{username} is not enrolled")
+    return calib
+
+@app.post("/verify/{username}")
+async def verify(username: str, file: UploadFile = File(...)):
+    refresh_speakers()
+    if username not in speakers:
+        raise HTTPException(404, f"{username} is not enrolled")
+    return await verify_claim(username, await extract_embedding(file.file))
+
 @app.post("/voice-login")
-async def voice_login(file: UploadFile = File(...)):
-    if not enrolled_voices:
+async def voice_login(file: UploadFile = File(...), username: Optional[str] = Form(None)):
+    # With a claimed username this is 1:1 verification; without, 1:N identification
+    if username:
+        return await verify(username, file)
+
+    refresh_speakers()
+    if not len(speakers):
         raise HTTPException(400, "No enrolled users yet")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-        audio = AudioSegment.from_file(file.file)
-        audio.export(tmp.name, format="wav")
-        emb = extract_embedding(tmp.name)
+    emb = await extract_embedding(file.file)
 
-    # Find best match
-    best_user, best_score = None, -1
-    for username, enrolled_emb in enrolled_voices.items():
-        sim = float(cosine_similarity(emb, enrolled_emb))   # ✅ cast here
-        if sim > best_score:
-            best_user, best_score = username, sim
+    # Find best match: one matrix-vector product over all enrolled voiceprints
+    with timed("search", "match"):
+        best_user, best_score = speakers.search(emb, k=1)[0]
 
-    if best_score < 0.5:  # threshold
+    threshold = MATCH_THRESHOLD
+    if VOICE_LOGIN_CALIBRATED:
+        # The best match must also clear that user's calibrated 1:1 threshold, so leaving
+        # out the claim never makes for a weaker check than making it
+        calib = await user_threshold(best_user)
+        threshold = max(threshold, calib["threshold"] if calib else VOICE_VERIFY_MIN_THRESHOLD)
+    if best_score < threshold:
         raise HTTPException(401, f"Voice not recognized (score={best_score:.2f})")
 
     token = issue_jwt(best_user)
     return {
         "username": best_user,
         "score": float(best_score),   # ✅ cast here
+        "threshold": threshold,
+        "mode": "identify",
         "token": token
     }
 
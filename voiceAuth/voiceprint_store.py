@@ -0,0 +1,404 @@
+"""Persistent voiceprint store shared by VoiceAuth replicas.
+
+Layout under the store directory:
+
+    CURRENT                     name of the live generation, replaced atomically
+    .lock                       flock held by writers (enroll / delete / compact)
+    gen-000002/embeddings.f32   float32 rows, one per enrollment utterance; appended to
+    gen-000002/snapshot.json    per-user metadata as of the last compaction (optional)
+    gen-000002/centroids.f32    one centroid row per snapshot user (optional)
+    gen-000002/index.jsonl      append-only log of changes since the snapshot (add / reset / delete)
+
+Readers memory-map the .f32 files read-only, so replicas on one host share the
+page cache, and only tail index.jsonl to pick up other replicas' writes. The flock
+serializes writers across processes; within a process a lock also covers
+refresh(), so a write in a worker thread and a refresh on the event loop never
+replay the same log range. A user's
+voiceprint is the normalized mean (centroid) of their utterance rows.
+
+Opening costs one snapshot load plus the log written since the last compaction,
+not the whole history: compact() copies the live rows into a new generation,
+precomputes every centroid and starts an empty log. It runs when enough rows are
+dead or the log grows long, or from the command line:
+
+    python voiceprint_store.py stats /data/voiceprints
+    python voiceprint_store.py compact /data/voiceprints
+"""
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+# ---------------- Config ----------------
+VOICE_STORE_DIR = os.getenv("VOICE_STORE_DIR", "/data/voiceprints")
+VOICE_STORE_COMPACT_RATIO = float(os.getenv("VOICE_STORE_COMPACT_RATIO", "0.5"))   # dead rows share that triggers compaction
+VOICE_STORE_COMPACT_MIN = int(os.getenv("VOICE_STORE_COMPACT_MIN", "1024"))        # ...once at least this many are dead
+VOICE_STORE_LOG_MAX = int(os.getenv("VOICE_STORE_LOG_MAX", "50000"))               # log records before a compaction
+
+SNAPSHOT_FIELDS = ("version", "count", "created_at", "updated_at")
+
+
+def _unit(v) -> np.ndarray:
+    v = np.asarray(v, dtype=np.float32).reshape(-1)
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return (m / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+def _write_synced(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class VoiceprintStore:
+    def __init__(self, path: str = VOICE_STORE_DIR, dim: int = 256):
+        self.path = path
+        self.dim = dim
+        self.row_bytes = dim * 4
+        os.makedirs(path, exist_ok=True)
+        self._lock_path = os.path.join(path, ".lock")
+        self._mutex = threading.RLock()   # in-process: log replay, remap and the meta dicts
+        self.generation = None
+        self._open()
+
+    # -------- files --------
+    def _gen_path(self, name: str, gen: Optional[str] = None) -> str:
+        return os.path.join(self.path, gen or self.generation, name)
+
+    def _current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _set_current(self, gen: str):
+        tmp = os.path.join(self.path, "CURRENT.tmp")
+        _write_synced(tmp, gen.encode())
+        os.replace(tmp, os.path.join(self.path, "CURRENT"))
+        self._fsync_dir(self.path)
+
+    @staticmethod
+    def _fsync_dir(path: str):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @contextmanager
+    def _locked(self):
+        with self._mutex, open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open(self):
+        for _ in range(3):
+            gen = self._current()
+            if gen is None:
+                with self._locked():
+                    if self._current() is None:
+                        os.makedirs(os.path.join(self.path, "gen-000001"), exist_ok=True)
+                        for name in ("embeddings.f32", "index.jsonl"):
+                            open(os.path.join(self.path, "gen-000001", name), "ab").close()
+                        self._set_current("gen-000001")
+                continue
+            self.generation = gen
+            self.meta: Dict[str, Optional[dict]] = {}   # users changed since the snapshot; None = deleted
+            self.dead_rows = 0
+            self.log_records = 0
+            self._offset = 0
+            self._mm: Optional[np.memmap] = None
+            try:
+                self._load_snapshot()
+                self._replay()
+                self._remap()
+                return
+            except FileNotFoundError:
+                continue   # compacted away between reading CURRENT and opening: retry
+        raise RuntimeError(f"could not open voiceprint store at {self.path}")
+
+    def _load_snapshot(self):
+        self._snap_names: List[str] = []
+        self._snap: Dict[str, int] = {}
+        self._snap_meta: Dict[str, np.ndarray] = {}
+        self._snap_start = np.zeros(0, dtype=np.int64)
+        self._cmm: Optional[np.memmap] = None
+        if not os.path.exists(self._gen_path("snapshot.json")):
+            return
+        with open(self._gen_path("snapshot.json")) as f:
+            snap = json.load(f)
+        self._snap_names = snap["users"]
+        self._snap = dict(zip(self._snap_names, range(len(self._snap_names))))
+        self._snap_meta = {k: np.asarray(snap[k], dtype=np.float64 if k.endswith("_at") else np.int64)
+                           for k in SNAPSHOT_FIELDS}
+        # Compaction writes each user's rows contiguously, in snapshot order
+        self._snap_start = np.concatenate([[0], np.cumsum(self._snap_meta["count"])[:-1]]).astype(np.int64)
+        if self._snap_names:
+            self._cmm = np.memmap(self._gen_path("centroids.f32"), dtype=np.float32, mode="r",
+                                  shape=(len(self._snap_names), self.dim))
+
+    def _replay(self) -> Set[str]:
+        """Apply index records appended since the last call; returns the users they touched."""
+        changed = set()
+        with open(self._gen_path("index.jsonl"), "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1          # a writer may be mid-line: stop at the last full record
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            user, at = rec["user"], rec.get("at")
+            if rec["op"] == "add":
+                m = self._changing(user) or {"version": 0, "count": 0, "slots": [], "created_at": at, "snap": None}
+                m["slots"].append(rec["slot"])
+                m["count"] += 1
+                m["version"] += 1
+                m["updated_at"] = at
+                self.meta[user] = m
+            elif rec["op"] == "reset":
+                # Re-enrollment: drop the old utterances, keep version history
+                m = self._changing(user)
+                if m:
+                    self.dead_rows += m["count"]
+                    m.update(slots=[], count=0, version=m["version"] + 1, updated_at=at)
+            elif rec["op"] == "delete":
+                m = self._get(user)
+                if m:
+                    self.dead_rows += m["count"]
+                    self.meta[user] = None
+            self.log_records += 1
+            changed.add(user)
+        self._offset += end
+        return changed
+
+    def _remap(self):
+        rows = os.path.getsize(self._gen_path("embeddings.f32")) // self.row_bytes
+        if rows and (self._mm is None or len(self._mm) != rows):
+            self._mm = np.memmap(self._gen_path("embeddings.f32"), dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def refresh(self) -> Optional[Set[str]]:
+        """Catch up with other writers. Returns the changed users, or None if the
+        generation changed (compaction) and everything should be reloaded."""
+        with self._mutex:
+            if self._current() != self.generation:
+                self._open()
+                return None
+            if os.path.getsize(self._gen_path("index.jsonl")) == self._offset:
+                return set()
+            changed = self._replay()
+            self._remap()
+            return changed
+
+    def _append(self, records: List[dict], vectors: List[np.ndarray]) -> None:
+        # Caller holds the lock: rows first, then the log lines that reference them
+        if vectors:
+            with open(self._gen_path("embeddings.f32"), "ab") as f:
+                slot = f.tell() // self.row_bytes
+                f.write(b"".join(v.astype(np.float32).tobytes() for v in vectors))
+                f.flush()
+                os.fsync(f.fileno())
+            for rec in records:
+                if rec["op"] == "add":
+                    rec["slot"] = slot
+                    slot += 1
+        with open(self._gen_path("index.jsonl"), "ab") as f:
+            f.write(b"".join(json.dumps(r).encode() + b"\n" for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    # -------- metadata --------
+    def _get(self, username: str) -> Optional[dict]:
+        if username in self.meta:
+            return self.meta[username]
+        i = self._snap.get(username)
+        if i is None:
+            return None
+        start, count = int(self._snap_start[i]), int(self._snap_meta["count"][i])
+        m = {k: self._snap_meta[k][i].item() for k in SNAPSHOT_FIELDS}
+        return {**m, "slots": range(start, start + count), "snap": i}
+
+    def _changing(self, username: str) -> Optional[dict]:
+        """The user's metadata, detached from the snapshot so it can be modified."""
+        m = self._get(username)
+        if m is not None:
+            m = {**m, "slots": list(m["slots"]), "snap": None}
+            self.meta[username] = m
+        return m
+
+    def users(self) -> List[str]:
+        with self._mutex:
+            live = [u for u in self._snap_names if u not in self.meta] if self.meta else list(self._snap_names)
+            # meta overrides the snapshot: a snapshot user changed or re-enrolled since is listed from meta
+            return live + [u for u, m in self.meta.items() if m is not None]
+
+    def __len__(self) -> int:
+        with self._mutex:
+            gone = sum(1 for u in self.meta if u in self._snap and self.meta[u] is None)
+            new = sum(1 for u, m in self.meta.items() if m is not None and u not in self._snap)
+            return len(self._snap_names) - gone + new
+
+    def __contains__(self, username: str) -> bool:
+        return self._get(username) is not None
+
+    # -------- writes --------
+    def enroll(self, username: str, embedding, replace: bool = False) -> dict:
+        """Add one utterance embedding; replace=True starts the user's enrollment over."""
+        now = time.time()
+        with self._locked():
+            self.refresh()
+            records = []
+            if replace and username in self:
+                records.append({"op": "reset", "user": username, "at": now})
+            records.append({"op": "add", "user": username, "at": now})
+            self._append(records, [_unit(embedding)])
+            self._replay()
+            self._remap()
+        self._maybe_compact()
+        return self.info(username)
+
+    def delete(self, username: str) -> bool:
+        with self._locked():
+            self.refresh()
+            if username not in self:
+                return False
+            self._append([{"op": "delete", "user": username, "at": time.time()}], [])
+            self._replay()
+        self._maybe_compact()
+        return True
+
+    def _maybe_compact(self):
+        dead = self.dead_rows >= VOICE_STORE_COMPACT_MIN and self.dead_rows >= VOICE_STORE_COMPACT_RATIO * self.rows()
+        if dead or self.log_records >= VOICE_STORE_LOG_MAX:
+            self.compact()
+
+    def compact(self) -> dict:
+        """Write a new generation (live rows, snapshot, centroids, empty log) and switch CURRENT to it."""
+        with self._locked():
+            self.refresh()
+            before = self.rows()
+            new_gen = f"gen-{int(self.generation.split('-')[1]) + 1:06d}"
+            new_dir = os.path.join(self.path, new_gen)
+            shutil.rmtree(new_dir, ignore_errors=True)   # leftovers of an interrupted compaction
+            os.makedirs(new_dir)
+            names, centroids = self.centroids()
+            metas = [self._get(u) for u in names]
+            with open(os.path.join(new_dir, "embeddings.f32"), "wb") as f:
+                for i in range(0, len(metas), 4096):
+                    chunk = metas[i:i + 4096]
+                    slots = np.fromiter((s for m in chunk for s in m["slots"]), dtype=np.int64,
+                                        count=sum(m["count"] for m in chunk))
+                    f.write(np.ascontiguousarray(self._mm[slots]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            _write_synced(os.path.join(new_dir, "centroids.f32"), np.ascontiguousarray(centroids).tobytes())
+            snapshot = {"users": names, **{k: [m[k] for m in metas] for k in SNAPSHOT_FIELDS}}
+            _write_synced(os.path.join(new_dir, "snapshot.json"), json.dumps(snapshot).encode())
+            _write_synced(os.path.join(new_dir, "index.jsonl"), b"")
+            self._fsync_dir(new_dir)
+            old_gen = self.generation
+            self._set_current(new_gen)
+            # Readers that still map the old files keep their pages until they reopen
+            shutil.rmtree(os.path.join(self.path, old_gen), ignore_errors=True)
+            self._open()
+        result = {"generation": self.generation, "rows_before": before, "rows_after": self.rows()}
+        print("Voiceprint store compacted: ", result)
+        return result
+
+    # -------- reads --------
+    def rows(self) -> int:
+        return 0 if self._mm is None else len(self._mm)
+
+    def info(self, username: str) -> Optional[dict]:
+        with self._mutex:
+            m = self._get(username)
+            return None if m is None else {k: v for k, v in m.items() if k not in {"slots", "snap"}}
+
+    def embeddings(self, username: str) -> np.ndarray:
+        with self._mutex:
+            m = self._get(username)
+            if not m or not m["count"] or self._mm is None:
+                return np.zeros((0, self.dim), dtype=np.float32)
+            return np.asarray(self._mm[list(m["slots"])])
+
+    def centroid(self, username: str) -> Optional[np.ndarray]:
+        with self._mutex:
+            m = self._get(username)
+            if not m or not m["count"]:
+                return None
+            if m["snap"] is not None:
+                return np.array(self._cmm[m["snap"]])
+            return _unit(self.embeddings(username).sum(axis=0))
+
+    def centroids(self, users: Optional[List[str]] = None) -> Tuple[List[str], np.ndarray]:
+        """Centroids for many users at once (all users by default). Users unchanged since
+        the snapshot read their precomputed row; the rest are averaged from their utterances."""
+        with self._mutex:
+            if users is None:
+                keep = self._snap_meta["count"] > 0 if self._snap_names else np.zeros(0, dtype=bool)
+                for u in self.meta:
+                    if u in self._snap:
+                        keep[self._snap[u]] = False
+                snap_idx = np.flatnonzero(keep)
+                snap_names = self._snap_names if len(snap_idx) == len(self._snap_names) else [self._snap_names[i] for i in snap_idx]
+                fresh = [u for u, m in self.meta.items() if m is not None and m["count"]]
+            else:
+                snap_idx, snap_names, fresh = [], [], []
+                for u in users:
+                    m = self._get(u)
+                    if not m or not m["count"]:
+                        continue
+                    if m["snap"] is not None:
+                        snap_idx.append(m["snap"])
+                        snap_names.append(u)
+                    else:
+                        fresh.append(u)
+            parts = []
+            if len(snap_idx):
+                full = len(snap_idx) == len(self._snap_names)
+                parts.append(np.asarray(self._cmm) if full else self._cmm[np.asarray(snap_idx)])
+            if fresh:
+                counts = np.array([self.meta[u]["count"] for u in fresh])
+                slots = np.fromiter((s for u in fresh for s in self.meta[u]["slots"]), dtype=np.int64, count=int(counts.sum()))
+                sums = np.add.reduceat(np.asarray(self._mm[slots]), np.concatenate([[0], np.cumsum(counts)[:-1]]), axis=0)
+                parts.append(_normalize_rows(sums))
+            if not parts:
+                return [], np.zeros((0, self.dim), dtype=np.float32)
+            return list(snap_names) + fresh, parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def stats(self) -> dict:
+        with self._mutex:
+            return {
+                "path": self.path,
+                "generation": self.generation,
+                "users": len(self),
+                "snapshot_users": len(self._snap_names),
+                "log_records": self.log_records,
+                "rows": self.rows(),
+                "dead_rows": self.dead_rows,
+                "bytes": self.rows() * self.row_bytes,
+            }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in {"stats", "compact"}:
+        raise SystemExit("usage: python voiceprint_store.py stats|compact [DIR]")
+    store = VoiceprintStore(sys.argv[2] if len(sys.argv) > 2 else VOICE_STORE_DIR)
+    print(json.dumps(store.compact() if sys.argv[1] == "compact" else store.stats(), indent=2))